@@ -0,0 +1,364 @@
+import gzip
+import os
+import stat
+import tarfile
+import zipfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+# Uncompressed bytes and entries one archive may extract, to bound the disk (and memory) it takes
+ARCHIVE_MAX_BYTES = 4 * 1024**3
+ARCHIVE_MAX_ENTRIES = 100_000
+
+# Archive file name suffixes and their kind; the folder extracted to is the name without the suffix
+ARCHIVE_SUFFIXES = (
+    (".zip", "zip"),
+    (".tar.gz", "tar.gz"),
+    (".tgz", "tar.gz"),
+    (".tar.zst", "tar.zst"),
+    (".tzst", "tar.zst"),
+)
+
+# Archive formats a directory can be downloaded as, and their media types
+ARCHIVE_DOWNLOAD_KINDS = {"zip": "application/zip", "tar.gz": "application/gzip"}
+
+_COPY_BYTES = 1024 * 1024
+
+
+class ArchiveError(Exception):
+    """Raised for an archive that cannot be extracted; the message is user-facing."""
+
+
+def archive_kind(filename: str) -> tuple[str, str] | None:
+    """Returns (kind, folder name) for an archive's file name, or None if it is not one."""
+    lowered = filename.lower()
+    for suffix, kind in ARCHIVE_SUFFIXES:
+        if lowered.endswith(suffix) and len(filename) > len(suffix):
+            return kind, filename[: -len(suffix)]
+    return None
+
+
+def _parts(name: str) -> list[str]:
+    """Splits an entry name into path components; rejects names that would leave the folder."""
+    if name.startswith("/") or "\0" in name:
+        raise ArchiveError(f"Archive entry has an unsafe path: {name!r}")
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if ".." in parts:
+        raise ArchiveError(f"Archive entry has an unsafe path: {name!r}")
+    return parts
+
+
+class _Extraction:
+    """
+    Writes the entries of one archive straight to their final paths under `destination`.
+
+    A single top-level folder holding everything is dropped, since the folder extracted to is
+    already named after the archive. For zips this is known up front (`root`); for streamed
+    tars it is assumed from the first entry, and if a later entry is outside that folder, the
+    files written so far are renamed back under it. Limits are checked as data is written.
+    On failure the files and folders this extraction created are removed.
+    """
+
+    def __init__(self, destination: Path, root: str | None = None, decided: bool = False):
+        self.destination = destination
+        self.resolved = destination.resolve()
+        self.root = root
+        self.decided = decided
+        self.entries = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.files: list[tuple[list[str], bool]] = []  # (relative parts, existed before) per written file
+        self.created_dirs: list[Path] = []
+
+    def _ensure_dir(self, path: Path):
+        missing = []
+        while not path.is_dir():
+            missing.append(path)
+            path = path.parent
+        # A folder already in the destination may be a symlink pointing elsewhere
+        if path.is_relative_to(self.destination) and not path.resolve().is_relative_to(self.resolved):
+            raise ArchiveError(f"Archive entry would be written outside the folder: {missing[-1] if missing else path}")
+        for directory in reversed(missing):
+            directory.mkdir()
+            self.created_dirs.append(directory)
+
+    def _place(self, name: str, is_dir: bool) -> Path | None:
+        """Returns the final path of an entry (None for the dropped root folder itself)."""
+        self.entries += 1
+        if self.entries > ARCHIVE_MAX_ENTRIES:
+            raise ArchiveError(f"Archive has more than {ARCHIVE_MAX_ENTRIES} entries.")
+        parts = _parts(name)
+        if not parts:
+            return None
+        if not self.decided:
+            # First entry of a streamed archive: a folder (or a path inside one) may be the root
+            self.root = parts[0] if is_dir or len(parts) > 1 else None
+            self.decided = True
+        elif self.root is not None and parts[0] != self.root:
+            self._keep_root()
+        if self.root is not None:
+            parts = parts[1:]
+            if not parts:
+                self._ensure_dir(self.destination)
+                return None
+        path = self.destination.joinpath(*parts)
+        self._ensure_dir(path if is_dir else path.parent)
+        return path
+
+    def _keep_root(self):
+        """The archive has more than one top-level entry after all: moves what was written under its first folder."""
+        root, self.root = self.root, None
+        root_dir = self.destination / root
+        for i, (parts, existed) in enumerate(self.files):
+            target = root_dir.joinpath(*parts)
+            self._ensure_dir(target.parent)
+            os.replace(self.destination.joinpath(*parts), target)
+            self.files[i] = ([root, *parts], existed)
+        for directory in sorted(self.created_dirs, key=lambda path: len(path.parts), reverse=True):
+            if directory != self.destination and directory.is_relative_to(self.destination) and not directory.is_relative_to(root_dir):
+                relative = directory.relative_to(self.destination)
+                self._ensure_dir(root_dir / relative)
+                try:
+                    directory.rmdir()
+                except OSError:
+                    pass
+
+    def write_file(self, name: str, source: BinaryIO, mode: int | None = None):
+        path = self._place(name, is_dir=False)
+        if path is None:
+            return
+        existed = path.exists() or path.is_symlink()
+        if path.is_symlink():
+            path.unlink()  # Replaced by the file rather than written through
+        self.files.append((list(path.relative_to(self.destination).parts), existed))
+        with open(path, "wb") as f:
+            while chunk := source.read(_COPY_BYTES):
+                self.bytes += len(chunk)
+                if self.bytes > ARCHIVE_MAX_BYTES:
+                    raise ArchiveError(f"Archive expands to more than {ARCHIVE_MAX_BYTES // 1024**2} MB.")
+                f.write(chunk)
+        if mode is not None and mode & 0o100:
+            os.chmod(path, 0o755)  # Keep scripts executable
+
+    def write_dir(self, name: str):
+        self._place(name, is_dir=True)
+
+    def rollback(self):
+        for parts, existed in self.files:
+            if not existed:
+                try:
+                    os.remove(self.destination.joinpath(*parts))
+                except OSError:
+                    pass
+        for directory in sorted(self.created_dirs, key=lambda path: len(path.parts), reverse=True):
+            try:
+                directory.rmdir()
+            except OSError:
+                pass
+
+    def result(self) -> dict:
+        return {"entries": self.entries, "files": len(self.files), "bytes": self.bytes, "skipped": self.skipped}
+
+
+def _run(extraction: _Extraction, extract) -> dict:
+    try:
+        extract()
+    except BaseException as e:
+        extraction.rollback()
+        if isinstance(e, (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError)):
+            raise ArchiveError(f"Invalid or corrupt archive: {e}") from e
+        if isinstance(e, OSError):
+            raise ArchiveError(f"Could not extract archive: {e}") from e
+        raise
+    return extraction.result()
+
+
+def extract_zip(zip_path: str | Path, destination: Path) -> dict:
+    """Extracts a zip file into `destination` (blocking: run it in a worker thread)."""
+    try:
+        zip_file = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"Invalid or corrupt archive: {e}") from e
+    with zip_file:
+        infos = zip_file.infolist()
+        if len(infos) > ARCHIVE_MAX_ENTRIES:
+            raise ArchiveError(f"Archive has more than {ARCHIVE_MAX_ENTRIES} entries.")
+        if sum(info.file_size for info in infos) > ARCHIVE_MAX_BYTES:
+            raise ArchiveError(f"Archive expands to more than {ARCHIVE_MAX_BYTES // 1024**2} MB.")
+        tops = {parts[0] for parts in map(_parts, (info.filename for info in infos)) if parts}
+        single_folder = len(tops) == 1 and any(len(_parts(info.filename)) > 1 or info.is_dir() for info in infos)
+        extraction = _Extraction(destination, root=tops.pop() if single_folder else None, decided=True)
+
+        def extract():
+            extraction._ensure_dir(destination)
+            for info in infos:
+                if info.is_dir():
+                    extraction.write_dir(info.filename)
+                else:
+                    with zip_file.open(info) as source:
+                        extraction.write_file(info.filename, source)
+
+        return _run(extraction, extract)
+
+
+def extract_tar(source: BinaryIO, destination: Path, kind: str) -> dict:
+    """
+    Extracts a .tar.gz or .tar.zst read sequentially from `source` into `destination`, so
+    it can be fed straight from an upload (blocking: run it in a worker thread). Only files
+    and folders are extracted; links and special files are skipped.
+    """
+    if kind == "tar.zst":
+        if zstd is None:
+            raise ArchiveError("Extracting .tar.zst needs the zstandard package, which is not installed on the server.")
+        source = zstd.ZstdFile(source) if hasattr(zstd, "ZstdFile") else zstd.ZstdDecompressor().stream_reader(source)
+        mode = "r|"
+    else:
+        mode = "r|gz"
+    extraction = _Extraction(destination)
+
+    def extract():
+        extraction._ensure_dir(destination)
+        with tarfile.open(fileobj=source, mode=mode) as tar:
+            while (member := tar.next()) is not None:
+                tar.members.clear()  # A stream is read once: don't keep every header in memory
+                if member.isdir():
+                    extraction.write_dir(member.name)
+                elif member.isreg():
+                    extraction.write_file(member.name, tar.extractfile(member), member.mode)
+                else:
+                    extraction.entries += 1
+                    extraction.skipped += 1
+
+    return _run(extraction, extract)
+
+
+class _Sink:
+    """Write-only file object collecting an archive's output until it is drained."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        if self.chunks:
+            data = b"".join(self.chunks)
+            self.chunks.clear()
+            yield data
+
+
+def _walk(directory: Path, prefix: str) -> Iterator[tuple[Path, str, os.stat_result]]:
+    """Yields (path, archive name, stat) for the folders and regular files below `directory`, depth first."""
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except OSError as e:
+        print(f"WARNING: Skipping unreadable folder {directory} in archive: {e}")
+        return
+    for entry in entries:
+        name = f"{prefix}/{entry.name}"
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            yield Path(entry.path), name, st
+            yield from _walk(Path(entry.path), name)
+        elif stat.S_ISREG(st.st_mode):
+            yield Path(entry.path), name, st
+        # Symlinks and special files are left out: a link could point outside the machine's files
+
+
+def _stream_zip(directory: Path, root: str, level: int, sink: _Sink) -> Iterator[bytes]:
+    # ZipFile writes to an unseekable file with data descriptors after each entry, so nothing is
+    # rewound. Level 0 stores entries; a few old unzippers can't read stored entries streamed this way.
+    # Other levels deflate at zlib's default level: ZipInfo has no public per-entry level before 3.13.
+    compress_type = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zip_file:
+        for path, name, st in _walk(directory, root):
+            info = zipfile.ZipInfo.from_file(path, name, strict_timestamps=False)
+            if stat.S_ISDIR(st.st_mode):
+                zip_file.writestr(info, b"")
+                continue
+            info.compress_type = compress_type
+            # ZipFile picks zip64 up front from this size; the entry is capped at it, so a file
+            # growing while it is read can't outgrow that choice and cut the archive short
+            info.file_size = st.st_size
+            try:
+                source = open(path, "rb")
+            except OSError as e:
+                print(f"WARNING: Skipping unreadable file {path} in archive: {e}")
+                continue
+            with source, zip_file.open(info, "w") as target:
+                remaining = st.st_size
+                while remaining and (chunk := source.read(min(_COPY_BYTES, remaining))):
+                    target.write(chunk)
+                    remaining -= len(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def _stream_tar_gz(directory: Path, root: str, level: int, sink: _Sink) -> Iterator[bytes]:
+    # tarfile copies a whole member per call, so the tar stream is written here a block at a time instead
+    with gzip.GzipFile(filename=f"{root}.tar", mode="wb", fileobj=sink, compresslevel=level) as target:
+        for path, name, st in _walk(directory, root):
+            info = tarfile.TarInfo(name)
+            info.mode = stat.S_IMODE(st.st_mode)
+            info.mtime = st.st_mtime
+            if stat.S_ISDIR(st.st_mode):
+                info.type = tarfile.DIRTYPE
+                target.write(info.tobuf(tarfile.PAX_FORMAT))
+                continue
+            try:
+                source = open(path, "rb")
+            except OSError as e:
+                print(f"WARNING: Skipping unreadable file {path} in archive: {e}")
+                continue
+            with source:
+                info.size = st.st_size
+                target.write(info.tobuf(tarfile.PAX_FORMAT))
+                remaining = info.size
+                while remaining and (chunk := source.read(min(_COPY_BYTES, remaining))):
+                    target.write(chunk)
+                    remaining -= len(chunk)
+                    yield from sink.drain()
+                # The header promised st_size bytes: pad a file that shrank while it was read
+                while remaining:
+                    target.write(bytes(min(_COPY_BYTES, remaining)))
+                    remaining -= min(_COPY_BYTES, remaining)
+            target.write(bytes(-info.size % tarfile.BLOCKSIZE))
+            yield from sink.drain()
+        target.write(bytes(2 * tarfile.BLOCKSIZE))  # End-of-archive marker
+    yield from sink.drain()
+
+
+def stream_archive(directory: Path, kind: str, level: int = 6) -> Iterator[bytes]:
+    """
+    Yields `directory` as a zip or tar.gz archive, produced as it is read: nothing is staged on
+    disk and at most about one read (1 MiB) of output is held at a time, whatever the tree's
+    size. Entries are under a folder named after `directory`, with the size each file had
+    when it was reached. Level 0 leaves data uncompressed (for content that is already
+    compressed); 1-9 trade speed for size in tar.gz, while zip deflates at the default level. Blocking: iterate it from a worker thread.
+    """
+    sink = _Sink()
+    if kind == "zip":
+        return _stream_zip(directory, directory.name, level, sink)
+    if kind == "tar.gz":
+        return _stream_tar_gz(directory, directory.name, level, sink)
+    raise ArchiveError(f"Unsupported archive format: {kind}. Use one of: {', '.join(ARCHIVE_DOWNLOAD_KINDS)}.")
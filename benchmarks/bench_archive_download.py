@@ -0,0 +1,60 @@
+"""
+Benchmarks streaming a directory as an archive (/files/archive) over incompressible files.
+
+Builds a tree of random (already-compressed-like) files, 256 MB by default, then drains
+`stream_archive` for each format and level, reporting throughput and the peak memory
+traced while it runs. The first row is a plain read of every file: the disk-bound ceiling
+that level 0 should come close to, while higher levels are bound by the compressor.
+
+Usage: python benchmarks/bench_archive_download.py [size in MB]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from archives import _COPY_BYTES, stream_archive  # noqa: E402
+
+FILE_BYTES = 8 * 1024**2
+
+
+def read_all(directory: Path):
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            with open(path, "rb") as f:
+                while chunk := f.read(_COPY_BYTES):
+                    yield chunk
+
+
+def measure(label: str, chunks, size: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    produced = sum(len(chunk) for chunk in chunks)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<14}  {size / seconds / 1024**2:>7.0f} MB/s  {produced / 1024**2:>9.1f} MB  {peak / 1024**2:>9.1f} MB")
+
+
+def main():
+    size = int(sys.argv[1]) * 1024**2 if len(sys.argv) > 1 else 256 * 1024**2
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp) / "tree"
+        for i in range(size // FILE_BYTES):
+            folder = directory / f"dir{i % 8}"
+            folder.mkdir(parents=True, exist_ok=True)
+            (folder / f"file{i}.bin").write_bytes(os.urandom(FILE_BYTES))
+        print(f"{'archive':<14}  {'throughput':>12}  {'output':>12}  {'peak memory':>12}")
+        measure("read only", read_all(directory), size)
+        for kind in ("zip", "tar.gz"):
+            for level in (0, 1, 6):
+                measure(f"{kind} level {level}", stream_archive(directory, kind, level), size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmarks the per-machine image build context at 10/100/500 MiB of user files.
+
+Compares the old context (the whole machine directory, files/ included, as `docker build .`
+sends it) with the minimal one (Dockerfile and entrypoint.sh only), both packed in memory and
+sent to the fake daemon's /build endpoint over its Unix socket.
+
+Usage: python benchmarks/bench_build_context.py
+"""
+
+import asyncio
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from docker_client import docker, tar_files  # noqa: E402
+from images import machine_dockerfile  # noqa: E402
+from fake_docker import FakeDockerDaemon  # noqa: E402
+
+
+def tar_directory(path: Path) -> bytes:
+    """Packs a directory into an in-memory tar archive, as `docker build <dir>` does with its context."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.add(str(path), arcname=".")
+    return buffer.getvalue()
+
+
+def make_machine(root: Path, mib: int) -> Path:
+    container_path = root / "container-bench"
+    files_path = container_path / "files"
+    files_path.mkdir(parents=True)
+    (container_path / "Dockerfile").write_text(machine_dockerfile("vmwebgui-base:bench"))
+    (container_path / "entrypoint.sh").write_text("#!/bin/bash\ntail -f /dev/null\n")
+    # A workspace of 1 MiB files, like a cloned repository with its dependencies installed
+    block = os.urandom(1024 * 1024)
+    for i in range(mib):
+        (files_path / f"blob-{i}.bin").write_bytes(block)
+    return container_path
+
+
+async def send(pack) -> tuple[int, float, float]:
+    """Returns (context bytes, pack seconds, send-and-build seconds)."""
+    started = time.perf_counter()
+    context = await asyncio.to_thread(pack)
+    packed = time.perf_counter()
+    await docker.build(context, "bench")
+    return len(context), packed - started, time.perf_counter() - packed
+
+
+async def run(container_path: Path, socket_path: str):
+    daemon = FakeDockerDaemon(socket_path)
+    await daemon.start()
+    docker.socket_path = socket_path
+    try:
+        old = await send(lambda: tar_directory(container_path))
+        new = await send(
+            lambda: tar_files({"Dockerfile": container_path / "Dockerfile", "entrypoint.sh": container_path / "entrypoint.sh"})
+        )
+        return old, new
+    finally:
+        await docker.close()
+        await daemon.stop()
+
+
+def main():
+    print(f"{'files':>8}  {'context (old)':>14}  {'pack':>9}  {'send':>9}  {'context (new)':>14}  {'pack':>9}  {'send':>9}")
+    for mib in (10, 100, 500):
+        with tempfile.TemporaryDirectory() as tmp:
+            container_path = make_machine(Path(tmp), mib)
+            old, new = asyncio.run(run(container_path, str(Path(tmp) / "docker.sock")))
+            print(
+                f"{mib:>5}MiB  {old[0] / 1024**2:>11.1f}MiB  {old[1] * 1000:>7.1f}ms  {old[2] * 1000:>7.1f}ms"
+                f"  {new[0] / 1024:>11.1f}KiB  {new[1] * 1000:>7.2f}ms  {new[2] * 1000:>7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
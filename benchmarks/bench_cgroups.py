@@ -0,0 +1,53 @@
+"""
+Benchmarks cgroup v2 usage sampling at 10/100/500 containers against a fake cgroup tree.
+
+Reports the time of one `sample_all` pass (what the usage collector runs in a worker thread
+every second) and the resulting container samples per second, and checks that CPU% comes
+out of the deltas: one container is given 0.1 CPU-seconds over a 0.2 second interval.
+
+Usage: python benchmarks/bench_cgroups.py
+"""
+
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cgroups import CgroupReader  # noqa: E402
+from docker_client import usage_from_stats  # noqa: E402
+from fake_cgroups import FakeCgroupTree  # noqa: E402
+
+
+def main():
+    print(f"{'containers':>10}  {'pass':>9}  {'per container':>13}  {'samples/s':>10}  {'cpu (expect ~50%)':>18}  {'memory':>8}")
+    for count in (10, 100, 500):
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = FakeCgroupTree(Path(tmp))
+            container_ids = [uuid.uuid4().hex * 2 for _ in range(count)]
+            for i, container_id in enumerate(container_ids):
+                tree.add_container(container_id, memory_max=2 * 1024**3, driver="systemd" if i % 2 else "cgroupfs")
+            reader = CgroupReader(tree.cgroup_root, tree.proc_root)
+
+            reader.sample_all(container_ids)  # First pass: locates cgroups, no CPU delta yet
+            for container_id in container_ids[1:]:
+                tree.set_counters(container_id, cpu_usec=100_000, memory=512 * 1024**2, inactive_file=0, rx=10**6, tx=10**5, read=0, write=0)
+            # The first container is checked for CPU%: 0.1 CPU-seconds over 0.2 seconds
+            reader.sample(container_ids[0])
+            tree.set_counters(container_ids[0], cpu_usec=100_000, memory=512 * 1024**2, inactive_file=0, rx=10**6, tx=10**5, read=0, write=0)
+            time.sleep(0.2)
+
+            started = time.perf_counter()
+            samples = reader.sample_all(container_ids)
+            elapsed = time.perf_counter() - started
+            usage = usage_from_stats(samples[container_ids[0]])
+            print(
+                f"{count:>10}  {elapsed * 1000:>7.2f}ms  {elapsed / count * 1e6:>11.1f}us  {count / elapsed:>10.0f}"
+                f"  {usage['cpu_percent']:>18}  {usage['mem_usage']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
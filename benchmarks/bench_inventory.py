@@ -0,0 +1,158 @@
+"""
+Benchmarks `/machines` listing latency at 10/100/500 machines.
+
+Compares the old approach (one `docker ps` per machine, serially, against a stub Docker CLI)
+with the batched inventory query against the fake daemon, both cold (one listing plus one
+inspect per running container) and warm (answered from the event-fed state cache). The stub
+is a small Python script put first on PATH, so each call pays a real process start just like
+the Go binary does.
+
+Usage: python benchmarks/bench_inventory.py
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import inventory  # noqa: E402
+from docker_client import docker  # noqa: E402
+from machine_state import machine_states  # noqa: E402
+from registry import MachineRegistry  # noqa: E402
+from fake_docker import FakeDockerDaemon  # noqa: E402
+
+STUB_DOCKER = r'''#!/usr/bin/env python3
+import json, os, sys
+
+containers = json.load(open(os.environ["STUB_DOCKER_STATE"]))
+args = sys.argv[1:]
+label_filter = None
+fmt = None
+for i, arg in enumerate(args):
+    if arg == "--filter":
+        label_filter = args[i + 1][len("label="):]
+    if arg == "--format":
+        fmt = args[i + 1]
+
+for c in containers:
+    if label_filter and "=" in label_filter and label_filter.split("=", 1)[1] != c["machine_id"]:
+        continue
+    if fmt and fmt.startswith("{{.Label"):
+        print(f"{c['machine_id']}\t{c['id']}\t{c['status']}\t{c['created_at']}")
+    else:
+        print(f"{c['id']}\t{c['status']}\t{c['image']}\t{c['created_at']}")
+'''
+
+
+def make_fixture(root: Path, count: int):
+    workspace = root / "workspace"
+    workspace.mkdir()
+    containers = []
+    for i in range(count):
+        machine_id = f"{i:012x}"
+        container_dir = workspace / f"container-{machine_id}"
+        container_dir.mkdir()
+        with open(container_dir / "instance_info.json", "w") as f:
+            json.dump({"id": machine_id, "name": f"m{i}", "status": "Running", "docker_image": "ubuntu:latest"}, f)
+        containers.append(
+            {
+                "machine_id": machine_id,
+                "id": f"c{i:011x}",
+                "status": "Up 5 minutes",
+                "image": machine_id,
+                "created_at": "2026-01-01 00:00:00 +0000 UTC",
+            }
+        )
+    state_path = root / "containers.json"
+    with open(state_path, "w") as f:
+        json.dump(containers, f)
+    return workspace, state_path
+
+
+async def list_per_machine(workspace: Path) -> list[dict]:
+    """The previous behaviour: one `docker ps` subprocess per machine, serially."""
+    machines = []
+    registry = MachineRegistry(workspace)
+    registry.load()
+    for machine_info in registry.all():
+        result = await asyncio.to_thread(
+            subprocess.run,
+            [
+                "docker",
+                "ps",
+                "-a",
+                "--filter",
+                f"label=com.vmwebgui.machine_id={machine_info['id']}",
+                "--format",
+                "{{.ID}}\t{{.Status}}\t{{.Image}}\t{{.CreatedAt}}",
+            ],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        machine_info["status"] = "Running" if result.stdout.startswith("c") else "Stopped"
+        machines.append(machine_info)
+    return machines
+
+
+async def list_batched(workspace: Path, state_path: Path, socket_path: str) -> tuple[float, float]:
+    """Returns (cold, warm) listing latency."""
+    daemon = FakeDockerDaemon(socket_path)
+    for c in json.load(open(state_path)):
+        daemon.add_container(c["machine_id"])
+    await daemon.start()
+    docker.socket_path = socket_path
+    machine_states.containers = {}
+    machine_states.ready = False
+    registry = MachineRegistry(workspace)
+    registry.load()
+    try:
+        started = time.perf_counter()
+        await inventory.list_machines(registry.all())
+        cold = time.perf_counter() - started
+
+        machine_states.ready = True
+        started = time.perf_counter()
+        await inventory.list_machines(registry.all())
+        warm = time.perf_counter() - started
+        return cold, warm
+    finally:
+        await docker.close()
+        await daemon.stop()
+
+
+def timed(coro_factory) -> float:
+    started = time.perf_counter()
+    asyncio.run(coro_factory())
+    return time.perf_counter() - started
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = Path(tmp) / "bin"
+        bin_dir.mkdir()
+        stub_path = bin_dir / "docker"
+        stub_path.write_text(STUB_DOCKER)
+        stub_path.chmod(0o755)
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+
+        print(f"{'machines':>8}  {'per-machine':>12}  {'cold':>10}  {'cached':>10}")
+        for count in (10, 100, 500):
+            root = Path(tmp) / f"n{count}"
+            root.mkdir()
+            workspace, state_path = make_fixture(root, count)
+            os.environ["STUB_DOCKER_STATE"] = str(state_path)
+
+            old = timed(lambda: list_per_machine(workspace))
+            cold, warm = asyncio.run(list_batched(workspace, state_path, str(root / "docker.sock")))
+            print(f"{count:>8}  {old * 1000:>10.1f}ms  {cold * 1000:>8.1f}ms  {warm * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmarks `/machines/{id}/logs` throughput in lines per second for a single stream.
+
+The fake daemon emits log lines as fast as the client reads them. The endpoint is driven
+in-process through the ASGI app, once with the previous per-line generator (print, 10ms
+sleep, one frame per line) and once through the shared log hub. The fake daemon produces
+faster than any viewer reads, so the viewer's queue is made unbounded here to measure
+delivery rather than the hub dropping lines for a lagging viewer. The target is at least
+50k lines/s per stream.
+
+Usage: python benchmarks/bench_logs.py
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # main mounts the dashboard and static directories relative to the working directory
+
+import httpx  # noqa: E402
+
+import loghub  # noqa: E402
+import main as server  # noqa: E402
+from docker_client import docker  # noqa: E402
+from fake_docker import FakeDockerDaemon  # noqa: E402
+from registry import machine_registry  # noqa: E402
+
+TARGET_LINES_PER_SECOND = 50_000
+
+
+def log_source(lines: int):
+    async def source(container: dict, tail: str):
+        for i in range(lines):
+            yield f"2024-01-01T00:00:00Z worker[{i % 8}] handled request {i} in 3.2ms status=200 path=/api/items\n".encode()
+
+    return source
+
+
+async def old_generator(container_id: str):
+    """The per-line loop the endpoint used before, kept here as the baseline."""
+    pending = ""
+    async for _, payload in docker.logs(container_id, follow=True, tail=500):
+        pending += payload.decode(errors="replace")
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            decoded_line = line.strip()
+            print(f"LIVE LOG: {decoded_line}")
+            yield decoded_line + "\n"
+            await asyncio.sleep(0.01)
+
+
+async def measure(daemon: FakeDockerDaemon, lines: int, client: httpx.AsyncClient | None, container_id: str) -> tuple[int, float]:
+    """Returns (lines received, seconds)."""
+    daemon.log_source = log_source(lines)
+    received = 0
+    started = time.perf_counter()
+    if client is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            async for line in old_generator(container_id):
+                received += line.count("\n")
+    else:
+        async with client.stream("GET", "/machines/bench/logs") as response:
+            async for chunk in response.aiter_text():
+                received += chunk.count("data: ")
+        received -= 1  # The "end" event
+    return received, time.perf_counter() - started
+
+
+async def run(socket_path: str):
+    daemon = FakeDockerDaemon(socket_path)
+    await daemon.start()
+    docker.socket_path = socket_path
+    container = daemon.add_container("bench")
+    machine_registry.add({"id": "bench", "name": "bench", "status": "Running", "container_id": container["Id"]})
+    loghub.SUBSCRIBER_QUEUE_CHUNKS = 0  # Unbounded
+    server.app.dependency_overrides[server.authenticate_user] = lambda: True
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"{'generator':>10}  {'lines':>8}  {'seconds':>8}  {'lines/s':>10}")
+            for label, lines, http_client in (("old", 300, None), ("batched", 200_000, client), ("batched", 1_000_000, client)):
+                received, seconds = await measure(daemon, lines, http_client, container["Id"])
+                print(f"{label:>10}  {received:>8}  {seconds:>8.2f}  {received / seconds:>10.0f}")
+            print(f"target: {TARGET_LINES_PER_SECOND} lines/s per stream")
+    finally:
+        await docker.close()
+        await daemon.stop()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(str(Path(tmp) / "docker.sock")))
+
+
+if __name__ == "__main__":
+    main()
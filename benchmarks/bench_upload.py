@@ -0,0 +1,96 @@
+"""
+Benchmarks event-loop stalls while a large file is uploaded (1 GB by default).
+
+The upload is streamed in 64 KiB body chunks through the ASGI app in-process, once to the
+previous handler (FastAPI spools the UploadFile, then `shutil.copyfileobj` copies it on the
+event loop) and once to /machines/{id}/upload. A ticker task sleeping 1 ms at a time
+measures how late the loop wakes it up: that is what every other request and log stream
+waits while the file lands.
+
+Usage: python benchmarks/bench_upload.py [size in MB]
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, UploadFile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # main mounts the dashboard and static directories relative to the working directory
+
+import main as server  # noqa: E402
+
+BODY_CHUNK = 64 * 1024
+BOUNDARY = "benchboundary"
+MACHINE_ID = "bench"
+
+legacy = FastAPI()
+
+
+@legacy.post("/upload")
+async def legacy_upload(files: list[UploadFile]):
+    for file in files:
+        with open(Path("workspace") / f"container-{MACHINE_ID}" / "files" / file.filename, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+    return {"message": "ok"}
+
+
+async def multipart_body(size: int):
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="big.bin"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    chunk = os.urandom(BODY_CHUNK)
+    for _ in range(size // BODY_CHUNK):
+        yield chunk
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def ticker(stalls: list[float], done: asyncio.Event):
+    while not done.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - started - 0.001)
+
+
+async def measure(label: str, app, url: str, size: int):
+    stalls: list[float] = []
+    done = asyncio.Event()
+    tick = asyncio.create_task(ticker(stalls, done))
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        response = await client.post(url, content=multipart_body(size), headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+    seconds = time.perf_counter() - started
+    done.set()
+    await tick
+    response.raise_for_status()
+    stalls.sort()
+    p99 = stalls[int(len(stalls) * 0.99)]
+    over_50ms = sum(stall > 0.05 for stall in stalls)
+    print(f"{label:<10}  {seconds:>7.2f} s  {size / seconds / 1024**2:>7.0f} MB/s  {stalls[-1] * 1000:>9.1f} ms  {p99 * 1000:>8.1f} ms  {over_50ms:>11}")
+
+
+async def run(size: int):
+    server.app.dependency_overrides[server.authenticate_user] = lambda: True
+    print(f"{'handler':<10}  {'time':>9}  {'throughput':>12}  {'max stall':>12}  {'p99 stall':>11}  {'stalls >50ms':>11}")
+    await measure("previous", legacy, "/upload", size)
+    await measure("streaming", server.app, f"/machines/{MACHINE_ID}/upload", size)
+
+
+def main():
+    size = int(sys.argv[1]) * 1024**2 if len(sys.argv) > 1 else 1024**3
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # Uploads land in a throwaway workspace
+        (Path("workspace") / f"container-{MACHINE_ID}" / "files").mkdir(parents=True)
+        asyncio.run(run(size))
+
+
+if __name__ == "__main__":
+    main()
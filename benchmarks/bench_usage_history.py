@@ -0,0 +1,72 @@
+"""
+Benchmarks a dashboard poll of /usage-history over a machine with an hour of 1 s samples.
+
+Compares the response size and server time of fetching the whole 5 minute window as
+per-point dicts (what every poll used to return) with the columnar response of the first
+poll and of the incremental polls that follow it (`since` = the last timestamp held).
+
+Usage: python benchmarks/bench_usage_history.py
+"""
+
+import datetime
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from timeseries import UsageStore  # noqa: E402
+from usage import UsageCollector  # noqa: E402
+
+MACHINE_ID = "bench"
+STEP = 3  # Seconds per point, as the dashboard asks
+POLLS = 2000
+
+
+def per_point(history: dict) -> list[dict]:
+    """The same points as a list of dicts with ISO timestamps."""
+    points, timestamp = [], 0
+    for i, delta in enumerate(history["timestamps"]):
+        timestamp += delta
+        point = {"timestamp": datetime.datetime.fromtimestamp(timestamp).isoformat()}
+        for name in ("cpu_percent", "mem_usage", "mem_limit", "net_rx", "net_tx"):
+            point[name] = history[name][i]
+        points.append(point)
+    return points
+
+
+def measure(label: str, poll) -> float:
+    started = time.perf_counter()
+    for _ in range(POLLS):
+        body = json.dumps(poll())
+    seconds = (time.perf_counter() - started) / POLLS
+    print(f"{label:<28}  {len(body):>8} B  {seconds * 1e6:>9.1f} us/poll")
+    return seconds
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / f"container-{MACHINE_ID}").mkdir()
+        collector = UsageCollector(backend="docker")
+        collector.store = UsageStore(Path(tmp))
+        series = collector.store.get(MACHINE_ID)
+        now = time.time()
+        for second in range(3600):
+            t = now - 3600 + second
+            series.add(t, {"cpu_percent": 12.345 + second % 7, "mem_usage": 512 * 1024**2 + second * 4096,
+                           "mem_limit": 2 * 1024**3, "net_rx": 10**9 + second * 1500, "net_tx": 10**8 + second * 900})
+
+        full = collector.history_of(MACHINE_ID, step=STEP, until=now)
+        last = sum(full["timestamps"])
+        print(f"{'poll':<28}  {'response':>10}  {'server time':>17}")
+        before = measure("window, per-point dicts", lambda: per_point(collector.history_of(MACHINE_ID, step=STEP, until=now)))
+        measure("window, columnar", lambda: collector.history_of(MACHINE_ID, step=STEP, until=now))
+        after = measure("incremental, columnar", lambda: collector.history_of(MACHINE_ID, since=last, until=now, step=STEP))
+        print(f"incremental poll is {before / after:.0f}x cheaper than a per-point window")
+        collector.store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+A fake cgroup v2 hierarchy and procfs on disk, for exercising the cgroup usage reader.
+
+`FakeCgroupTree(root)` lays out <root>/cgroup and <root>/proc the way a Docker host does
+(systemd or cgroupfs driver) and lets the caller advance a container's counters.
+Point VM_WEB_GUI_CGROUP_ROOT and VM_WEB_GUI_PROC_ROOT (or CgroupReader's arguments) at them.
+"""
+
+from pathlib import Path
+
+NET_DEV_HEADER = (
+    "Inter-|   Receive                                                |  Transmit\n"
+    " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+)
+
+
+class FakeCgroupTree:
+    def __init__(self, root: Path, host_memory: int = 16 * 1024**3):
+        self.cgroup_root = root / "cgroup"
+        self.proc_root = root / "proc"
+        self.cgroup_root.mkdir(parents=True)
+        self.proc_root.mkdir(parents=True)
+        (self.cgroup_root / "cgroup.controllers").write_text("cpuset cpu io memory pids\n")
+        (self.proc_root / "meminfo").write_text(f"MemTotal:       {host_memory // 1024} kB\nMemFree:        1024 kB\n")
+        self.pids: dict[str, int] = {}
+
+    def add_container(self, container_id: str, memory_max: int | None = None, driver: str = "systemd") -> Path:
+        path = self.cgroup_root / ("system.slice" if driver == "systemd" else "docker") / (
+            f"docker-{container_id}.scope" if driver == "systemd" else container_id
+        )
+        path.mkdir(parents=True)
+        pid = 1000 + len(self.pids)
+        self.pids[container_id] = pid
+        (path / "cgroup.procs").write_text(f"{pid}\n")
+        (path / "memory.max").write_text(f"{memory_max}\n" if memory_max else "max\n")
+        (self.proc_root / str(pid) / "net").mkdir(parents=True)
+        self.set_counters(container_id, cpu_usec=0, memory=64 * 1024**2, inactive_file=4 * 1024**2, rx=0, tx=0, read=0, write=0)
+        return path
+
+    def path(self, container_id: str) -> Path:
+        for path in (self.cgroup_root / "system.slice" / f"docker-{container_id}.scope", self.cgroup_root / "docker" / container_id):
+            if path.is_dir():
+                return path
+        raise KeyError(container_id)
+
+    def set_counters(self, container_id: str, cpu_usec: int, memory: int, inactive_file: int, rx: int, tx: int, read: int, write: int):
+        path = self.path(container_id)
+        (path / "cpu.stat").write_text(f"usage_usec {cpu_usec}\nuser_usec {cpu_usec // 2}\nsystem_usec {cpu_usec // 2}\n")
+        (path / "memory.current").write_text(f"{memory}\n")
+        (path / "memory.stat").write_text(f"anon {memory // 2}\nfile {memory // 2}\ninactive_file {inactive_file}\n")
+        (path / "io.stat").write_text(f"8:0 rbytes={read} wbytes={write} rios=1 wios=1 dbytes=0 dios=0\n")
+        (self.proc_root / str(self.pids[container_id]) / "net" / "dev").write_text(
+            NET_DEV_HEADER
+            + "    lo:    1000      10    0    0    0     0          0         0     1000      10    0    0    0     0       0          0\n"
+            + f"  eth0: {rx:>7}     100    0    0    0     0          0         0  {tx:>7}      50    0    0    0     0       0          0\n"
+        )
+
+    def remove_container(self, container_id: str):
+        path = self.path(container_id)
+        for child in path.iterdir():
+            child.unlink()
+        path.rmdir()
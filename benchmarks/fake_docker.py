@@ -0,0 +1,272 @@
+"""
+In-process fake of the Docker Engine API served on a Unix socket.
+
+Implements just enough of the API used by docker_client.DockerClient (containers,
+images, build, logs, stats, events) to exercise the client and the endpoints that
+use it without a real daemon. Log output is generated on demand by `log_source`.
+
+Usage:
+    daemon = FakeDockerDaemon(socket_path)
+    await daemon.start()
+    client = DockerClient(socket_path)
+    ...
+    await daemon.stop()
+"""
+
+import asyncio
+import datetime
+import json
+import uuid
+from typing import AsyncIterator, Callable
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeDockerDaemon:
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.containers: dict[str, dict] = {}
+        self.images: dict[str, dict] = {}
+        self.requests: list[tuple[str, str]] = []
+        self.connections = 0
+        self.events: asyncio.Queue = asyncio.Queue()
+        # Called with (container, tail) and returns an async iterator of raw log lines (bytes)
+        self.log_source: Callable[[dict, str], AsyncIterator[bytes]] | None = None
+        # Seconds between two samples of a streamed stats request
+        self.stats_interval = 1.0
+        self._server = None
+        self._handlers: set[asyncio.Task] = set()
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+
+    async def stop(self):
+        self._server.close()
+        self.events.put_nowait(None)
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    # ----- fixtures -----
+
+    def add_container(self, machine_id: str, state: str = "running", image: str = "ubuntu:latest", name: str | None = None) -> dict:
+        container_id = uuid.uuid4().hex + uuid.uuid4().hex
+        now = datetime.datetime.now(datetime.timezone.utc)
+        container = {
+            "Id": container_id,
+            "Names": [f"/{name or 'vmwebgui-' + machine_id}"],
+            "Image": image,
+            "Labels": {"com.vmwebgui.machine_id": machine_id},
+            "State": state,
+            "Status": "Up 1 second" if state == "running" else "Exited (0) 1 second ago",
+            "Created": int(now.timestamp()),
+            "StartedAt": now.isoformat().replace("+00:00", "Z"),
+            "Pid": 4242,
+        }
+        self.containers[container_id] = container
+        return container
+
+    def _find(self, ref: str) -> dict | None:
+        for container_id, container in self.containers.items():
+            if container_id.startswith(ref) or f"/{ref}" in container["Names"]:
+                return container
+        return None
+
+    def _inspect(self, container: dict) -> dict:
+        return {
+            "Id": container["Id"],
+            "Name": container["Names"][0],
+            "Created": datetime.datetime.fromtimestamp(container["Created"], datetime.timezone.utc).isoformat(),
+            "Config": {"Image": container["Image"], "Labels": container["Labels"]},
+            "State": {
+                "Status": container["State"],
+                "Running": container["State"] == "running",
+                "Pid": container["Pid"] if container["State"] == "running" else 0,
+                "StartedAt": container["StartedAt"],
+            },
+        }
+
+    def _emit(self, action: str, container: dict):
+        self.events.put_nowait(
+            {
+                "Type": "container",
+                "Action": action,
+                "status": action,
+                "id": container["Id"],
+                "Actor": {"ID": container["Id"], "Attributes": dict(container["Labels"])},
+                "time": int(datetime.datetime.now().timestamp()),
+                "timeNano": int(datetime.datetime.now().timestamp() * 1e9),
+            }
+        )
+
+    # ----- HTTP handling -----
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                url = urlparse(target)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                self.requests.append((method, url.path))
+                await self._route(writer, method, unquote(url.path), query, body)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _respond(self, writer, status: int, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        reason = {200: "OK", 201: "Created", 204: "No Content", 304: "Not Modified", 404: "Not Found"}.get(status, "Error")
+        head = f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    async def _respond_stream(self, writer, chunks: AsyncIterator[bytes], content_type: str):
+        head = f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nTransfer-Encoding: chunked\r\n\r\n"
+        writer.write(head.encode())
+        async for chunk in chunks:
+            writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _route(self, writer, method: str, path: str, query: dict, body: bytes):
+        parts = path.strip("/").split("/")
+
+        if method == "GET" and path == "/containers/json":
+            filters = json.loads(query.get("filters", "{}"))
+            result = []
+            for container in self.containers.values():
+                if query.get("all") != "1" and container["State"] != "running":
+                    continue
+                matched = True
+                for label_filter in filters.get("label", []):
+                    key, _, value = label_filter.partition("=")
+                    if key not in container["Labels"] or (value and container["Labels"][key] != value):
+                        matched = False
+                if matched:
+                    result.append({k: container[k] for k in ("Id", "Names", "Image", "Labels", "State", "Status", "Created")})
+            return await self._respond(writer, 200, result)
+
+        if method == "POST" and path == "/containers/create":
+            config = json.loads(body)
+            container = self.add_container(config["Labels"].get("com.vmwebgui.machine_id", ""), state="created", image=config["Image"], name=query.get("name"))
+            container["Labels"] = config["Labels"]
+            self._emit("create", container)
+            return await self._respond(writer, 201, {"Id": container["Id"], "Warnings": []})
+
+        if method == "POST" and path == "/build":
+            tag = query.get("t", "")
+            labels = json.loads(query.get("labels", "{}"))
+            self.images[tag] = {"Id": "sha256:" + uuid.uuid4().hex, "RepoTags": [tag], "Size": len(body), "Config": {"Labels": labels}}
+
+            async def build_output():
+                yield json.dumps({"stream": f"Step 1/1 : received {len(body)} bytes of context\n"}).encode() + b"\r\n"
+                yield json.dumps({"stream": f"Successfully tagged {tag}\n"}).encode() + b"\r\n"
+
+            return await self._respond_stream(writer, build_output(), "application/json")
+
+        if method == "GET" and path == "/events":
+
+            async def event_stream():
+                while True:
+                    event = await self.events.get()
+                    if event is None:
+                        return
+                    yield json.dumps(event).encode() + b"\n"
+
+            return await self._respond_stream(writer, event_stream(), "application/json")
+
+        if parts[0] == "images" and method == "GET" and parts[-1] == "json":
+            image = self.images.get("/".join(parts[1:-1]))
+            if image is None:
+                return await self._respond(writer, 404, {"message": "No such image"})
+            return await self._respond(writer, 200, image)
+
+        if parts[0] == "containers" and len(parts) >= 2:
+            container = self._find(parts[1])
+            if container is None:
+                return await self._respond(writer, 404, {"message": f"No such container: {parts[1]}"})
+            action = parts[2] if len(parts) > 2 else None
+
+            if method == "GET" and action == "json":
+                return await self._respond(writer, 200, self._inspect(container))
+            if method == "POST" and action == "start":
+                if container["State"] == "running":
+                    return await self._respond(writer, 304)
+                container["State"] = "running"
+                container["StartedAt"] = datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+                self._emit("start", container)
+                return await self._respond(writer, 204)
+            if method == "POST" and action == "stop":
+                if container["State"] != "running":
+                    return await self._respond(writer, 304)
+                container["State"] = "exited"
+                self._emit("die", container)
+                self._emit("stop", container)
+                return await self._respond(writer, 204)
+            if method == "DELETE" and action is None:
+                del self.containers[container["Id"]]
+                self._emit("destroy", container)
+                return await self._respond(writer, 204)
+            if method == "GET" and action == "stats":
+                if query.get("stream") == "0":
+                    return await self._respond(writer, 200, self._stats(container))
+                return await self._respond_stream(writer, self._stats_stream(container), "application/json")
+            if method == "GET" and action == "logs":
+                source = self.log_source(container, query.get("tail", "all")) if self.log_source else _no_logs()
+                if query.get("timestamps") == "1":
+                    source = _timestamped(source)
+                return await self._respond_stream(writer, _multiplex(source), "application/vnd.docker.multiplexed-stream")
+
+        await self._respond(writer, 404, {"message": f"page not found: {method} {path}"})
+
+    async def _stats_stream(self, container: dict) -> AsyncIterator[bytes]:
+        """One sample per `stats_interval` seconds while the container runs, like the daemon's stream."""
+        while self.containers.get(container["Id"]) is container and container["State"] == "running":
+            yield json.dumps(self._stats(container)).encode() + b"\n"
+            await asyncio.sleep(self.stats_interval)
+
+    def _stats(self, container: dict) -> dict:
+        return {
+            "cpu_stats": {"cpu_usage": {"total_usage": 2_000_000_000}, "system_cpu_usage": 40_000_000_000, "online_cpus": 4},
+            "precpu_stats": {"cpu_usage": {"total_usage": 1_000_000_000}, "system_cpu_usage": 20_000_000_000},
+            "memory_stats": {"usage": 64 * 1024**2, "limit": 2 * 1024**3, "stats": {"inactive_file": 4 * 1024**2}},
+            "networks": {"eth0": {"rx_bytes": 1_500_000, "tx_bytes": 250_000}},
+        }
+
+
+async def _no_logs():
+    return
+    yield
+
+
+async def _timestamped(lines: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Prefixes lines with the daemon's fixed-width RFC 3339 timestamp, as `timestamps=1` does."""
+    async for line in lines:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        yield now.strftime("%Y-%m-%dT%H:%M:%S.%f000Z ").encode() + line
+
+
+async def _multiplex(lines: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Frames raw output in the Engine API's stdout stream format, batching into ~64 KiB chunks."""
+    batch = bytearray()
+    async for line in lines:
+        batch += b"\x01\x00\x00\x00" + len(line).to_bytes(4, "big") + line
+        if len(batch) >= 65536:
+            yield bytes(batch)
+            batch.clear()
+    if batch:
+        yield bytes(batch)
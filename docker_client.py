@@ -0,0 +1,465 @@
+import asyncio
+import io
+import json
+import os
+import tarfile
+from pathlib import Path
+from typing import AsyncIterator, Callable
+from urllib.parse import quote, urlencode
+
+# Socket of the local Docker daemon; DOCKER_HOST=unix:///path is honoured like the CLI does
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
+
+# Maximum number of idle keep-alive connections kept around for reuse
+MAX_IDLE_CONNECTIONS = 8
+
+# Stream ids used by the Engine API multiplexed log format
+STDOUT = 1
+STDERR = 2
+
+
+class DockerError(Exception):
+    """Raised when the Docker Engine API answers with an error status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+    def __str__(self):
+        return f"{self.message} (HTTP {self.status})"
+
+
+def socket_path_from_env() -> str:
+    docker_host = os.getenv("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://") :]
+    return DEFAULT_DOCKER_SOCKET
+
+
+def memory_bytes(value: str) -> int:
+    """Converts a machine RAM setting such as "2GB" or "512MB" to bytes (binary units, like `docker run --memory`)."""
+    value = value.strip().upper().replace(" ", "")
+    for suffix, factor in (("GB", 1024**3), ("G", 1024**3), ("MB", 1024**2), ("M", 1024**2), ("KB", 1024), ("K", 1024)):
+        if value.endswith(suffix):
+            return int(float(value[: -len(suffix)]) * factor)
+    return int(value)
+
+
+def tar_files(files: dict[str, Path | bytes]) -> bytes:
+    """Packs the given files into an in-memory tar build context; values are host paths or file contents."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, source in files.items():
+            if isinstance(source, Path):
+                tar.add(str(source), arcname=name)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(source)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(source))
+    return buffer.getvalue()
+
+
+class _Response:
+    def __init__(self, status: int, reason: str, headers: dict[str, str]):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+
+    @property
+    def chunked(self) -> bool:
+        return "chunked" in self.headers.get("transfer-encoding", "").lower()
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+class DockerClient:
+    """
+    Minimal asynchronous client for the Docker Engine API over its Unix socket.
+    Request/response calls reuse pooled keep-alive connections; streaming calls
+    (logs, events, build) use a dedicated connection that is closed afterwards.
+    """
+
+    def __init__(self, socket_path: str | None = None, max_idle_connections: int = MAX_IDLE_CONNECTIONS):
+        self.socket_path = socket_path or socket_path_from_env()
+        self.max_idle_connections = max_idle_connections
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    # ----- connection handling -----
+
+    async def _connect(self, reuse: bool = True) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        """Returns (reader, writer, reused), preferring an idle pooled connection unless `reuse` is False."""
+        while reuse and self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=2**20)
+        return reader, writer, False
+
+    def _release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if len(self._idle) < self.max_idle_connections and not writer.is_closing():
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def close(self):
+        """Closes all idle pooled connections."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    # ----- HTTP/1.1 plumbing -----
+
+    @staticmethod
+    def _target(path: str, params: dict | None) -> str:
+        if params:
+            query = urlencode({k: v for k, v in params.items() if v is not None})
+            return f"{path}?{query}" if query else path
+        return path
+
+    async def _send(self, writer: asyncio.StreamWriter, method: str, target: str, body: bytes | None, content_type: str):
+        head = [f"{method} {target} HTTP/1.1", "Host: docker", "Connection: keep-alive"]
+        if body is not None:
+            head.append(f"Content-Type: {content_type}")
+            head.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> _Response:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Docker daemon closed the connection")
+        _, status, *reason = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return _Response(int(status), reason[0] if reason else "", headers)
+
+    @staticmethod
+    async def _iter_body(reader: asyncio.StreamReader, response: _Response) -> AsyncIterator[bytes]:
+        if response.status in (204, 304) or response.headers.get("content-length") == "0":
+            return
+        if response.chunked:
+            while True:
+                size_line = await reader.readline()
+                if not size_line:
+                    return
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip optional trailers up to the terminating blank line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readline()  # CRLF after each chunk
+        elif "content-length" in response.headers:
+            remaining = int(response.headers["content-length"])
+            while remaining > 0:
+                data = await reader.read(min(remaining, 2**16))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+        else:
+            while data := await reader.read(2**16):
+                yield data
+
+    async def _request(self, method: str, path: str, params: dict | None = None, body: bytes | None = None, content_type: str = "application/json"):
+        """
+        Performs a request on a pooled connection and returns (status, decoded JSON or None).
+
+        A pooled connection may have been closed by the daemon in the meantime, so a GET or HEAD
+        that fails on one is retried on a fresh connection. Other requests (create, start,
+        exec, ...) could have reached the daemon before the failure and must not run twice:
+        they always get a fresh connection instead, and are never retried.
+        """
+        target = self._target(path, params)
+        idempotent = method in ("GET", "HEAD")
+        while True:
+            reader, writer, reused = await self._connect(reuse=idempotent)
+            try:
+                await self._send(writer, method, target, body, content_type)
+                response = await self._read_head(reader)
+                payload = b"".join([chunk async for chunk in self._iter_body(reader, response)])
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if response.keep_alive and (response.chunked or "content-length" in response.headers or response.status in (204, 304)):
+                self._release(reader, writer)
+            else:
+                writer.close()
+            break
+
+        data = None
+        if payload:
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                data = payload.decode(errors="replace")
+        if response.status >= 400:
+            message = data.get("message") if isinstance(data, dict) else (data or response.reason)
+            raise DockerError(response.status, str(message).strip())
+        return response.status, data
+
+    async def _stream(self, method: str, path: str, params: dict | None = None, body: bytes | None = None, content_type: str = "application/json"):
+        """Opens a streaming request on a dedicated connection; yields (response, body iterator, writer)."""
+        reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=2**20)
+        try:
+            await self._send(writer, method, self._target(path, params), body, content_type)
+            response = await self._read_head(reader)
+            if response.status >= 400:
+                payload = b"".join([chunk async for chunk in self._iter_body(reader, response)])
+                try:
+                    message = json.loads(payload).get("message", "")
+                except ValueError:
+                    message = payload.decode(errors="replace")
+                raise DockerError(response.status, str(message or response.reason).strip())
+        except BaseException:
+            writer.close()
+            raise
+        return response, self._iter_body(reader, response), writer
+
+    async def _json_lines(self, method: str, path: str, params: dict | None = None, body: bytes | None = None, content_type: str = "application/json") -> AsyncIterator[dict]:
+        _, chunks, writer = await self._stream(method, path, params, body, content_type)
+        buffer = b""
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+            if buffer.strip():
+                yield json.loads(buffer)
+        finally:
+            writer.close()
+
+    # ----- containers -----
+
+    async def ps(self, all: bool = True, filters: dict[str, list[str]] | None = None) -> list[dict]:
+        """Lists containers (GET /containers/json)."""
+        params = {"all": "1" if all else "0"}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        _, data = await self._request("GET", "/containers/json", params)
+        return data or []
+
+    async def inspect(self, container_id: str) -> dict:
+        """Returns the low-level information of a container (GET /containers/{id}/json)."""
+        _, data = await self._request("GET", f"/containers/{quote(container_id)}/json")
+        return data
+
+    async def state(self, container_id: str) -> str | None:
+        """Returns the container's State.Status (e.g. "running"), or None if the container does not exist."""
+        try:
+            details = await self.inspect(container_id)
+        except DockerError as e:
+            if e.status == 404:
+                return None
+            raise
+        return details["State"]["Status"]
+
+    async def stats(self, container_id: str) -> dict:
+        """Returns one stats sample of a container, including the previous sample for CPU deltas."""
+        _, data = await self._request("GET", f"/containers/{quote(container_id)}/stats", {"stream": "0"})
+        return data
+
+    def stats_stream(self, container_id: str) -> AsyncIterator[dict]:
+        """Streams stats samples of a container, one about every second, until it stops."""
+        return self._json_lines("GET", f"/containers/{quote(container_id)}/stats", {"stream": "1"})
+
+    async def stop(self, container_id: str, timeout: int | None = None):
+        """Stops a container; stopping an already stopped container is not an error."""
+        await self._request("POST", f"/containers/{quote(container_id)}/stop", {"t": timeout})
+
+    async def start(self, container_id: str):
+        """Starts an existing container; starting a running container is not an error."""
+        await self._request("POST", f"/containers/{quote(container_id)}/start")
+
+    async def remove(self, container_id: str, force: bool = False):
+        """Removes a container (DELETE /containers/{id})."""
+        await self._request("DELETE", f"/containers/{quote(container_id)}", {"force": "1" if force else None})
+
+    async def run(self, image: str, name: str, labels: dict[str, str], binds: list[str], memory: int, nano_cpus: int) -> str:
+        """Creates and starts a detached container, like `docker run -d`; returns the container id."""
+        config = {
+            "Image": image,
+            "Labels": labels,
+            "HostConfig": {"Binds": binds, "Memory": memory, "NanoCpus": nano_cpus},
+        }
+        _, data = await self._request("POST", "/containers/create", {"name": name}, json.dumps(config).encode())
+        container_id = data["Id"]
+        await self.start(container_id)
+        return container_id
+
+    async def logs(
+        self,
+        container_id: str,
+        follow: bool = False,
+        tail: int | str = "all",
+        timestamps: bool = False,
+        tty: bool = False,
+        since: str | None = None,
+    ) -> AsyncIterator[tuple[int, bytes]]:
+        """
+        Streams container output as (stream id, payload) tuples.
+        Machine containers run without a TTY, so their output is demultiplexed from the 8-byte framed format.
+        Consecutive frames of the same stream that arrived in one read are joined into a single payload,
+        so a busy container yields a few large payloads instead of one tuple per line.
+        """
+        params = {
+            "stdout": "1",
+            "stderr": "1",
+            "follow": "1" if follow else "0",
+            "tail": str(tail),
+            "timestamps": "1" if timestamps else "0",
+        }
+        if since:
+            params["since"] = since  # Unix time as "seconds[.nanoseconds]"
+        _, chunks, writer = await self._stream("GET", f"/containers/{quote(container_id)}/logs", params)
+        buffer = b""
+        try:
+            async for chunk in chunks:
+                if tty:
+                    yield STDOUT, chunk
+                    continue
+                buffer = buffer + chunk if buffer else chunk
+                view = memoryview(buffer)
+                offset = 0
+                run_stream, run = None, []
+                while len(buffer) - offset >= 8:
+                    size = int.from_bytes(view[offset + 4 : offset + 8], "big")
+                    if len(buffer) - offset < 8 + size:
+                        break
+                    stream_id = buffer[offset]
+                    if stream_id != run_stream and run:
+                        yield run_stream, b"".join(run)
+                        run = []
+                    run_stream = stream_id
+                    run.append(view[offset + 8 : offset + 8 + size])
+                    offset += 8 + size
+                if run:
+                    yield run_stream, b"".join(run)
+                view.release()
+                buffer = buffer[offset:]
+        finally:
+            writer.close()
+
+    async def events(self, filters: dict[str, list[str]] | None = None, since: int | None = None) -> AsyncIterator[dict]:
+        """Streams daemon events (GET /events) as decoded JSON messages."""
+        params = {"since": since}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        async for event in self._json_lines("GET", "/events", params):
+            yield event
+
+    # ----- images -----
+
+    async def inspect_image(self, image: str) -> dict:
+        """Returns the low-level information of an image (GET /images/{name}/json)."""
+        _, data = await self._request("GET", f"/images/{quote(image, safe='')}/json")
+        return data
+
+    async def build(
+        self,
+        context: bytes,
+        tag: str,
+        on_log: Callable[[str], None] | None = None,
+        nocache: bool = False,
+        labels: dict[str, str] | None = None,
+    ) -> list[str]:
+        """
+        Builds an image from a tar build context (POST /build), like `docker build -t <tag>`.
+        Output lines are passed to `on_log` as they arrive; a build error raises DockerError.
+        """
+        params = {"t": tag, "rm": "1", "nocache": "1" if nocache else None, "labels": json.dumps(labels) if labels else None}
+        log_lines = []
+        async for message in self._json_lines("POST", "/build", params, context, "application/x-tar"):
+            if "error" in message:
+                raise DockerError(500, message["error"].strip())
+            text = message.get("stream") or message.get("status")
+            if not text:
+                continue
+            for line in text.splitlines():
+                if line.strip():
+                    log_lines.append(line)
+                    if on_log:
+                        on_log(line)
+        return log_lines
+
+
+def _binary_size(size: float) -> str:
+    """Formats bytes like the Docker CLI's memory columns (e.g. "12.5MiB")."""
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            return f"{size:.4g}{unit}"
+        size /= 1024
+    return f"{size:.4g}TiB"
+
+
+def _decimal_size(size: float) -> str:
+    """Formats bytes like the Docker CLI's network columns (e.g. "1.2kB")."""
+    for unit in ("B", "kB", "MB", "GB", "TB"):
+        if size < 1000 or unit == "TB":
+            return f"{size:.4g}{unit}"
+        size /= 1000
+    return f"{size:.4g}TB"
+
+
+def usage_values(stats: dict) -> dict:
+    """Turns an Engine API stats sample into numbers: CPU percent and memory/network bytes."""
+    cpu_stats = stats.get("cpu_stats", {})
+    precpu_stats = stats.get("precpu_stats", {})
+    cpu_delta = cpu_stats.get("cpu_usage", {}).get("total_usage", 0) - precpu_stats.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu_stats.get("system_cpu_usage", 0) - precpu_stats.get("system_cpu_usage", 0)
+    online_cpus = cpu_stats.get("online_cpus") or len(cpu_stats.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    cpu_percent = (cpu_delta / system_delta) * online_cpus * 100.0 if cpu_delta > 0 and system_delta > 0 else 0.0
+
+    memory_stats = stats.get("memory_stats", {})
+    mem_details = memory_stats.get("stats", {})
+    # Same as the CLI: page cache that can be reclaimed is not counted as used memory
+    mem_cache = mem_details.get("inactive_file", mem_details.get("total_inactive_file", 0))
+    mem_usage = max(memory_stats.get("usage", 0) - mem_cache, 0)
+    mem_limit = memory_stats.get("limit", 0)
+
+    networks = stats.get("networks") or {}
+    net_rx = sum(net.get("rx_bytes", 0) for net in networks.values())
+    net_tx = sum(net.get("tx_bytes", 0) for net in networks.values())
+
+    return {"cpu_percent": cpu_percent, "mem_usage": mem_usage, "mem_limit": mem_limit, "net_rx": net_rx, "net_tx": net_tx}
+
+
+def format_usage(values: dict) -> dict:
+    """Formats usage_values() as the same display strings `docker stats` prints."""
+    return {
+        "cpu_percent": f"{values['cpu_percent']:.2f}%",
+        "mem_usage": _binary_size(values["mem_usage"]),
+        "mem_limit": _binary_size(values["mem_limit"]),
+        "net_rx": _decimal_size(values["net_rx"]),
+        "net_tx": _decimal_size(values["net_tx"]),
+    }
+
+
+def usage_from_stats(stats: dict) -> dict:
+    """Turns an Engine API stats sample into the same display strings `docker stats` prints."""
+    return format_usage(usage_values(stats))
+
+
+# Shared client used by the API and the boot script
+docker = DockerClient()
@@ -0,0 +1,224 @@
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+from docker_client import DockerError, docker, tar_files
+
+# Repository of the shared per-distro base images; the tag is a hash of their inputs
+BASE_IMAGE_REPOSITORY = "vmwebgui-base"
+
+# Image label holding the hash of the inputs an image was built from
+INPUTS_HASH_LABEL = "com.vmwebgui.inputs_hash"
+
+# Files baked into every base image, copied from the server's working directory (as create_machine does)
+SHARED_FILES = {"tunnel.sh": Path("tunnel.sh"), "cloudflared": Path("cloudflared")}
+
+
+def package_install_command(docker_image: str) -> str:
+    """Returns the RUN line installing the tools the entrypoint needs, for the image's distro family."""
+    img = docker_image.lower()  # Convert to lowercase for consistent matching
+    if "ubuntu" in img or "debian" in img:
+        return "RUN apt-get update && apt-get install -y wget curl git"
+    elif "alpine" in img:
+        return "RUN apk add --no-cache wget curl"
+    elif "centos" in img or "fedora" in img or "rockylinux" in img or "almalinux" in img:
+        # For RHEL-based, prefer dnf if available, otherwise fall back to yum
+        return "RUN if command -v dnf > /dev/null; then dnf install -y wget curl && dnf clean all; else yum install -y wget curl && yum clean all; fi"
+    # Add more elif conditions for other distros if needed in the future
+    return ""
+
+
+def base_dockerfile(docker_image: str) -> str:
+    """The shared layers: distro packages, cloudflared and tunnel.sh on top of the user-selected image."""
+    return f"""FROM {docker_image}
+
+ENV PYTHONUNBUFFERED=1 \\
+    PYTHONDONTWRITEBYTECODE=1 \\
+    LANG=C.UTF-8 \\
+    LC_ALL=C.UTF-8 \\
+    TZ=UTC \\
+    DEBIAN_FRONTEND=noninteractive
+
+{package_install_command(docker_image)}
+COPY tunnel.sh /
+COPY cloudflared /usr/local/bin/
+RUN chmod +x /usr/local/bin/cloudflared /tunnel.sh
+"""
+
+
+def machine_dockerfile(base_tag: str) -> str:
+    """
+    The per-machine layers on top of its base image. files/ is not copied: it is bind-mounted
+    over /workspace when the container runs.
+    """
+    return f"""FROM {base_tag}
+
+WORKDIR /workspace
+
+COPY entrypoint.sh /
+
+RUN chmod +x /entrypoint.sh
+
+ENTRYPOINT ["/entrypoint.sh"]
+"""
+
+
+class ImageCache:
+    """
+    Two-tier image builds without `--no-cache`.
+
+    A base image per `docker_image` is tagged `vmwebgui-base:<hash of its inputs>` and built
+    only when no image with that tag exists. The per-machine image (tagged with the machine
+    id) only adds the entrypoint; it is rebuilt only when the hash of its Dockerfile,
+    entrypoint.sh and base image differs from the one recorded in its label.
+    """
+
+    def __init__(self):
+        self.base_hits = 0
+        self.base_builds = 0
+        self.machine_hits = 0
+        self.machine_builds = 0
+        # Concurrent starts of machines on the same distro wait for one base build
+        self._base_locks: dict[str, asyncio.Lock] = {}
+        # Host file digests keyed by path, reused while (mtime, size) is unchanged
+        self._file_digests: dict[Path, tuple[float, int, str]] = {}
+        # Size of the build contexts sent and the time until the daemon started answering
+        self.context_bytes_sent = 0
+        self.recent_builds: collections.deque[dict] = collections.deque(maxlen=20)
+
+    def _file_digest(self, path: Path) -> str:
+        st = os.stat(path)
+        cached = self._file_digests.get(path)
+        if cached and cached[:2] == (st.st_mtime, st.st_size):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        self._file_digests[path] = (st.st_mtime, st.st_size, digest.hexdigest())
+        return digest.hexdigest()
+
+    async def _build(self, files: dict[str, Path | bytes], tag: str, on_log: Callable[[str], None] | None, inputs_hash: str):
+        """Builds `tag` from an in-memory context of `files`, recording the context size and send time."""
+        started = time.perf_counter()
+        context = await asyncio.to_thread(tar_files, files)
+        packed = time.perf_counter()
+        first_output = None
+
+        def log(line: str):
+            nonlocal first_output
+            if first_output is None:
+                first_output = time.perf_counter()
+            if on_log:
+                on_log(line)
+
+        await docker.build(context, tag, on_log=log, labels={INPUTS_HASH_LABEL: inputs_hash})
+        finished = time.perf_counter()
+        # The daemon answers once it has received the whole context, so the first output marks the end of the upload
+        send_seconds = (first_output or finished) - packed
+        self.context_bytes_sent += len(context)
+        self.recent_builds.append(
+            {
+                "tag": tag,
+                "context_bytes": len(context),
+                "pack_seconds": round(packed - started, 4),
+                "send_seconds": round(send_seconds, 4),
+                "build_seconds": round(finished - packed, 3),
+            }
+        )
+        print(f"INFO: Sent {len(context) / 1024:.1f} KiB build context for '{tag}' in {send_seconds * 1000:.1f}ms.")
+
+    async def _inputs_hash_of(self, tag: str) -> str | None:
+        """Returns the inputs hash recorded on an image, "" for an unlabelled one, or None if it does not exist."""
+        try:
+            image = await docker.inspect_image(tag)
+        except DockerError as e:
+            if e.status == 404:
+                return None
+            raise
+        return ((image.get("Config") or {}).get("Labels") or {}).get(INPUTS_HASH_LABEL, "")
+
+    async def _base_inputs(self, docker_image: str) -> tuple[str, str, str]:
+        """Returns (tag, inputs hash, Dockerfile) of the base image for `docker_image` without asking Docker."""
+        dockerfile = base_dockerfile(docker_image)
+        digest = hashlib.sha256(dockerfile.encode())
+        for name, path in SHARED_FILES.items():
+            file_digest = await asyncio.to_thread(self._file_digest, path)
+            digest.update(f"\0{name}\0{file_digest}".encode())
+        inputs_hash = digest.hexdigest()
+        return f"{BASE_IMAGE_REPOSITORY}:{inputs_hash[:16]}", inputs_hash, dockerfile
+
+    async def launch_fingerprint(self, docker_image: str, container_path: Path, run_config: dict) -> str:
+        """
+        Hashes everything a machine's container is made from: its generated Dockerfile (and so
+        its base image inputs), entrypoint.sh and the run configuration (settings, limits, name).
+        entrypoint.sh must already be written to `container_path`.
+        """
+        base_tag, _, _ = await self._base_inputs(docker_image)
+        digest = hashlib.sha256(machine_dockerfile(base_tag).encode())
+        digest.update(b"\0entrypoint.sh\0" + (container_path / "entrypoint.sh").read_bytes())
+        digest.update(b"\0run\0" + json.dumps(run_config, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    async def base_image(self, docker_image: str, on_log: Callable[[str], None] | None = None) -> str:
+        """Returns the tag of the base image for `docker_image`, building it first if needed."""
+        tag, inputs_hash, dockerfile = await self._base_inputs(docker_image)
+
+        async with self._base_locks.setdefault(tag, asyncio.Lock()):
+            if await self._inputs_hash_of(tag) is not None:
+                self.base_hits += 1
+                return tag
+            print(f"INFO: Building base image '{tag}' for '{docker_image}'.")
+            await self._build({"Dockerfile": dockerfile.encode(), **SHARED_FILES}, tag, on_log, inputs_hash)
+            self.base_builds += 1
+            return tag
+
+    async def machine_image(
+        self, machine_id: str, docker_image: str, container_path: Path, on_log: Callable[[str], None] | None = None
+    ) -> str:
+        """
+        Writes the machine's Dockerfile and returns the tag of its image, building it only if
+        its inputs changed. entrypoint.sh must already be written to `container_path`.
+        """
+        base_tag = await self.base_image(docker_image, on_log)
+        dockerfile = machine_dockerfile(base_tag)
+        with open(container_path / "Dockerfile", "w") as f:
+            f.write(dockerfile)
+
+        entrypoint = (container_path / "entrypoint.sh").read_bytes()
+        digest = hashlib.sha256(dockerfile.encode())
+        digest.update(b"\0entrypoint.sh\0" + entrypoint)
+        inputs_hash = digest.hexdigest()
+        tag = machine_id.lower()  # Use machine_id as the image tag
+
+        if await self._inputs_hash_of(tag) == inputs_hash:
+            self.machine_hits += 1
+            if on_log:
+                on_log(f"Image '{tag}' is up to date, skipping build.")
+            return tag
+
+        # Only the two files the Dockerfile uses are sent, never the machine's files/ tree
+        await self._build({"Dockerfile": dockerfile.encode(), "entrypoint.sh": entrypoint}, tag, on_log, inputs_hash)
+        self.machine_builds += 1
+        return tag
+
+    def stats(self) -> dict:
+        def tier(hits: int, builds: int) -> dict:
+            total = hits + builds
+            return {"hits": hits, "builds": builds, "hit_rate": round(hits / total, 3) if total else None}
+
+        return {
+            "base": tier(self.base_hits, self.base_builds),
+            "machine": tier(self.machine_hits, self.machine_builds),
+            "context_bytes_sent": self.context_bytes_sent,
+            "recent_builds": list(self.recent_builds),
+        }
+
+
+# Shared image cache used by the API and the boot script
+image_cache = ImageCache()
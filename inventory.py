@@ -0,0 +1,71 @@
+import datetime
+
+from machine_state import machine_states
+
+
+def status_from_state(state: str) -> str:
+    """Maps an Engine API container state (e.g. "running") to a simplified machine status."""
+    if state in ("running", "paused"):
+        return "Running"
+    elif state in ("exited", "dead"):
+        return "Stopped"
+    elif state in ("created", "restarting"):
+        return "Starting"
+    elif state == "removing":
+        return "Stopping"
+    return "Unknown"  # Fallback for other states
+
+
+def format_uptime(since: datetime.datetime) -> str:
+    """Formats the time elapsed since `since` as "Xh Ym Zs"."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    total_seconds = int((now - since).total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours}h {minutes}m {seconds}s"
+
+
+def merge_machine_status(machine_info: dict, container: dict | None, transition: str | None = None) -> dict:
+    """Fills in status, uptime and container_id of a machine record from its cached container state (if any)."""
+    machine_info["docker_image"] = machine_info.get("docker_image", "N/A")
+    if container is None:
+        machine_info["status"] = "Stopped"  # Container not found in Docker
+        machine_info["uptime"] = "N/A"
+        machine_info["container_id"] = None
+    else:
+        machine_info["status"] = status_from_state(container["state"])
+        machine_info["container_id"] = container["container_id"]
+        machine_info["uptime"] = format_uptime(container["started_at"]) if container["started_at"] else "N/A"
+
+    # "Starting"/"Stopping" only come from operations in flight; anything persisted by older versions is ignored
+    if transition:
+        machine_info["status"] = transition
+    return machine_info
+
+
+async def list_machines(records: list[dict]) -> list[dict]:
+    """
+    Returns the given machine records (copies from the registry) merged with their Docker state.
+    The state comes from the event-fed cache; while it is not in sync, one label-scoped
+    container listing refreshes it.
+    """
+    if not records:
+        return records
+
+    if not machine_states.ready:
+        try:
+            await machine_states.reconcile()
+        except Exception as docker_e:
+            print(f"Error querying Docker for machine containers: {docker_e}")
+            for machine_info in records:
+                machine_info["status"] = machine_states.transitions.get(machine_info.get("id"), "Docker Error")  # Indicate Docker issue
+                machine_info["uptime"] = "N/A"
+                machine_info["container_id"] = None
+            return records
+
+    containers = machine_states.snapshot()
+    return [
+        merge_machine_status(machine_info, containers.get(machine_info.get("id")), machine_states.transitions.get(machine_info.get("id")))
+        for machine_info in records
+    ]
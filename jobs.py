@@ -0,0 +1,155 @@
+import asyncio
+import collections
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable
+
+# Seconds a finished job (and its event history) stays available to late subscribers
+JOB_RETENTION = 600
+
+# Events kept per job for replay; older build log lines are dropped first
+MAX_JOB_EVENTS = 2000
+
+
+class JobError(Exception):
+    """Raised by a job's coroutine to fail the job with a user-facing message."""
+
+
+class Job:
+    """
+    A background operation on a machine whose progress can be followed.
+
+    Progress is published as events: {"type": "phase", "phase"}, {"type": "log", "line"} and
+    a final {"type": "done", "status", "result", "error"}. Every event carries a sequence
+    number "seq" so followers can resume after reconnecting.
+    """
+
+    def __init__(self, machine_id: str, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.machine_id = machine_id
+        self.kind = kind
+        self.status = "pending"  # pending, running, succeeded, failed
+        self.phase = "queued"
+        self.result = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.events: collections.deque[dict] = collections.deque(maxlen=MAX_JOB_EVENTS)
+        self._seq = 0
+        self._subscribers: set[asyncio.Queue] = set()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def publish(self, event: dict):
+        self._seq += 1
+        event = {"seq": self._seq, **event}
+        self.events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def set_phase(self, phase: str):
+        self.phase = phase
+        self.publish({"type": "phase", "phase": phase})
+
+    def log(self, line: str):
+        self.publish({"type": "log", "line": line})
+
+    def finish(self, status: str, result=None, error: str | None = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self.publish({"type": "done", "status": status, "result": result, "error": error})
+
+    async def follow(self, after: int = 0) -> AsyncIterator[dict]:
+        """Yields the recorded events with seq > `after`, then live ones until the job is done."""
+        history = [event for event in self.events if event["seq"] > after]
+        if self.done:
+            for event in history:
+                yield event
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            for event in history:
+                yield event
+            while True:
+                event = await queue.get()
+                yield event
+                if event["type"] == "done":
+                    return
+        finally:
+            self._subscribers.discard(queue)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "machine_id": self.machine_id,
+            "kind": self.kind,
+            "status": self.status,
+            "phase": self.phase,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs jobs as background tasks and keeps them around for JOB_RETENTION seconds after they finish."""
+
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def active(self, machine_id: str, kind: str) -> Job | None:
+        """Returns the unfinished job of the given kind for a machine, if there is one."""
+        for job in self.jobs.values():
+            if job.machine_id == machine_id and job.kind == kind and not job.done:
+                return job
+        return None
+
+    def submit(self, machine_id: str, kind: str, run: Callable[[Job], Awaitable]) -> Job:
+        """Starts `run(job)` in the background and returns the job right away."""
+        self._prune()
+        job = Job(machine_id, kind)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable]):
+        job.status = "running"
+        try:
+            result = await run(job)
+        except JobError as e:
+            job.finish("failed", error=str(e))
+        except asyncio.CancelledError:
+            job.finish("failed", error="Job was cancelled.")
+            raise
+        except Exception as e:
+            print(f"ERROR: {job.kind} job {job.id} for machine {job.machine_id} failed: {e}")
+            job.finish("failed", error=f"An unexpected error occurred: {e}")
+        else:
+            job.finish("succeeded", result=result)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def stop(self):
+        """Cancels jobs still running (call from the FastAPI lifespan)."""
+        tasks = [job.task for job in self.jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Shared job manager used by the start endpoint
+job_manager = JobManager()
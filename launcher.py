@@ -0,0 +1,233 @@
+import contextlib
+import os
+import stat
+import time
+from pathlib import Path
+from typing import Callable
+
+from docker_client import DockerError, docker, memory_bytes
+from images import image_cache
+from machine_state import MACHINE_LABEL
+from registry import machine_registry
+
+# Launch stages in pipeline order, with the phase shown to users while each one runs.
+# "restart" replaces build/remove-old/run when nothing changed since the last launch.
+STAGES = {
+    "render": "preparing",
+    "restart": "restarting existing container",
+    "build": "building image",
+    "remove-old": "removing old container",
+    "run": "starting container",
+    "verify": "verifying",
+}
+
+
+class LaunchError(Exception):
+    """Raised when a launch stage fails; `stage` names the stage."""
+
+    def __init__(self, stage: str, message: str):
+        self.stage = stage
+        self.message = message
+        super().__init__(f"{stage}: {message}")
+
+
+class LaunchMetrics:
+    """Per-stage timing of all launches since the process started."""
+
+    def __init__(self):
+        self.launches = 0
+        self.restarts = 0
+        self.failures = 0
+        self.stages: dict[str, dict] = {}
+
+    def record(self, stage: str, seconds: float):
+        entry = self.stages.setdefault(stage, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0})
+        entry["count"] += 1
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        entry["last_seconds"] = seconds
+
+    def stats(self) -> dict:
+        return {
+            "launches": self.launches,
+            "restarts": self.restarts,
+            "failures": self.failures,
+            "stages": {
+                stage: {
+                    "count": entry["count"],
+                    "avg_seconds": round(entry["total_seconds"] / entry["count"], 4),
+                    "max_seconds": round(entry["max_seconds"], 4),
+                    "last_seconds": round(entry["last_seconds"], 4),
+                }
+                for stage, entry in self.stages.items()
+            },
+        }
+
+
+def render_entrypoint(machine_info: dict) -> str:
+    """Generates the machine's entrypoint.sh: tunnel, URL registration, then the install/build/run commands."""
+    machine_id = machine_info["id"]
+    settings = machine_info.get("settings", {})
+    install_command = settings.get("install_command", "")
+    build_command = settings.get("build_command", "")
+
+    payload = (
+        repr(
+            {
+                "authorization": os.getenv("AUTHORIZATION", "bruh"),
+                "instance_id": machine_id,
+                "redirect_url": r"%s",
+                "unique_id": settings.get("unique_path") or machine_id,
+            }
+        )
+        .strip('"')
+        .replace("'", '"')
+    )
+
+    # Safe to run again: a fast restart starts the same container, so /tunnel.sh must stay and
+    # the address of the previous run's (now dead) tunnel must not be registered again
+    entrypoint_content = [
+        "#!/bin/bash",
+        "rm -f /workspace/.webaddr",
+        "/tunnel.sh %s" % (settings.get("forwarding_port") or "5000"),
+        r"""[ -s /workspace/.webaddr ] && curl -X POST -H "Content-Type: application/json" -d "$(printf '%s' "$(head -n 1 /workspace/.webaddr | tr -d '\r\n')")" https://goto-tau.vercel.app/shorten > /dev/null 2>&1"""
+        % payload,
+        'echo "\x1b[1m\x1b[34m===== 🔧  Installing Dependencies%s... =====\x1b[0m\n"' % ("( Skipped )" if not install_command else ""),
+        install_command,
+        'echo "\x1b[1m\x1b[34m===== 🛠️  Building Application%s... =====\x1b[0m\n"' % ("( Skipped )" if not build_command else ""),
+        build_command,
+        'echo "\x1b[1m\x1b[34m===== 🚀  Starting Application... =====\x1b[0m\n"',
+        settings.get("run_command", None),
+        "tail -f /dev/null",
+    ]
+    return "\n".join([line for line in entrypoint_content if line])
+
+
+async def launch_machine(
+    machine_info: dict,
+    on_phase: Callable[[str], None] | None = None,
+    on_log: Callable[[str], None] | None = None,
+) -> dict:
+    """
+    Brings a machine's container up and records it in the machine registry.
+
+    Stages: render (entrypoint.sh and launch fingerprint), build (cached image), remove-old,
+    run, verify. When the fingerprint matches the last launch and its container still exists,
+    a single "restart" stage starts that container instead (if that fails, the launch goes on
+    with the full pipeline). The image is built before the old
+    container is removed, so a running machine stays up during the build.
+
+    Returns {"container_id", "status", "restarted", "timings"}; raises LaunchError.
+    """
+    machine_id = machine_info["id"]
+    name = machine_info.get("name", f"machine-{machine_id}")
+    docker_image = machine_info.get("docker_image")
+    ram = machine_info.get("ram", "N/A")
+    core = machine_info.get("core", "N/A")
+    container_path = Path("workspace") / f"container-{machine_id}"
+    host_files_path = container_path / "files"
+    timings: dict[str, float] = {}
+    launch_metrics.launches += 1
+
+    @contextlib.contextmanager
+    def stage(stage_name: str):
+        if on_phase:
+            on_phase(STAGES[stage_name])
+        started = time.perf_counter()
+        try:
+            yield
+        except LaunchError:
+            raise
+        except DockerError as e:
+            raise LaunchError(stage_name, f"Docker API error: {e}")
+        except Exception as e:
+            raise LaunchError(stage_name, f"An unexpected error occurred: {e}")
+        finally:
+            timings[stage_name] = time.perf_counter() - started
+            launch_metrics.record(stage_name, timings[stage_name])
+
+    def finish(container_id: str, status: str, restarted: bool, **record_fields) -> dict:
+        machine_registry.update(machine_id, status=status, container_id=container_id, last_started_at=time.time(), **record_fields)
+        summary = ", ".join(f"{stage_name} {seconds * 1000:.0f}ms" for stage_name, seconds in timings.items())
+        print(f"INFO: Launched machine {name} ({machine_id}) in container {container_id}: {summary}.")
+        return {"container_id": container_id, "status": status, "restarted": restarted, "timings": {k: round(v, 4) for k, v in timings.items()}}
+
+    try:
+        with stage("render"):
+            if not docker_image:
+                raise LaunchError("render", "Docker image not specified in machine settings.")
+            if not container_path.exists():
+                raise LaunchError("render", f"Container directory {container_path} not found.")
+            host_files_path.mkdir(parents=True, exist_ok=True)
+
+            entrypoint_path = container_path / "entrypoint.sh"
+            with open(entrypoint_path, "w", newline="\n") as f:
+                f.write(render_entrypoint(machine_info))
+            st = os.stat(entrypoint_path)
+            os.chmod(entrypoint_path, st.st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+            run_config = {"name": name, "ram": ram, "core": core, "settings": machine_info.get("settings", {}), "files": str(host_files_path.resolve())}
+            fingerprint = await image_cache.launch_fingerprint(docker_image, container_path, run_config)
+            existing_containers = await docker.ps(all=True, filters={"label": [f"{MACHINE_LABEL}={machine_id}"]})
+
+        # Nothing the container is made from changed since the last successful launch: start it in place
+        if machine_info.get("launch_fingerprint") == fingerprint and len(existing_containers) == 1:
+            container_id = existing_containers[0]["Id"]
+            try:
+                with stage("restart"):
+                    if existing_containers[0]["State"] != "running":
+                        await docker.start(container_id)
+            except LaunchError as e:
+                # The container can't come back as it is: rebuild and replace it instead
+                print(f"WARNING: Restarting container {container_id} of machine {machine_id} failed ({e.message}); launching a new one.")
+            else:
+                launch_metrics.restarts += 1
+                return finish(container_id, "Running", restarted=True)
+
+        with stage("build"):
+            try:
+                image_tag = await image_cache.machine_image(machine_id, docker_image, container_path, on_log=on_log)
+            except DockerError as e:
+                raise LaunchError("build", f"Docker image build failed: {e.message}")
+
+        with stage("remove-old"):
+            for existing_container in existing_containers:
+                existing_container_id = existing_container["Id"]
+                print(f"INFO: Removing previous Docker container {existing_container_id} of machine {machine_id}.")
+                try:
+                    await docker.stop(existing_container_id)
+                    await docker.remove(existing_container_id)
+                except DockerError as e:
+                    if e.status != 404:  # Already gone
+                        raise
+
+        with stage("run"):
+            container_id = await docker.run(
+                image_tag,
+                f"vmwebgui-{machine_id}-{name.replace(' ', '-').lower()}",
+                labels={
+                    MACHINE_LABEL: machine_id,
+                    "com.vmwebgui.machine_name": name,
+                    "com.vmwebgui.ram": str(ram),
+                    "com.vmwebgui.core": str(core),
+                },
+                binds=[f"{str(host_files_path.resolve())}:/workspace"],
+                memory=memory_bytes(ram),  # Memory limit
+                nano_cpus=int(float(core) * 1e9),  # CPU limit
+            )
+
+        with stage("verify"):
+            container_details = await docker.inspect(container_id)
+            state = container_details["State"]["Status"]
+            if state in ("exited", "dead"):
+                raise LaunchError("verify", f"Container exited right after starting (exit code {container_details['State'].get('ExitCode')}).")
+
+        # The fingerprint lets the next launch reuse this container
+        return finish(container_id, state.capitalize(), restarted=False, launch_fingerprint=fingerprint)
+    except LaunchError:
+        launch_metrics.failures += 1
+        raise
+
+
+# Stage timings of all launches, shared by the API and the boot script
+launch_metrics = LaunchMetrics()
@@ -0,0 +1,351 @@
+import asyncio
+import bisect
+import calendar
+import codecs
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator
+
+from docker_client import DockerError, docker
+from loghub import lines_after
+from machine_state import machine_states
+from registry import machine_registry
+
+# Compressed bytes per segment file before a new one is started
+ARCHIVE_SEGMENT_BYTES = 8 * 1024 * 1024
+
+# Segments kept per machine; the oldest is deleted when a new one would exceed this
+ARCHIVE_MAX_SEGMENTS = 8
+
+# Uncompressed bytes of output compressed together into one independently readable block
+ARCHIVE_BLOCK_BYTES = 256 * 1024
+
+# Seconds captured output may wait in memory before it is written as a (smaller) block
+ARCHIVE_FLUSH_INTERVAL = 2
+
+INDEX_FILE = "index.jsonl"
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """Converts the daemon's "2024-01-01T00:00:00.000000000Z" log timestamps to Unix time."""
+    base, _, fraction = timestamp.rstrip("Z").partition(".")
+    seconds = calendar.timegm(time.strptime(base, "%Y-%m-%dT%H:%M:%S"))
+    return seconds + float(f"0.{fraction}") if fraction else float(seconds)
+
+
+def format_timestamp(unix_time: float) -> str:
+    """Formats Unix time like the prefix of a log timestamp, to microseconds, for comparing against archived lines."""
+    seconds = int(unix_time)
+    micros = round((unix_time - seconds) * 1e6)
+    if micros == 1_000_000:
+        seconds, micros = seconds + 1, 0
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{micros:06d}"
+
+
+def _since_param(timestamp: str) -> str:
+    """Turns a log timestamp into the `since` value of the logs API, at full nanosecond precision."""
+    base, _, fraction = timestamp.rstrip("Z").partition(".")
+    return f"{calendar.timegm(time.strptime(base, '%Y-%m-%dT%H:%M:%S'))}.{fraction or '0'}"
+
+
+class MachineLogArchive:
+    """
+    A machine's container output in gzip segments under workspace/container-<id>/logs/.
+
+    Output is written in blocks: each block is a separate gzip member appended to the current
+    segment, so it can be decompressed on its own. index.jsonl records every block's segment,
+    offset, length, line count and first/last timestamp, so reads by time or from the end
+    decompress only the blocks they need. Lines are stored with their daemon timestamp prefix.
+    """
+
+    def __init__(self, machine_id: str, path: Path):
+        self.machine_id = machine_id
+        self.path = path
+        self.blocks: list[dict] = []
+        self.pending: list[str] = []
+        self.pending_bytes = 0
+        self._lock = asyncio.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        index_path = self.path / INDEX_FILE
+        if not index_path.is_file():
+            return
+        with open(index_path) as f:
+            for line in f:
+                try:
+                    self.blocks.append(json.loads(line))
+                except ValueError:
+                    break  # A torn last line from a crash; the block it described is ignored
+
+    @property
+    def last_timestamp(self) -> str | None:
+        """Timestamp of the newest captured line, archived or still pending."""
+        if self.pending:
+            return self.pending[-1].split(" ", 1)[0]
+        return self.blocks[-1]["last_ts"] if self.blocks else None
+
+    # ----- writes -----
+
+    def append(self, text: str):
+        """Adds captured lines (whole, timestamped) to the pending block."""
+        self.pending.append(text)
+        self.pending_bytes += len(text)
+
+    async def flush(self):
+        """Compresses the pending output into a block and appends it to the archive."""
+        async with self._lock:
+            if not self.pending:
+                return
+            text = "".join(self.pending)
+            self.pending, self.pending_bytes = [], 0
+            entry, removed_segment = await asyncio.to_thread(self._write_block, text)
+            self.blocks.append(entry)
+            if removed_segment:
+                self.blocks = [block for block in self.blocks if block["segment"] != removed_segment]
+
+    def _write_block(self, text: str) -> tuple[dict, str | None]:
+        # Not parents=True: a deleted machine's directory must not come back
+        self.path.mkdir(exist_ok=True)
+        data = gzip.compress(text.encode(), compresslevel=6)
+        segments = sorted(p.name for p in self.path.glob("segment-*.log.gz"))
+        segment = segments[-1] if segments else None
+        if segment is None or (self.path / segment).stat().st_size + len(data) > ARCHIVE_SEGMENT_BYTES:
+            number = int(segment[len("segment-") : -len(".log.gz")]) + 1 if segment else 1
+            segment = f"segment-{number:06d}.log.gz"
+            segments.append(segment)
+
+        with open(self.path / segment, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        first_ts = text.split(" ", 1)[0]
+        last_ts = text[text.rfind("\n", 0, len(text) - 1) + 1 :].split(" ", 1)[0]
+        entry = {
+            "segment": segment,
+            "offset": offset,
+            "length": len(data),
+            "lines": text.count("\n"),
+            "first": parse_timestamp(first_ts),
+            "last": parse_timestamp(last_ts),
+            "last_ts": last_ts,
+        }
+
+        removed_segment = None
+        if len(segments) > ARCHIVE_MAX_SEGMENTS:
+            removed_segment = segments[0]
+            kept = [block for block in self.blocks if block["segment"] != removed_segment] + [entry]
+            self._write_index(kept)
+            os.remove(self.path / removed_segment)
+        else:
+            with open(self.path / INDEX_FILE, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry, removed_segment
+
+    def _write_index(self, blocks: list[dict]):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=f".{INDEX_FILE}.", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.writelines(json.dumps(block) + "\n" for block in blocks)
+        os.replace(temp_path, self.path / INDEX_FILE)
+
+    # ----- reads -----
+
+    def _read_block(self, block: dict) -> str:
+        with open(self.path / block["segment"], "rb") as f:
+            f.seek(block["offset"])
+            return gzip.decompress(f.read(block["length"])).decode(errors="replace")
+
+    async def _block_texts(self, blocks: list[dict]) -> AsyncIterator[str]:
+        for block in blocks:
+            try:
+                yield await asyncio.to_thread(self._read_block, block)
+            except FileNotFoundError:
+                continue  # Rotated away while we were reading
+
+    async def read(self, since: float | None = None, until: float | None = None) -> AsyncIterator[str]:
+        """Yields chunks of archived lines with timestamps in [since, until], oldest first."""
+        blocks = list(self.blocks)
+        start = bisect.bisect_left([block["last"] for block in blocks], since) if since is not None else 0
+        selected = [block for block in blocks[start:] if until is None or block["first"] <= until]
+        since_ts = format_timestamp(since) if since is not None else None
+        until_ts = format_timestamp(until) if until is not None else None
+
+        async def chunks():
+            async for text in self._block_texts(selected):
+                yield text
+            if self.pending:
+                yield "".join(self.pending)
+
+        async for text in chunks():
+            # Only blocks straddling a bound need their lines filtered (timestamps are fixed width)
+            if (since_ts and text[: len(since_ts)] < since_ts) or (until_ts and text[text.rfind("\n", 0, len(text) - 1) + 1 :][: len(until_ts)] > until_ts):
+                text = "".join(
+                    line for line in text.splitlines(keepends=True) if (not since_ts or line[: len(since_ts)] >= since_ts) and (not until_ts or line[: len(until_ts)] <= until_ts)
+                )
+            if text:
+                yield text
+
+    async def tail(self, lines: int) -> AsyncIterator[str]:
+        """Yields the last `lines` archived lines, decompressing only the blocks that hold them."""
+        pending = "".join(self.pending)
+        needed = lines - pending.count("\n")
+        blocks = list(self.blocks)
+        start = len(blocks)
+        while needed > 0 and start > 0:
+            start -= 1
+            needed -= blocks[start]["lines"]
+
+        skip = max(0, -needed)  # Lines of the first block that fall before the requested window
+        async for text in self._block_texts(blocks[start:]):
+            if skip:
+                cut = 0
+                for _ in range(skip):
+                    cut = text.index("\n", cut) + 1
+                text, skip = text[cut:], 0
+            yield text
+        if pending:
+            yield "".join(pending.splitlines(keepends=True)[-lines:])
+
+    async def search(self, pattern: re.Pattern, since: float | None = None, until: float | None = None, limit: int = 1000) -> AsyncIterator[str]:
+        """Yields up to `limit` archived lines matching `pattern`."""
+        matches = 0
+        async for text in self.read(since, until):
+            if not pattern.search(text):
+                continue  # Most chunks have no match; skip splitting them into lines
+            for line in text.splitlines(keepends=True):
+                if pattern.search(line):
+                    yield line
+                    matches += 1
+                    if matches >= limit:
+                        return
+
+    def stats(self) -> dict:
+        segments = {block["segment"] for block in self.blocks}
+        return {
+            "segments": len(segments),
+            "blocks": len(self.blocks),
+            "lines": sum(block["lines"] for block in self.blocks),
+            "compressed_bytes": sum(block["length"] for block in self.blocks),
+            "pending_bytes": self.pending_bytes,
+            "oldest": self.blocks[0]["first"] if self.blocks else None,
+            "newest": self.blocks[-1]["last"] if self.blocks else None,
+        }
+
+
+class LogArchive:
+    """
+    Captures the output of every running machine container into its MachineLogArchive.
+
+    A background loop starts one capture per running container (as seen by the machine state
+    cache), resuming after the last archived timestamp, and writes pending output every
+    ARCHIVE_FLUSH_INTERVAL seconds. Output survives container removal on restart.
+    """
+
+    def __init__(self, workspace_path: Path = Path("workspace")):
+        self.workspace_path = workspace_path
+        self.archives: dict[str, MachineLogArchive] = {}
+        self.captures: dict[str, tuple[str, asyncio.Task]] = {}
+        self._task: asyncio.Task | None = None
+
+    def archive(self, machine_id: str) -> MachineLogArchive:
+        archive = self.archives.get(machine_id)
+        if archive is None:
+            archive = self.archives[machine_id] = MachineLogArchive(machine_id, self.workspace_path / f"container-{machine_id}" / "logs")
+        return archive
+
+    def start(self):
+        """Starts the capture loop (call from the FastAPI lifespan)."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops capturing and writes the output still pending."""
+        tasks = [self._task] if self._task else []
+        tasks += [task for _, task in self.captures.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self.captures = {}
+        for archive in list(self.archives.values()):
+            await self._flush(archive)
+
+    async def _flush(self, archive: MachineLogArchive):
+        try:
+            await archive.flush()
+        except OSError as e:
+            print(f"WARNING: Could not write log archive of machine {archive.machine_id}: {e}")
+
+    async def _run(self):
+        while True:
+            self.sync()
+            for archive in list(self.archives.values()):
+                await self._flush(archive)
+            await asyncio.sleep(ARCHIVE_FLUSH_INTERVAL)
+
+    def sync(self):
+        """Starts captures for running containers and drops those of removed machines."""
+        for machine_id in list(self.captures):
+            container_id, task = self.captures[machine_id]
+            if task.done() or machine_id not in machine_registry:
+                task.cancel()
+                del self.captures[machine_id]
+        for machine_id in list(self.archives):
+            if machine_id not in machine_registry:
+                del self.archives[machine_id]
+
+        for machine_id, container in machine_states.snapshot().items():
+            if container["state"] != "running" or machine_id not in machine_registry:
+                continue
+            capture = self.captures.get(machine_id)
+            if capture and capture[0] == container["container_id"]:
+                continue
+            if capture:
+                capture[1].cancel()  # Replaced by a new container
+            task = asyncio.create_task(self._capture(machine_id, container["container_id"]))
+            self.captures[machine_id] = (container["container_id"], task)
+
+    async def _capture(self, machine_id: str, container_id: str):
+        archive = self.archive(machine_id)
+        last_ts = archive.last_timestamp
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        logs_stream = docker.logs(container_id, follow=True, timestamps=True, since=_since_param(last_ts) if last_ts else None)
+        try:
+            async for _, payload in logs_stream:
+                text = pending + decoder.decode(payload)
+                cut = text.rfind("\n") + 1
+                pending = text[cut:]
+                if not cut:
+                    continue
+                text = text[:cut].replace("\r\n", "\n")
+                if last_ts:
+                    # `since` is inclusive: drop lines archived before this capture started
+                    text = lines_after(text, last_ts)
+                    if text:
+                        last_ts = None
+                if text:
+                    archive.append(text)
+                if archive.pending_bytes >= ARCHIVE_BLOCK_BYTES:
+                    await self._flush(archive)
+            pending += decoder.decode(b"", final=True)
+            if pending.strip() and not (last_ts and pending[: len(last_ts)] <= last_ts):
+                archive.append(pending.rstrip("\r") + "\n")
+        except DockerError as e:
+            if e.status != 404:
+                print(f"WARNING: Log capture of machine {machine_id} stopped: {e}")
+        finally:
+            await logs_stream.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "captures": len(self.captures),
+            "machines": {machine_id: archive.stats() for machine_id, archive in self.archives.items()},
+        }
+
+
+# Shared log archive, fed in the background and read by the archive and search endpoints
+log_archive = LogArchive()
@@ -0,0 +1,198 @@
+import asyncio
+import codecs
+import collections
+from typing import AsyncIterator
+
+from docker_client import docker
+
+# Lines of recent output kept per container and replayed to every new viewer
+LOG_HISTORY_LINES = 500
+
+# Chunks queued per viewer before its oldest ones are dropped
+SUBSCRIBER_QUEUE_CHUNKS = 64
+
+# Seconds a container's follower keeps running after its last viewer left
+LOG_FOLLOWER_GRACE = 30
+
+# Marker put on a viewer's queue when the container's output ends
+_END = None
+
+
+def lines_after(text: str, cursor: str) -> str:
+    """
+    Drops the leading lines of timestamped output up to and including `cursor`. Log timestamps
+    are fixed width, so they compare as strings; the cursor of a line is its timestamp.
+    """
+    start = 0
+    while start < len(text) and text[start : start + len(cursor)] <= cursor:
+        end = text.find("\n", start)
+        if end < 0:
+            return ""
+        start = end + 1
+    return text[start:]
+
+
+class LogSubscriber:
+    """One viewer of a container's output, with its own bounded queue."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_CHUNKS)
+        self.dropped_lines = 0
+        self.dropped_through: str | None = None  # Timestamp of the last dropped line
+
+    def put(self, item):
+        """Queues a chunk without waiting; a full queue loses its oldest chunk instead of stalling the follower."""
+        while self.queue.full():
+            dropped = self.queue.get_nowait()
+            if dropped is not _END:
+                self.dropped_lines += dropped.count("\n")
+                self.dropped_through = dropped[dropped.rfind("\n", 0, len(dropped) - 1) + 1 :].split(" ", 1)[0]
+        self.queue.put_nowait(item)
+
+
+class LogStream:
+    """
+    Follows one container's output and fans it out to its subscribers.
+
+    A single Engine API log stream per container feeds a ring buffer of the last
+    LOG_HISTORY_LINES lines and every subscriber's queue. Lines keep the daemon's timestamp
+    prefix, which doubles as the cursor a viewer resumes from. When the last subscriber leaves,
+    the follower keeps running for LOG_FOLLOWER_GRACE seconds so a reload reattaches to it.
+    """
+
+    def __init__(self, hub: "LogHub", container_id: str):
+        self.hub = hub
+        self.container_id = container_id
+        self.history: collections.deque[str] = collections.deque(maxlen=LOG_HISTORY_LINES)
+        self.subscribers: set[LogSubscriber] = set()
+        self.error: Exception | None = None
+        self.finished = False
+        self.lines = 0
+        self._grace: asyncio.TimerHandle | None = None
+        self._task = asyncio.create_task(self._follow())
+
+    async def _follow(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        logs_stream = docker.logs(self.container_id, follow=True, tail=LOG_HISTORY_LINES, timestamps=True)
+        try:
+            async for _, payload in logs_stream:
+                # Only whole lines are published; a partial last line waits for the next read
+                text = pending + decoder.decode(payload)
+                cut = text.rfind("\n") + 1
+                pending = text[cut:]
+                if cut:
+                    self._publish(text[:cut].replace("\r\n", "\n"))
+            pending += decoder.decode(b"", final=True)
+            if pending:
+                self._publish(pending.rstrip("\r") + "\n")
+        except Exception as e:
+            self.error = e  # Raised to every subscriber
+        finally:
+            await logs_stream.aclose()
+            self.finished = True
+            self.hub._discard(self)
+            for subscriber in self.subscribers:
+                subscriber.put(_END)
+
+    def _publish(self, text: str):
+        lines = text.splitlines(keepends=True)
+        self.lines += len(lines)
+        self.history.extend(lines)
+        for subscriber in self.subscribers:
+            subscriber.put(text)
+
+    def attach(self, after: str | None = None) -> tuple[LogSubscriber, str]:
+        """Adds a subscriber and returns it with the buffered lines after the `after` cursor."""
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+        subscriber = LogSubscriber()
+        self.subscribers.add(subscriber)
+        history = list(self.history)
+        start = len(history)
+        if after:
+            while start > 0 and history[start - 1][: len(after)] > after:
+                start -= 1
+        else:
+            start = 0
+        return subscriber, "".join(history[start:])
+
+    def detach(self, subscriber: LogSubscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and not self.finished:
+            self._grace = asyncio.get_running_loop().call_later(LOG_FOLLOWER_GRACE, self.close)
+
+    def close(self):
+        self._grace = None
+        if not self.subscribers:
+            self._task.cancel()
+
+    async def wait_closed(self):
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class LogHub:
+    """Shares one log follower per container between all viewers of its output."""
+
+    def __init__(self):
+        self.streams: dict[str, LogStream] = {}
+
+    def _discard(self, stream: LogStream):
+        if self.streams.get(stream.container_id) is stream:
+            del self.streams[stream.container_id]
+
+    async def subscribe(self, container_id: str, after: str | None = None) -> AsyncIterator[str]:
+        """
+        Yields chunks of whole timestamped lines: the buffered recent output after the `after`
+        cursor first, then live output until the container's output ends. Re-raises the error
+        (e.g. DockerError) that stopped the follower.
+        """
+        stream = self.streams.get(container_id)
+        if stream is None:
+            stream = self.streams[container_id] = LogStream(self, container_id)
+        subscriber, history = stream.attach(after)
+        try:
+            if history:
+                yield history
+                after = None
+            while True:
+                item = await subscriber.queue.get()
+                if subscriber.dropped_lines:
+                    # Stamped with the last skipped line, so resuming from it does not bring them back
+                    yield f"{subscriber.dropped_through} [... {subscriber.dropped_lines} lines skipped, this viewer fell behind ...]\n"
+                    subscriber.dropped_lines = 0
+                if item is _END:
+                    if stream.error:
+                        raise stream.error
+                    return
+                if after:
+                    # A new follower replays the daemon's tail, which may overlap what the viewer has
+                    item = lines_after(item, after)
+                    if not item:
+                        continue
+                    after = None
+                yield item
+        finally:
+            stream.detach(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "followers": len(self.streams),
+            "subscribers": sum(len(stream.subscribers) for stream in self.streams.values()),
+            "containers": {
+                container_id: {"subscribers": len(stream.subscribers), "lines": stream.lines, "buffered_lines": len(stream.history)}
+                for container_id, stream in self.streams.items()
+            },
+        }
+
+    async def stop(self):
+        """Stops every follower (call from the FastAPI lifespan)."""
+        streams = list(self.streams.values())
+        for stream in streams:
+            stream._task.cancel()
+        await asyncio.gather(*(stream.wait_closed() for stream in streams))
+
+
+# Shared log hub used by the logs endpoint
+log_hub = LogHub()
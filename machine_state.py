@@ -0,0 +1,213 @@
+import asyncio
+import datetime
+import time
+
+from docker_client import DockerError, docker
+
+# Label set on every container started for a machine (see start_machine)
+MACHINE_LABEL = "com.vmwebgui.machine_id"
+
+# Seconds between two full reconciles against `GET /containers/json`
+RECONCILE_INTERVAL = 60
+
+# Seconds to wait before resubscribing after the events stream broke
+RESUBSCRIBE_DELAY = 5
+
+# Concurrent `inspect` calls a reconcile may issue for containers it has no start time for
+RECONCILE_INSPECT_CONCURRENCY = 8
+
+# Container event actions that change the state we track, mapped to the resulting Engine API state
+EVENT_STATES = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+}
+
+
+def _parse_started_at(started_at: str) -> datetime.datetime | None:
+    # Docker reports "0001-01-01T00:00:00Z" for containers that never started
+    if not started_at or started_at.startswith("0001-"):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(started_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class MachineStateCache:
+    """
+    In-memory table of machine container states, kept current by a single
+    `docker events` subscription on the machine label plus a periodic full reconcile.
+
+    Entries are {"container_id", "state", "started_at"} keyed by machine id. Transient
+    "Starting"/"Stopping" statuses set by the API live here too and are never persisted.
+    """
+
+    def __init__(self, reconcile_interval: int = RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self.containers: dict[str, dict] = {}
+        self.transitions: dict[str, str] = {}
+        # True while the table is known to be in sync with the daemon
+        self.ready = False
+        self.last_reconcile: float | None = None
+        self.events_applied = 0
+        self._tasks: list[asyncio.Task] = []
+        # Machines touched by events while a reconcile is in flight; their event state wins
+        self._changed_during_reconcile: set[str] | None = None
+        # One reconcile at a time: the API and the events watcher may both ask for one at startup
+        self._reconcile_lock = asyncio.Lock()
+
+    # ----- lifecycle -----
+
+    def start(self):
+        """Starts the events watcher and the periodic reconcile (call from the FastAPI lifespan)."""
+        self._tasks = [asyncio.create_task(self._watch_events()), asyncio.create_task(self._reconcile_periodically())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.ready = False
+
+    # ----- queries -----
+
+    def get(self, machine_id: str) -> dict | None:
+        return self.containers.get(machine_id)
+
+    def snapshot(self) -> dict[str, dict]:
+        return dict(self.containers)
+
+    def set_transition(self, machine_id: str, status: str):
+        """Marks a machine as "Starting" or "Stopping" while an API operation is in flight."""
+        self.transitions[machine_id] = status
+
+    def clear_transition(self, machine_id: str):
+        self.transitions.pop(machine_id, None)
+
+    # ----- updates -----
+
+    async def reconcile(self):
+        """
+        Rebuilds the table from one label-scoped container listing. Concurrent calls run one
+        after the other, each with its own listing: a caller that records an events cursor
+        before reconciling must not be handed a listing taken before that cursor.
+        """
+        async with self._reconcile_lock:
+            self._changed_during_reconcile = set()
+            try:
+                fresh = await self._list_containers()
+            finally:
+                changed, self._changed_during_reconcile = self._changed_during_reconcile, None
+            for machine_id in changed:
+                if machine_id in self.containers:
+                    fresh[machine_id] = self.containers[machine_id]
+                else:
+                    fresh.pop(machine_id, None)
+            self.containers = fresh
+            self.last_reconcile = time.time()
+
+    async def _list_containers(self) -> dict[str, dict]:
+        containers = await docker.ps(all=True, filters={"label": [MACHINE_LABEL]})
+        fresh: dict[str, dict] = {}
+        unknown_start: list[str] = []
+        for container in containers:
+            machine_id = (container.get("Labels") or {}).get(MACHINE_LABEL)
+            if not machine_id or machine_id in fresh:
+                continue  # The newest container of a machine is listed first
+            state = container.get("State", "")
+            known = self.containers.get(machine_id)
+            started_at = None
+            if state in ("running", "paused"):
+                if known and known["container_id"] == container["Id"] and known["started_at"]:
+                    started_at = known["started_at"]
+                else:
+                    unknown_start.append(machine_id)
+            fresh[machine_id] = {"container_id": container["Id"], "state": state, "started_at": started_at}
+
+        # The listing has no start time; inspect only the containers we have not seen start
+        semaphore = asyncio.Semaphore(RECONCILE_INSPECT_CONCURRENCY)
+
+        async def fill_started_at(machine_id: str):
+            async with semaphore:
+                try:
+                    details = await docker.inspect(fresh[machine_id]["container_id"])
+                except DockerError:
+                    return
+            fresh[machine_id]["started_at"] = _parse_started_at(details["State"].get("StartedAt", ""))
+
+        await asyncio.gather(*(fill_started_at(machine_id) for machine_id in unknown_start))
+        return fresh
+
+    def apply_event(self, event: dict):
+        """Applies one container event from the daemon to the table."""
+        if event.get("Type") != "container":
+            return
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        machine_id = attributes.get(MACHINE_LABEL)
+        action = event.get("Action", "")
+        if not machine_id:
+            return
+        if self._changed_during_reconcile is not None:
+            self._changed_during_reconcile.add(machine_id)
+
+        container_id = event.get("Actor", {}).get("ID") or event.get("id")
+        if action == "destroy":
+            known = self.containers.get(machine_id)
+            if known and known["container_id"] == container_id:
+                del self.containers[machine_id]
+            self.events_applied += 1
+            return
+
+        state = EVENT_STATES.get(action)
+        if state is None:
+            return  # exec_*, attach, health_status, ... do not change the state
+        event_time = event.get("timeNano", 0) / 1e9 or event.get("time", time.time())
+        known = self.containers.get(machine_id)
+        started_at = known["started_at"] if known and known["container_id"] == container_id else None
+        if action in ("start", "restart"):
+            started_at = datetime.datetime.fromtimestamp(event_time, datetime.timezone.utc)
+        elif state == "exited":
+            started_at = None
+        self.containers[machine_id] = {"container_id": container_id, "state": state, "started_at": started_at}
+        self.events_applied += 1
+
+    # ----- background tasks -----
+
+    async def _watch_events(self):
+        while True:
+            try:
+                # Events since the reconcile started are replayed, so nothing falls in between
+                since = int(time.time())
+                await self.reconcile()
+                self.ready = True
+                print("INFO: Machine state cache synchronized, following Docker events.")
+                async for event in docker.events(filters={"type": ["container"], "label": [MACHINE_LABEL]}, since=since):
+                    self.apply_event(event)
+                print("WARNING: Docker events stream ended. Resubscribing.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WARNING: Docker events stream failed: {e}. Resubscribing in {RESUBSCRIBE_DELAY}s.")
+            self.ready = False
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    async def _reconcile_periodically(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            if not self.ready:
+                continue  # The events watcher reconciles itself when it resubscribes
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WARNING: Periodic machine state reconcile failed: {e}")
+
+
+# Shared state cache, started in the FastAPI lifespan
+machine_states = MachineStateCache()
@@ -1,9 +1,11 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request
+from fastapi import FastAPI, HTTPException, File, Form, Query, Request
 from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 import json
 import shutil
+import errno
+import stat
 import os
 import subprocess
 import asyncio  # Import asyncio for asynchronous operations
@@ -12,14 +14,31 @@ import uuid  # Import uuid for generating unique IDs
 import datetime  # Import datetime for uptime calculation
 import requests  # Import requests for HTTP requests
 from typing import cast
-import stat
+from contextlib import asynccontextmanager
 import traceback  # Import traceback for detailed error logging
-import zipfile  # Import zipfile for handling zip archives
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.requests import ClientDisconnect
 from fastapi.middleware.cors import CORSMiddleware  # Import CORSMiddleware
 from fastapi import Depends, status, Response
 from dotenv import load_dotenv
 import secrets
+import re
+from urllib.parse import quote
+
+import inventory
+import launcher
+import startup
+from machine_state import MACHINE_LABEL, machine_states
+from images import image_cache
+from jobs import Job, JobError, job_manager
+from loghub import log_hub
+from logarchive import log_archive
+from usage import usage_collector
+from uploads import UPLOAD_SESSION_MAX_CHUNK, UploadError, UploadSession, UploadedFile, upload_receiver, upload_sessions
+from archives import ARCHIVE_DOWNLOAD_KINDS, ArchiveError, stream_archive
+from operations import OperationConflict, machine_operations
+from registry import machine_registry
+from docker_client import DockerError, docker
 
 # Load environment variables from .env file
 load_dotenv()
@@ -27,6 +46,14 @@ load_dotenv()
 # Define activity log file path
 ACTIVITY_LOG_FILE = Path("activity.log")
 
+# Largest page /files/content returns, and the read size of /files/download
+FILE_CONTENT_MAX_BYTES = 4 * 1024 * 1024
+FILE_DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# RAM (GB) and core quotas of one machine, enforced when it is created
+MACHINE_RAM_GB = (1, 8)
+MACHINE_CORES = (1, 4)
+
 # Retrieve credentials from environment variables
 USERS_DB = {os.getenv("VM_WEB_GUI_USERNAME", None): os.getenv("VM_WEB_GUI_PASSWORD", None)}
 SECRET_KEY = os.getenv("VM_WEB_GUI_SECRET_KEY", secrets.token_urlsafe(64))
@@ -63,17 +90,6 @@ def log_activity(message: str):
         print(f"ERROR: Failed to write to activity log file: {e}")
 
 
-# Dictionary to store active log processes, mapping machine_id to subprocess.Popen object
-active_log_processes: dict[str, subprocess.Popen] = {}
-# Lock to protect active_log_processes from concurrent access
-log_process_lock = asyncio.Lock()
-
-# In-memory store for historical usage data
-# Structure: {machine_id: [{timestamp: str, cpu_percent: str, mem_usage: str, mem_limit: str, net_rx: str, net_tx: str}, ...]}
-historical_usage_data: dict[str, list[dict]] = {}
-MAX_HISTORY_POINTS = 100  # Keep last 100 data points for history
-
-
 # Define a Pydantic model for the Git clone request body
 class GitCloneRequest(BaseModel):
     repo_url: str
@@ -93,7 +109,38 @@ class UserLogin(BaseModel):
     password: str
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Read every instance_info.json once; handlers work on the in-memory records from here on
+    machine_registry.load()
+    machine_registry.start()
+    # Keep machine container states in memory, fed by the Docker events stream
+    machine_states.start()
+    # Capture the output of running machines into their on-disk log archives
+    log_archive.start()
+    # Sample the usage of running machines continuously, whether or not anyone is watching
+    usage_collector.start()
+    # Remove resumable upload sessions left idle, with their staged data
+    upload_sessions.start()
+    # Optionally boot the machines marked "Running" in the background, so the API is up right away
+    boot_task = asyncio.create_task(startup.boot_machines()) if os.getenv("VM_WEB_GUI_BOOT_MACHINES") == "1" else None
+    yield
+    if boot_task:
+        boot_task.cancel()
+        await asyncio.gather(boot_task, return_exceptions=True)
+    await job_manager.stop()
+    await log_hub.stop()
+    await log_archive.stop()
+    await usage_collector.stop()
+    await upload_sessions.stop()
+    await machine_states.stop()
+    # Write back records that are still dirty
+    await machine_registry.stop()
+    # Close pooled Docker Engine API connections
+    await docker.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add SessionMiddleware
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
@@ -105,6 +152,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["Content-Range", "ETag", "X-File-Size", "X-Content-Offset", "X-Next-Offset"],
 )
 
 # Mount static files for the dashboard
@@ -147,124 +195,8 @@ async def logout(request: Request):
 
 @app.get("/machines", dependencies=[Depends(authenticate_user)])
 async def get_machines():
-    workspace_path = Path("workspace")
-    machines_data = []
-
-    if not workspace_path.exists() or not workspace_path.is_dir():
-        # If workspace doesn't exist, return empty list rather than 404
-        return []
-
-    for container_dir in workspace_path.iterdir():
-        if container_dir.is_dir() and container_dir.name.startswith("container-"):
-            instance_info_path = container_dir / "instance_info.json"
-            if instance_info_path.is_file():
-                try:
-                    with open(instance_info_path, "r") as f:
-                        machine_info = json.load(f)
-                        machine_id = machine_info.get("id")
-
-                        # Preserve "Starting" or "Stopping" status from instance_info.json if set
-                        # This ensures the frontend correctly displays transient states even if Docker's status is not immediately updated or is empty.
-                        current_persisted_status = machine_info.get("status")
-                        if current_persisted_status in ["Starting", "Stopping"]:
-                            # If the persisted status is "Starting" or "Stopping", use it directly
-                            # and skip querying Docker for status, as Docker's output might be inconsistent
-                            # during these brief transition periods.
-                            pass  # No change needed, machine_info already has the correct status
-                        else:
-                            # If not in a transient state, then query Docker for the actual status
-                            machine_info["status"] = "Unknown"  # Default before Docker check
-                            machine_info["uptime"] = "N/A"
-                            machine_info["docker_image"] = machine_info.get("docker_image", "N/A")
-                            machine_info["container_id"] = None
-
-                            # Use docker CLI to find existing container by label
-                            try:
-                                result = await asyncio.to_thread(
-                                    subprocess.run,
-                                    [
-                                        "docker",
-                                        "ps",
-                                        "-a",
-                                        "--filter",
-                                        f"label=com.vmwebgui.machine_id={machine_id}",
-                                        "--format",
-                                        "{{.ID}}\t{{.Status}}\t{{.Image}}\t{{.CreatedAt}}",
-                                    ],
-                                    capture_output=True,
-                                    text=True,
-                                    check=False,
-                                )
-                                if result.stdout.strip():
-                                    parts = result.stdout.strip().split("\t")
-                                    container_id_from_docker = parts[0]
-                                    status_from_docker = parts[1]
-                                    # image_from_docker = parts[2] # No longer needed from docker ps
-                                    created_at_str = parts[2] # Shifted index
-
-                                    # Determine simplified status based on Docker's output
-                                    if status_from_docker.startswith("Up"):
-                                        machine_info["status"] = "Running"
-                                    elif status_from_docker.startswith("Exited"):
-                                        machine_info["status"] = "Stopped"
-                                    elif status_from_docker.startswith("Created") or status_from_docker.startswith("Restarting"):
-                                        machine_info["status"] = "Starting"
-                                    elif status_from_docker.startswith("Stopping"):
-                                        machine_info["status"] = "Stopping"
-                                    else:
-                                        machine_info["status"] = "Unknown"  # Fallback for other statuses
-
-                                    # Retain the original docker_image from instance_info.json
-                                    # machine_info["docker_image"] is already set from instance_info.json at the top of this block
-                                    machine_info["container_id"] = container_id_from_docker
-
-                                    # Calculate uptime
-                                    created_at = None
-                                    # Attempt 1: Parse "YYYY-MM-DD HH:MM:SS +ZZZZ TZ_ABBR"
-                                    try:
-                                        parts = created_at_str.split(" ")
-                                        # Check if it has at least 4 parts (date, time, offset, abbr)
-                                        # and if the third part (index 2) starts with '+' or '-'
-                                        if len(parts) >= 4 and (parts[2].startswith("+") or parts[2].startswith("-")):
-                                            # Reconstruct string without the last part (timezone abbreviation)
-                                            cleaned_str = " ".join(parts[0:3])  # Take date, time, and offset
-                                            created_at = datetime.datetime.strptime(cleaned_str, "%Y-%m-%d %H:%M:%S %z")
-                                    except ValueError:
-                                        pass  # Continue to next attempt if this fails
-
-                                    # Attempt 2: Parse ISO format (e.g., "YYYY-MM-DDTHH:MM:SS.fffffffffZ")
-                                    if created_at is None:
-                                        try:
-                                            created_at = datetime.datetime.fromisoformat(created_at_str.replace("Z", "+00:00"))
-                                        except ValueError:
-                                            pass  # Continue to fallback if this fails
-
-                                    # Fallback if no format matches
-                                    if created_at is None:
-                                        print(
-                                            f"WARNING: Could not parse Docker CreatedAt string: '{created_at_str}'. Defaulting to current time."
-                                        )
-                                        created_at = datetime.datetime.now(datetime.timezone.utc)
-
-                                    now = datetime.datetime.now(datetime.timezone.utc)
-                                    uptime_delta = now - created_at
-                                    total_seconds = int(uptime_delta.total_seconds())
-                                    hours = total_seconds // 3600
-                                    minutes = (total_seconds % 3600) // 60
-                                    seconds = total_seconds % 60
-                                    machine_info["uptime"] = f"{hours}h {minutes}m {seconds}s"
-                                else:
-                                    machine_info["status"] = "Stopped"  # Container not found in Docker
-                            except Exception as docker_e:
-                                print(f"Error querying Docker for machine {machine_id}: {docker_e}")
-                                machine_info["status"] = "Docker Error"  # Indicate Docker issue
-
-                        machines_data.append(machine_info)
-                except json.JSONDecodeError:
-                    print(f"Error decoding JSON from {instance_info_path}")
-                except Exception as e:
-                    print(f"Error reading {instance_info_path}: {e}")
-    return machines_data
+    # One label-scoped Docker query for all machines, merged with the in-memory machine records
+    return await inventory.list_machines(machine_registry.all())
 
 
 @app.post("/machines/create", dependencies=[Depends(authenticate_user)])
@@ -283,10 +215,10 @@ async def create_machine(machine_data: dict):
     except (ValueError, TypeError):
         raise HTTPException(status_code=400, detail="RAM and Core must be valid numbers")
 
-    if not (1 <= ram <= 8):
-        raise HTTPException(status_code=400, detail="RAM must be between 1 and 8 GB")
-    if not (1 <= core <= 4):
-        raise HTTPException(status_code=400, detail="Core must be between 1 and 4")
+    if not (MACHINE_RAM_GB[0] <= ram <= MACHINE_RAM_GB[1]):
+        raise HTTPException(status_code=400, detail=f"RAM must be between {MACHINE_RAM_GB[0]} and {MACHINE_RAM_GB[1]} GB")
+    if not (MACHINE_CORES[0] <= core <= MACHINE_CORES[1]):
+        raise HTTPException(status_code=400, detail=f"Core must be between {MACHINE_CORES[0]} and {MACHINE_CORES[1]}")
 
     instance_id = str(uuid.uuid4())[:12]
     container_dir_name = f"container-{instance_id}"
@@ -316,14 +248,9 @@ async def create_machine(machine_data: dict):
             },  # Default settings
         }
 
-        instance_info_path = container_path / "instance_info.json"
-
-        with open(instance_info_path, "w") as f:
-            json.dump(new_machine_info, f, indent=2)
-
+        # instance_info.json is written in the background by the registry
+        machine_registry.add(new_machine_info)
         log_activity(f"Machine '{name}' ({instance_id}) created.")
-        shutil.copy("cloudflared", container_path / "cloudflared")
-        shutil.copy("tunnel.sh", container_path / "tunnel.sh")
 
         return {"message": "Machine created successfully", "machine": new_machine_info}
 
@@ -332,24 +259,26 @@ async def create_machine(machine_data: dict):
         raise HTTPException(status_code=500, detail=f"Error creating machine: {e}")
 
 
+async def run_machine_operation(machine_id: str, kind: str, operation):
+    """Runs a start/stop/delete after the machine's earlier operations; conflicting requests get a 409."""
+    try:
+        return await machine_operations.run(machine_id, kind, operation)
+    except OperationConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @app.delete("/machines/delete/{machine_id}", dependencies=[Depends(authenticate_user)])
 async def delete_machine(machine_id: str):
+    return await run_machine_operation(machine_id, "delete", lambda: _delete_machine(machine_id))
+
+
+async def _delete_machine(machine_id: str):
     # Always attempt to remove the host directory first
     container_dir_name = f"container-{machine_id}"
     host_container_path = Path("workspace") / container_dir_name
-    instance_info_path = host_container_path / "instance_info.json"
-    machine_name = machine_id  # Default name if info file is gone
-
-    # Try to get machine name before deletion
-    if instance_info_path.is_file():
-        try:
-            with open(instance_info_path, "r") as f:
-                machine_info = json.load(f)
-                machine_name = machine_info.get("name", machine_id)
-        except json.JSONDecodeError:
-            print(f"WARNING: Could not decode instance_info.json for {machine_id} during deletion.")
-        except Exception as e:
-            print(f"WARNING: Error reading instance_info.json for {machine_id} during deletion: {e}")
+    # Drop the record first so no pending write-behind recreates instance_info.json
+    machine_info = machine_registry.remove(machine_id)
+    machine_name = machine_info.get("name", machine_id) if machine_info else machine_id  # Default name if the record is gone
 
     if host_container_path.exists():
         try:
@@ -357,36 +286,29 @@ async def delete_machine(machine_id: str):
             print(f"INFO: Removed host directory {host_container_path}")
         except OSError as e:
             print(f"ERROR: Failed to remove host directory {host_container_path}: {e}")
+            if machine_info:
+                machine_registry.add(machine_info)  # The machine is still there
             raise HTTPException(status_code=500, detail=f"Error deleting machine directory on host: {e}")
     else:
         print(f"WARNING: Host directory {host_container_path} not found for machine {machine_id}. Proceeding to check Docker.")
 
     # Now, attempt to remove the Docker container if it exists
     try:
-        # Find container ID by label
-        result = await asyncio.to_thread(
-            subprocess.run,
-            ["docker", "ps", "-a", "--filter", f"label=com.vmwebgui.machine_id={machine_id}", "--format", "{{.ID}}"],
-            capture_output=True,
-            text=True,
-            check=False,
-        )
-        container_id = result.stdout.strip()
-
-        if container_id:
-            print(f"INFO: Found Docker container {container_id} for machine {machine_id}. Attempting to stop and remove.")
-            await asyncio.to_thread(
-                subprocess.run, ["docker", "stop", container_id], capture_output=True, text=True, check=False
-            )  # Stop, but don't fail if already stopped
-            await asyncio.to_thread(
-                subprocess.run, ["docker", "rm", container_id], capture_output=True, text=True, check=False
-            )  # Remove, but don't fail if already removed
-            print(f"INFO: Stopped and removed Docker container {container_id}.")
+        # Find container by label
+        containers = await docker.ps(all=True, filters={"label": [f"{MACHINE_LABEL}={machine_id}"]})
+
+        if containers:
+            for container in containers:
+                container_id = container["Id"]
+                print(f"INFO: Found Docker container {container_id} for machine {machine_id}. Attempting to stop and remove.")
+                await docker.stop(container_id)  # Stopping an already stopped container is not an error
+                await docker.remove(container_id)
+                print(f"INFO: Stopped and removed Docker container {container_id}.")
         else:
             print(f"INFO: No Docker container found for machine ID {machine_id}. Host directory already handled.")
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: Docker CLI error during deletion of machine {machine_id}: {e.stderr}")
-        raise HTTPException(status_code=500, detail=f"Docker CLI error during deletion: {e.stderr.strip()}")
+    except DockerError as e:
+        print(f"ERROR: Docker API error during deletion of machine {machine_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Docker API error during deletion: {e}")
     except Exception as e:
         print(f"ERROR: An unexpected error occurred during Docker deletion for machine {machine_id}: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during Docker deletion: {e}")
@@ -395,348 +317,189 @@ async def delete_machine(machine_id: str):
     return {"message": f"Machine {machine_id} deleted successfully"}
 
 
-@app.post("/machines/{machine_id}/start", dependencies=[Depends(authenticate_user)])
+@app.post("/machines/{machine_id}/start", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(authenticate_user)])
 async def start_machine(machine_id: str):
-    container_dir_name = f"container-{machine_id}"
-    container_path = Path("workspace") / container_dir_name
-    instance_info_path = container_path / "instance_info.json"
-    host_files_path = container_path / "files"
-    instance_info = json.load(open(instance_info_path, "r"))
-    settings = instance_info["settings"]
-
-    install_command = settings.get("install_command", "")
-    build_command = settings.get("build_command", "")
-    run_command_setting = settings.get("run_command", "")  # Renamed to avoid conflict with run_command_args
-    img = instance_info["docker_image"].lower() # Convert to lowercase for consistent matching
-
-    package_install_command = ""
-
-    if "ubuntu" in img or "debian" in img:
-        package_install_command = "RUN apt-get update && apt-get install -y wget curl"
-    elif "alpine" in img:
-        package_install_command = "RUN apk add --no-cache wget curl"
-    elif "centos" in img or "fedora" in img or "rockylinux" in img or "almalinux" in img:
-        # For RHEL-based, prefer dnf if available, otherwise fall back to yum
-        package_install_command = "RUN if command -v dnf > /dev/null; then dnf install -y wget curl && dnf clean all; else yum install -y wget curl && yum clean all; fi"
-    # Add more elif conditions for other distros if needed in the future
-
-    dockerfile_content = r"""FROM %s
-
-ENV PYTHONUNBUFFERED=1 \
-    PYTHONDONTWRITEBYTECODE=1 \
-    LANG=C.UTF-8 \
-    LC_ALL=C.UTF-8 \
-    TZ=UTC \
-    DEBIAN_FRONTEND=noninteractive
-
-WORKDIR /workspace
-
-COPY files/ .
-COPY tunnel.sh /
-COPY entrypoint.sh /
-COPY cloudflared /usr/local/bin/
-
-RUN chmod +x /usr/local/bin/cloudflared
-RUN chmod +x /entrypoint.sh
-%s
-ENTRYPOINT ["/entrypoint.sh"]
-""" % (
-        instance_info["docker_image"], # Use original image name here
-        package_install_command,
-    )
+    """
+    Queues a start job and returns its id right away; follow it with GET /jobs/{job_id}/events.
+    A start requested while another is in flight returns the running job.
+    """
+    if machine_id not in machine_registry:
+        raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
+    if "delete" in machine_operations.pending(machine_id):
+        raise HTTPException(status_code=409, detail=f"Cannot start machine {machine_id}: a delete operation is already pending.")
+
+    job = job_manager.active(machine_id, "start")
+    if job is None:
 
-    dockerfile_path = container_path / "Dockerfile"
+        async def run(job: Job):
+            try:
+                return await machine_operations.run(machine_id, "start", lambda: _start_machine(machine_id, job))
+            except HTTPException as e:
+                raise JobError(e.detail)
+            except OperationConflict as e:
+                raise JobError(str(e))
 
-    with open(dockerfile_path, "w") as f:
-        f.write(dockerfile_content)
+        job = job_manager.submit(machine_id, "start", run)
+    return {"message": f"Start of machine {machine_id} queued.", "job_id": job.id, "machine_id": machine_id}
 
-    payload = (
-        repr(
-            {
-                "authorization": os.getenv("AUTHORIZATION", "bruh"),
-                "instance_id": instance_info["id"],
-                "redirect_url": r"%s",
-                "unique_id": instance_info["settings"]["unique_path"],
-            }
-        )
-        .strip('"')
-        .replace("'", '"')
-    )
 
-    entrypoint_content = [
-        "#!/bin/bash",
-        "/tunnel.sh %s && rm -f /tunnel.sh > /dev/null 2>&1" % instance_info["settings"]["forwarding_port"],
-        r"""curl -X POST -H "Content-Type: application/json" -d "$(printf '%s' "$(head -n 1 /workspace/.webaddr | tr -d '\r\n')")" https://goto-tau.vercel.app/shorten > /dev/null 2>&1"""
-        % payload,
-        'echo "\x1b[1m\x1b[34m===== 🔧  Installing Dependencies%s... =====\x1b[0m\n"' % ("( Skipped )" if not install_command else ""),
-        install_command,
-        'echo "\x1b[1m\x1b[34m===== 🛠️  Building Application%s... =====\x1b[0m\n"' % ("( Skipped )" if not build_command else ""),
-        build_command,
-        'echo "\x1b[1m\x1b[34m===== 🚀  Starting Application... =====\x1b[0m\n"',
-        settings.get("run_command", None),
-        "tail -f /dev/null",
-    ]
-
-    with open(container_path / "entrypoint.sh", "w", newline="\n") as f:
-        f.write("\n".join([line for line in entrypoint_content if line]))
-
-    st = os.stat(container_path / "entrypoint.sh")
-    os.chmod(container_path / "entrypoint.sh", st.st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
-
-    if not instance_info_path.is_file():
+async def _start_machine(machine_id: str, job: Job):
+    instance_info = machine_registry.get(machine_id)
+
+    if instance_info is None:
         raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
+    if not instance_info.get("docker_image"):
+        raise HTTPException(status_code=400, detail="Docker image not specified in machine settings.")
 
+    name = instance_info.get("name", machine_id)
     try:
-        with open(instance_info_path, "r+") as f:
-            machine_info = json.load(f)
-            # Set status to "Starting" immediately
-            machine_info["status"] = "Starting"
-            f.seek(0)
-            json.dump(machine_info, f, indent=2)
-            f.truncate()
-            log_activity(f"Machine '{machine_info.get('name', machine_id)}' ({machine_id}) status set to Starting.")
-
-            # Check if a Docker container already exists and is running/stopped
-            try:
-                result = await asyncio.to_thread(
-                    subprocess.run,
-                    ["docker", "ps", "-a", "--filter", f"label=com.vmwebgui.machine_id={machine_id}", "--format", "{{.ID}}"],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                )
-                existing_container_id = result.stdout.strip()
-
-                if existing_container_id:
-                    print(
-                        f"INFO: Found existing Docker container {existing_container_id} for machine {machine_id}. Stopping and removing it for a clean start."
-                    )
-                    await asyncio.to_thread(
-                        subprocess.run, ["docker", "stop", existing_container_id], capture_output=True, text=True, check=False
-                    )
-                    await asyncio.to_thread(
-                        subprocess.run, ["docker", "rm", existing_container_id], capture_output=True, text=True, check=False
-                    )
-            except Exception as e:
-                print(f"WARNING: Error checking/removing existing container: {e}")
-
-            name = machine_info.get("name", f"machine-{machine_id}")
-            docker_image = machine_info.get("docker_image")
-            ram = machine_info.get("ram", "N/A")
-            core = machine_info.get("core", "N/A")
-            settings = machine_info.get("settings", {})
-
-            if not docker_image:
-                raise HTTPException(status_code=400, detail="Docker image not specified in machine settings.")
-
-            container_name = f"vmwebgui-{machine_id}-{name.replace(' ', '-').lower()}"
-
-            # Build the Docker image asynchronously
-            image_tag = machine_id.lower()  # Use machine_id as the image tag
-            print(f"INFO: Building Docker image '{image_tag}' from Dockerfile in {container_path}.")
-
-            # Use asyncio.create_subprocess_exec for non-blocking process execution
-            build_process = await asyncio.create_subprocess_exec(
-                "docker",
-                "build",
-                "--no-cache",
-                "-t",
-                image_tag,
-                ".",
-                cwd=container_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout_lines = []
-            stderr_lines = []
-
-            # Asynchronously read stdout and stderr
-            async def read_stream(stream, buffer):
-                while True:
-                    line = await stream.readline()
-                    if not line:
-                        break
-                    decoded_line = line.decode().strip()
-                    buffer.append(decoded_line)
-                    print(f"BUILD LOG (Dockerfile): {decoded_line}")
-
-            await asyncio.gather(read_stream(build_process.stdout, stdout_lines), read_stream(build_process.stderr, stderr_lines))
-
-            returncode = await build_process.wait()
-
-            if returncode != 0:
-                error_output = "\n".join(stderr_lines) if stderr_lines else "No specific error output."
-                raise HTTPException(status_code=500, detail=f"Docker image build failed (exit code {returncode}): {error_output}")
-            print(f"INFO: Docker image '{image_tag}' built successfully.")
-
-            # Run the Docker container
-            print(f"INFO: Running Docker container '{container_name}' from image '{image_tag}'.")
-
-            ram_value = machine_info["ram"].replace("GB", "g").replace("MB", "m").replace(" ", "")
-            core_value = str(machine_info["core"])
-
-            run_command_args = [
-                "docker",
-                "run",
-                "--name",
-                container_name,
-                "-d",  # Detached mode
-                "-l",
-                f"com.vmwebgui.machine_id={machine_id}",
-                "-l",
-                f"com.vmwebgui.machine_name={name}",
-                "-l",
-                f"com.vmwebgui.ram={ram}",
-                "-l",
-                f"com.vmwebgui.core={str(core)}",
-                "-v",
-                f"{str(host_files_path.resolve())}:/workspace",  # Changed from /app/files to /workspace
-                f"--memory={ram_value}",  # Added memory limit
-                f"--cpus={core_value}",  # Added cpu limit
-                image_tag.lower(),  # Changed image_tag to machine_id.lower()
-            ]
-
-            run_result = await asyncio.to_thread(subprocess.run, run_command_args, capture_output=True, text=True, check=True)
-            container_id = run_result.stdout.strip()  # Docker run outputs container ID on success
-            print(f"INFO: Started Docker container {container_id} for machine {machine_id}")
-
-            # Get commands from settings
-
-            print(
-                f"DEBUG: Machine {machine_id} settings - Install: '{install_command}', Build: '{build_command}', Run: '{run_command_setting}'"
-            )
-
-            # Update machine info with new Docker details
-            # Get current status and image from docker inspect
-            inspect_result = await asyncio.to_thread(
-                subprocess.run,
-                ["docker", "inspect", "--format", "{{.State.Status}}\t{{.Config.Image}}", container_id],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            status_from_docker, _ = inspect_result.stdout.strip().split("\t") # We don't need image_from_docker here
-
-            machine_info["status"] = status_from_docker.capitalize()
-            machine_info["container_id"] = container_id
-            # Do NOT overwrite machine_info["docker_image"] here.
-            # It should retain the original user-selected image (e.g., "python:latest")
-            # which is already present in machine_info from instance_info.json.
-
-            # Save updated info
-            f.seek(0)
-            json.dump(machine_info, f, indent=2)
-            f.truncate()
-
-            log_activity(f"Machine '{name}' ({machine_id}) started.")
-            return {"message": f"Machine {machine_id} started successfully.", "machine": machine_info}
+        # Report "Starting" immediately; the transient status is kept in memory only
+        machine_states.set_transition(machine_id, "Starting")
+        log_activity(f"Machine '{name}' ({machine_id}) status set to Starting.")
 
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: Docker CLI command failed during machine start: {e.stderr}")
-        raise HTTPException(status_code=500, detail=f"Docker CLI error during machine start: {e.stderr.strip()}")
-    except Exception as e:
-        print(f"ERROR: An unexpected error occurred during machine start: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during machine start: {e}")
+        def read_stream(line):
+            print(f"BUILD LOG (Dockerfile): {line}")
+            job.log(line)
+
+        launch = await launcher.launch_machine(instance_info, on_phase=job.set_phase, on_log=read_stream)
+
+        log_activity(f"Machine '{name}' ({machine_id}) started.")
+        return {"message": f"Machine {machine_id} started successfully.", "machine": machine_registry.get(machine_id), "timings": launch["timings"]}
+
+    except launcher.LaunchError as e:
+        print(f"ERROR: Machine {machine_id} failed to start at stage '{e.stage}': {e.message}")
+        raise HTTPException(status_code=500, detail=e.message)
+    finally:
+        machine_states.clear_transition(machine_id)
 
 
 @app.post("/machines/{machine_id}/stop", dependencies=[Depends(authenticate_user)])
 async def stop_machine(machine_id: str):
-    container_dir_name = f"container-{machine_id}"
-    instance_info_path = Path("workspace") / container_dir_name / "instance_info.json"
+    return await run_machine_operation(machine_id, "stop", lambda: _stop_machine(machine_id))
+
+
+async def _stop_machine(machine_id: str):
+    machine_info = machine_registry.get(machine_id)
 
-    if not instance_info_path.is_file():
+    if machine_info is None:
         raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
 
     try:
-        with open(instance_info_path, "r+") as f:
-            machine_info = json.load(f)
+        # Report "Stopping" while the stop is in flight; the transient status is kept in memory only
+        machine_states.set_transition(machine_id, "Stopping")
+        log_activity(f"Machine '{machine_info.get('name', machine_id)}' ({machine_id}) status set to Stopping.")
 
-            machine_info["status"] = "Stopping"
-            f.seek(0)
-            json.dump(machine_info, f, indent=2)
-            f.truncate()
-            log_activity(f"Machine '{machine_info.get('name', machine_id)}' ({machine_id}) status set to Stopping.")
+        container_id = machine_info.get("container_id")
 
-            container_id = machine_info.get("container_id")
+        if not container_id:
+            raise HTTPException(status_code=400, detail="Machine is not running or container ID is unknown.")
 
-            if not container_id:
-                raise HTTPException(status_code=400, detail="Machine is not running or container ID is unknown.")
+        try:
+            # Check if container is running before attempting to stop
+            current_status = await docker.state(container_id) or "removed"
 
-            try:
-                # Check if container is running before attempting to stop
-                inspect_result = await asyncio.to_thread(
-                    subprocess.run,
-                    ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                )
-                current_status = inspect_result.stdout.strip().lower()
-
-                if current_status == "running":
-                    await asyncio.to_thread(subprocess.run, ["docker", "stop", container_id], capture_output=True, text=True, check=True)
-                    print(f"INFO: Stopped Docker container {container_id} for machine {machine_id}")
-                    machine_info["status"] = "Stopped"
-                    machine_info["uptime"] = "0d 0h 0m"  # Reset uptime on stop
-                    machine_info["container_id"] = None  # Clear container ID
-                else:
-                    print(f"INFO: Docker container {container_id} for machine {machine_id} is already {current_status}. No action needed.")
-                    machine_info["status"] = current_status.capitalize()  # Update status in info if it changed externally
-                    machine_info["uptime"] = "0d 0h 0m"  # Ensure uptime is reset if it was stopped externally
-                    machine_info["container_id"] = None  # Clear container ID if it's not running
-
-                # Save updated info
-                f.seek(0)
-                json.dump(machine_info, f, indent=2)
-                f.truncate()
-
-                machine_name = machine_info.get("name", machine_id)
-                log_activity(f"Machine '{machine_name}' ({machine_id}) stopped.")
-                return {"message": f"Machine {machine_id} stopped successfully.", "machine": machine_info}
-            except subprocess.CalledProcessError as e:
-                print(f"ERROR: Docker CLI error during machine stop: {e.stderr}")
-                raise HTTPException(status_code=500, detail=f"Docker CLI error during machine stop: {e.stderr.strip()}")
-            except Exception as e:
-                print(f"ERROR: An unexpected error occurred during machine stop: {e}")
-                raise HTTPException(status_code=500, detail=f"An unexpected error occurred during machine stop: {e}")
+            if current_status == "running":
+                await docker.stop(container_id)
+                print(f"INFO: Stopped Docker container {container_id} for machine {machine_id}")
+                new_status = "Stopped"
+            else:
+                print(f"INFO: Docker container {container_id} for machine {machine_id} is already {current_status}. No action needed.")
+                new_status = current_status.capitalize()  # Update status in info if it changed externally
+
+            # Reset uptime and clear the container ID; written back to instance_info.json in the background
+            machine_info = machine_registry.update(machine_id, status=new_status, uptime="0d 0h 0m", container_id=None)
+
+            machine_name = machine_info.get("name", machine_id)
+            log_activity(f"Machine '{machine_name}' ({machine_id}) stopped.")
+            return {"message": f"Machine {machine_id} stopped successfully.", "machine": machine_info}
+        except DockerError as e:
+            print(f"ERROR: Docker API error during machine stop: {e}")
+            raise HTTPException(status_code=500, detail=f"Docker API error during machine stop: {e}")
+        except Exception as e:
+            print(f"ERROR: An unexpected error occurred during machine stop: {e}")
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred during machine stop: {e}")
 
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Error decoding machine info JSON.")
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading machine info for stop: {e}")
+        raise HTTPException(status_code=500, detail=f"Error stopping machine: {e}")
+    finally:
+        machine_states.clear_transition(machine_id)
+
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(authenticate_user)])
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found.")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/events", dependencies=[Depends(authenticate_user)])
+async def get_job_events(job_id: str, request: Request):
+    """
+    Streams a job's progress as Server-Sent Events: "phase", "log" and a final "done" event.
+    Reconnecting clients resume after the Last-Event-ID they received.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found.")
+
+    try:
+        after = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        after = 0
+
+    async def generate_events():
+        async for event in job.follow(after):
+            if await request.is_disconnected():
+                break
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(generate_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/images/stats", dependencies=[Depends(authenticate_user)])
+async def get_image_cache_stats():
+    """Returns base and per-machine image cache hits, builds and hit rates."""
+    return image_cache.stats()
+
+
+@app.get("/launch/stats", dependencies=[Depends(authenticate_user)])
+async def get_launch_stats():
+    """Returns per-stage timings (render, build, remove-old, run, verify, restart) of machine launches."""
+    return launcher.launch_metrics.stats()
+
+
+@app.get("/operations/stats", dependencies=[Depends(authenticate_user)])
+async def get_operation_stats():
+    """Returns running and queued start/stop/delete operations with queue depth and wait times."""
+    return machine_operations.stats()
+
+
+@app.get("/logs/stats", dependencies=[Depends(authenticate_user)])
+async def get_log_stats():
+    """Returns the shared log followers and the on-disk log archives."""
+    return {**log_hub.stats(), "archive": log_archive.stats()}
 
 
 @app.get("/machines/{machine_id}/settings", dependencies=[Depends(authenticate_user)])
 async def get_machine_settings(machine_id: str):
-    container_dir_name = f"container-{machine_id}"
-    container_path = Path("workspace") / container_dir_name
-    instance_info_path = container_path / "instance_info.json"
+    machine_info = machine_registry.get(machine_id)
 
-    if not instance_info_path.is_file():
+    if machine_info is None:
         raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
 
-    try:
-        with open(instance_info_path, "r") as f:
-            machine_info = json.load(f)
-            settings = machine_info.get("settings", {})
-            # Ensure unique_path is always present, defaulting to machine_id if not set
-            if not settings.get("unique_path"):
-                settings["unique_path"] = machine_id
-            return MachineSettings(**settings)
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Error decoding machine info JSON.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading machine settings: {e}")
+    settings = machine_info.get("settings", {})
+    # Ensure unique_path is always present, defaulting to machine_id if not set
+    if not settings.get("unique_path"):
+        settings["unique_path"] = machine_id
+    return MachineSettings(**settings)
 
 
 @app.put("/machines/{machine_id}/settings", dependencies=[Depends(authenticate_user)])
 async def update_machine_settings(machine_id: str, settings: MachineSettings):
-    container_dir_name = f"container-{machine_id}"
-    container_path = Path("workspace") / container_dir_name
-    instance_info_path = container_path / "instance_info.json"
-
-    if not instance_info_path.is_file():
+    if machine_id not in machine_registry:
         raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
 
     try:
@@ -750,240 +513,224 @@ async def update_machine_settings(machine_id: str, settings: MachineSettings):
             except ValueError:
                 raise HTTPException(status_code=400, detail="Forwarding Port must be a valid integer.")
 
-        with open(instance_info_path, "r+") as f:
-            machine_info = json.load(f)
-            machine_info["settings"] = settings.dict()  # Update the settings
-            f.seek(0)  # Rewind to the beginning of the file
-            json.dump(machine_info, f, indent=2)
-            f.truncate()  # Truncate any remaining old content
+        machine_registry.update(machine_id, settings=settings.dict())  # Update the settings
 
         log_activity(f"Machine {machine_id}: Settings updated.")
         return {"message": f"Settings for machine {machine_id} updated successfully."}
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Error decoding machine info JSON.")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating machine settings: {e}")
 
 
-@app.get("/machines/{machine_id}/logs", dependencies=[Depends(authenticate_user)])
-async def get_machine_logs(machine_id: str, request: Request):
-    container_dir_name = f"container-{machine_id}"
-    instance_info_path = Path("workspace") / container_dir_name / "instance_info.json"
+# Timestamp prefix of each log line from the daemon, e.g. "2024-01-01T00:00:00.000000000Z "
+LOG_TIMESTAMP = re.compile(r"^\S+ ?", re.MULTILINE)
+LOG_CURSOR = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?Z$")
+
+
+def log_message_event(event: str, message: str) -> str:
+    data = "".join(f"data: {line}\n" for line in message.splitlines() or [""])
+    return f"event: {event}\n{data}\n"
+
 
-    if not instance_info_path.is_file():
+def log_lines_event(chunk: str) -> str:
+    """One "log" event per chunk of timestamped lines; its id is the timestamp of the last line."""
+    cursor = chunk[chunk.rfind("\n", 0, len(chunk) - 1) + 1 :].split(" ", 1)[0].rstrip("\n")
+    # A lone carriage return would end an SSE line, so progress-bar output is flattened
+    data = LOG_TIMESTAMP.sub("data: ", chunk.replace("\r", ""))
+    return f"id: {cursor}\nevent: log\n{data}\n"
+
+
+@app.get("/machines/{machine_id}/logs", dependencies=[Depends(authenticate_user)])
+async def get_machine_logs(
+    machine_id: str,
+    request: Request,
+    since: str | None = Query(None, description="Cursor (id of the last event received) to resume after"),
+):
+    """
+    Streams live container output as Server-Sent Events. "log" events carry a batch of lines
+    and a cursor id; reconnecting with `since` or Last-Event-ID resumes after it instead of
+    replaying the backlog. "status" events explain why there is no output, "end" marks its end.
+    """
+    machine_info = machine_registry.get(machine_id)
+
+    if machine_info is None:
         raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
 
-    try:
-        with open(instance_info_path, "r") as f:
-            machine_info = json.load(f)
-            container_id = machine_info.get("container_id")
+    cursor = since or request.headers.get("last-event-id") or None
+    if cursor and not LOG_CURSOR.match(cursor):
+        raise HTTPException(status_code=400, detail=f"Invalid log cursor: {cursor}")
 
-        if not container_id:
-            return PlainTextResponse("Machine not started, no Docker logs available. Start the machine first.")
+    try:
+        container_id = machine_info.get("container_id")
 
         async def generate_logs():
-            logs_process = None
+            if not container_id:
+                yield log_message_event("status", "Machine not started, no Docker logs available. Start the machine first.")
+                return
+
+            logs_stream = None
             try:
-                # Check if container exists and is running (outside the lock, as it's a read-only operation)
-                inspect_result = await asyncio.to_thread(
-                    subprocess.run,
-                    ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                )
-                current_status = inspect_result.stdout.strip().lower()
-
-                if not inspect_result.stdout.strip() or "no such object" in inspect_result.stderr.lower():
-                    yield f"Docker container with ID {container_id} not found. It might have been removed manually. Logs unavailable.\n"
+                # Check if container exists and is running
+                current_status = await docker.state(container_id)
+
+                if current_status is None:
+                    yield log_message_event(
+                        "status", f"Docker container with ID {container_id} not found. It might have been removed manually. Logs unavailable."
+                    )
                     return
                 elif current_status != "running":
-                    yield f"Docker container is {current_status}. Logs unavailable. Start the machine to view live logs.\n"
+                    yield log_message_event("status", f"Docker container is {current_status}. Logs unavailable. Start the machine to view live logs.")
                     return
 
-                # Fetch live Docker container logs using subprocess.Popen and asyncio.to_thread
-                logs_process = subprocess.Popen(
-                    ["docker", "logs", "--tail", "500", "-f", container_id],  # Added --tail 1000
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                )
-
-                # Stream stdout
-                assert logs_process.stdout is not None
-                while True:
+                # Follow live Docker container logs (stdout and stderr) through the container's shared follower
+                logs_stream = log_hub.subscribe(container_id, after=cursor)
+                async for chunk in logs_stream:
                     # Check for client disconnection
                     if await request.is_disconnected():
-                        print(f"INFO: Client disconnected from logs for machine {machine_id}. Terminating log process.")
+                        print(f"INFO: Client disconnected from logs for machine {machine_id}. Closing log stream.")
                         break
+                    yield log_lines_event(chunk)
+                else:
+                    yield log_message_event("end", "--- END LIVE CONTAINER LOGS ---")
 
-                    line = await asyncio.to_thread(logs_process.stdout.readline)
-                    if not line:
-                        if logs_process.poll() is not None:
-                            break
-                        await asyncio.sleep(0.1)
-                        continue
-
-                    decoded_line = line.strip()
-                    print(f"LIVE LOG: {decoded_line}")
-                    yield decoded_line + "\n"
-                    await asyncio.sleep(0.01)
-
-                # Read any remaining stderr if the process exited
-                # assert logs_process.stderr is not None
-                # stderr_output = (await asyncio.to_thread(logs_process.stderr.read)).strip()
-                # if stderr_output:
-                #     print(f"LIVE LOG (ERR): {stderr_output}")
-                #     yield f"LIVE LOG (ERR): {stderr_output}\n"
-
-                await asyncio.to_thread(logs_process.wait)
-                if logs_process.returncode != 0:
-                    assert logs_process.stderr is not None
-                    stderr_output = (await asyncio.to_thread(logs_process.stderr.read)).strip()
-                    error_message = (
-                        f"Docker CLI error fetching logs for container {container_id} (exit code {logs_process.returncode}): {stderr_output}\n"
-                    )
-                    print(f"ERROR: {error_message}")
-                    yield error_message
-                yield "\n--- END LIVE CONTAINER LOGS ---\n"
-
+            except DockerError as e:
+                error_message = f"Docker API error fetching logs for container {container_id}: {e}"
+                print(f"ERROR: {error_message}")
+                yield log_message_event("status", error_message)
             except Exception as e:
-                error_message = f"An unexpected error occurred fetching logs for container {container_id}: {e}\n"
+                error_message = f"An unexpected error occurred fetching logs for container {container_id}: {e}"
                 detailed_error = traceback.format_exc()
                 print(f"ERROR: {error_message}\n{detailed_error}")
-                yield f"{error_message}\n{detailed_error}\n"
+                yield log_message_event("status", f"{error_message}\n{detailed_error}")
             finally:
-                # Ensure the subprocess is terminated
-                if logs_process and logs_process.poll() is None:
-                    print(f"INFO: Ensuring log process for machine {machine_id} is terminated in finally block.")
-                    try:
-                        logs_process.terminate()
-                        await asyncio.to_thread(logs_process.wait, timeout=1)
-                    except subprocess.TimeoutExpired:
-                        logs_process.kill()
-                        await asyncio.to_thread(logs_process.wait)
-                    except Exception as e:
-                        print(f"WARNING: Error during final termination of log process for {machine_id}: {e}")
-
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Error decoding machine info JSON.")
+                # Leave the shared follower (it stops after a grace period once nobody watches)
+                if logs_stream is not None:
+                    await logs_stream.aclose()
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading machine info for logs endpoint: {e}")
 
-    return StreamingResponse(generate_logs(), media_type="text/plain")
+    return StreamingResponse(generate_logs(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/machines/{machine_id}/logs/archive", dependencies=[Depends(authenticate_user)])
+async def get_machine_log_archive(
+    machine_id: str,
+    since: float | None = Query(None, description="Unix time of the first line to return"),
+    until: float | None = Query(None, description="Unix time of the last line to return"),
+    tail: int | None = Query(None, ge=1, description="Return only the last N lines"),
+):
+    """
+    Streams archived container output, which outlives the containers it came from. Lines are
+    prefixed with their timestamp. Without `since` or `until`, returns the last `tail` (default 1000) lines.
+    """
+    if machine_id not in machine_registry:
+        raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
 
+    archive = log_archive.archive(machine_id)
+    if since is None and until is None:
+        lines = archive.tail(tail or 1000)
+    else:
+        lines = archive.read(since, until)
+    return StreamingResponse(lines, media_type="text/plain")
+
+
+@app.get("/machines/{machine_id}/logs/search", dependencies=[Depends(authenticate_user)])
+async def search_machine_logs(
+    machine_id: str,
+    q: str = Query(..., min_length=1),
+    regex: bool = False,
+    ignore_case: bool = False,
+    since: float | None = None,
+    until: float | None = None,
+    limit: int = Query(1000, ge=1, le=100000),
+):
+    """Streams archived lines containing `q` (a regular expression with `regex=true`), oldest first."""
+    if machine_id not in machine_registry:
+        raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
 
-@app.get("/machines/{machine_id}/usage-snapshot", dependencies=[Depends(authenticate_user)])
-async def get_machine_usage_snapshot(machine_id: str):
-    container_dir_name = f"container-{machine_id}"
-    instance_info_path = Path("workspace") / container_dir_name / "instance_info.json"
+    try:
+        pattern = re.compile(q if regex else re.escape(q), re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regular expression: {e}")
+    return StreamingResponse(log_archive.archive(machine_id).search(pattern, since, until, limit), media_type="text/plain")
 
-    if not instance_info_path.is_file():
+
+@app.get("/machines/{machine_id}/usage-snapshot", dependencies=[Depends(authenticate_user)])
+async def get_machine_usage_snapshot(machine_id: str, response: Response):
+    """
+    Returns the machine's latest usage sample from the background collector. Never asks
+    Docker itself: a container the collector has not sampled yet answers 202 with
+    {"pending": true} until the next sampling round fills it in.
+    """
+    machine_info = machine_registry.get(machine_id)
+
+    if machine_info is None:
         raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
 
     try:
-        with open(instance_info_path, "r") as f:
-            machine_info = json.load(f)
-            container_id = machine_info.get("container_id")
+        container_id = machine_info.get("container_id")
 
         if not container_id:
             return {"error": "Machine not started, no Docker usage data available. Start the machine first."}
 
-        # Check if container exists and is running
-        inspect_result = await asyncio.to_thread(
-            subprocess.run,
-            ["docker", "inspect", "--format", "{{.State.Status}}", container_id],
-            capture_output=True,
-            text=True,
-            check=False,
-        )
-        current_status = inspect_result.stdout.strip().lower()
+        # Answered from the background collector's latest sample
+        usage_data = usage_collector.current(machine_id, container_id)
+        if usage_data is not None:
+            return usage_data
 
-        if not inspect_result.stdout.strip() or "no such object" in inspect_result.stderr.lower():
+        # Check if container exists and is running, from the in-memory state table
+        known = machine_states.get(machine_id) if machine_states.ready else None
+        if machine_states.ready and (known is None or known["container_id"] != container_id):
             return {"error": f"Docker container with ID {container_id} not found. It might have been removed manually. Usage data unavailable."}
-        elif current_status != "running":
-            return {"error": f"Docker container is {current_status}. Usage data unavailable. Start the machine to view live usage."}
-
-        try:
-            # Fetch Docker container stats using subprocess.run with --no-stream
-            result = await asyncio.to_thread(
-                subprocess.run,
-                ["docker", "stats", "--no-stream", "--format", "{{.CPUPerc}}\t{{.MemUsage}}\t{{.NetIO}}", container_id],
-                capture_output=True,
-                text=True,
-                check=True,  # Check for non-zero exit code
-            )
-
-            line = result.stdout.strip()
-            if line:
-                parts = line.split("\t")
-                if len(parts) == 3:
-                    cpu_percent = parts[0]
-                    mem_usage_raw = parts[1]
-                    net_io_raw = parts[2]
-
-                    mem_parts = mem_usage_raw.split(" / ")
-                    mem_usage = mem_parts[0] if len(mem_parts) > 0 else "N/A"
-                    mem_limit = mem_parts[1] if len(mem_parts) > 1 else "N/A"
-
-                    net_parts = net_io_raw.split(" / ")
-                    net_rx = net_parts[0] if len(net_parts) > 0 else "N/A"
-                    net_tx = net_parts[1] if len(net_parts) > 1 else "N/A"
-
-                    usage_data = {
-                        "cpu_percent": cpu_percent,
-                        "mem_usage": mem_usage,
-                        "mem_limit": mem_limit,
-                        "net_rx": net_rx,
-                        "net_tx": net_tx,
-                    }
-                    # Store the snapshot in historical data
-                    timestamp = datetime.datetime.now().isoformat()
-                    current_snapshot = {
-                        "timestamp": timestamp,
-                        "cpu_percent": cpu_percent,
-                        "mem_usage": mem_usage,
-                        "mem_limit": mem_limit,
-                        "net_rx": net_rx,
-                        "net_tx": net_tx,
-                    }
-
-                    if machine_id not in historical_usage_data:
-                        historical_usage_data[machine_id] = []
-
-                    historical_usage_data[machine_id].append(current_snapshot)
-                    # Trim history to MAX_HISTORY_POINTS
-                    if len(historical_usage_data[machine_id]) > MAX_HISTORY_POINTS:
-                        historical_usage_data[machine_id] = historical_usage_data[machine_id][-MAX_HISTORY_POINTS:]
-
-                    return usage_data
-                else:
-                    return {"error": "Failed to parse docker stats output"}
-            else:
-                return {"error": "No output from docker stats"}
+        elif known is not None and known["state"] != "running":
+            return {"error": f"Docker container is {known['state']}. Usage data unavailable. Start the machine to view live usage."}
 
-        except subprocess.CalledProcessError as e:
-            error_message = f"Docker CLI error fetching usage for container {container_id} (exit code {e.returncode}): {e.stderr.strip()}"
-            print(f"ERROR: {error_message}")
-            return {"error": error_message}
-        except Exception as e:
-            error_message = f"An unexpected error occurred fetching usage for container {container_id}: {e}"
-            detailed_error = traceback.format_exc()
-            print(f"ERROR: {error_message}\n{detailed_error}")
-            return {"error": error_message}
+        # Not sampled yet (just started): the collector picks it up within USAGE_SAMPLE_INTERVAL
+        response.status_code = 202
+        return {"pending": True, "message": "No usage sample yet. Try again in a moment."}
 
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Error decoding machine info JSON.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading machine info for usage endpoint: {e}")
 
 
 @app.get("/machines/{machine_id}/usage-history", dependencies=[Depends(authenticate_user)])
-async def get_machine_usage_history(machine_id: str):
-    """Returns historical usage data for a given machine."""
-    if machine_id not in historical_usage_data:
-        return []
-    return historical_usage_data[machine_id]
+async def get_machine_usage_history(
+    machine_id: str,
+    history_range: str = Query("live", alias="range", pattern="^(live|hour|day|week)$"),
+    since: float | None = None,
+    until: float | None = None,
+    step: int | None = Query(None, ge=1),
+):
+    """
+    Returns a machine's usage history, recorded in the background and kept across restarts.
+
+    The range gives the defaults: "live" (last 5 minutes) and "hour" at 1 s, "day" at 1 min and
+    "week" at 1 h steps; since, until (Unix seconds) and step (seconds) override them. The
+    result is columnar: "step", "timestamps" (delta-encoded, the first one absolute) and
+    cpu_percent, mem_usage, mem_limit, net_rx, net_tx (bytes) lists of the same length.
+    Clients refresh by passing the last timestamp they hold as since.
+    """
+    if machine_id not in machine_registry:
+        raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
+    return usage_collector.history_of(machine_id, history_range, since, until, step)
+
+
+@app.get("/usage", dependencies=[Depends(authenticate_user)])
+async def get_fleet_usage():
+    """
+    Returns the current usage of every running machine from the collector's latest samples
+    (no Docker calls), host totals, and the RAM and cores allocated to machines against the
+    host's, with the headroom left for one more machine at the largest quota.
+    """
+    return usage_collector.fleet(MACHINE_RAM_GB[1] * 1024**3, MACHINE_CORES[1])
+
+
+@app.get("/usage/stats", dependencies=[Depends(authenticate_user)])
+async def get_usage_collector_stats():
+    """Returns the usage collector's streams and the age of each machine's latest sample."""
+    return usage_collector.stats()
 
 
 @app.get("/machines/{machine_id}/files", dependencies=[Depends(authenticate_user)])
@@ -1055,81 +802,151 @@ async def get_machine_files(machine_id: str, path: str = "/"):
     return files_list
 
 
-@app.post("/machines/{machine_id}/upload", dependencies=[Depends(authenticate_user)])
-async def upload_machine_files(machine_id: str, files: list[UploadFile], path: str = Query("/")):  # Changed Form to Query
+async def upload_target_dir(machine_id: str, path: str) -> Path:
+    """Resolves (and creates) the folder under the machine's files/ that an upload at `path` goes to."""
     base_dir_relative = Path("workspace") / f"container-{machine_id}" / "files"
     base_dir = base_dir_relative.resolve()  # Resolve base_dir to an absolute path
     clean_path: str = cast(str, path.strip("/"))
     target_dir = Path(os.path.join(str(base_dir), clean_path)).resolve()
-    target_dir.mkdir(parents=True, exist_ok=True)
 
     if not target_dir.is_relative_to(base_dir):  # Use the resolved base_dir here
         raise HTTPException(status_code=400, detail="Invalid upload path")
+    await asyncio.to_thread(target_dir.mkdir, parents=True, exist_ok=True)
+    return target_dir
 
+
+def uploaded_message(machine_id: str, path: str, received: list[UploadedFile]) -> dict:
+    """Logs uploaded files to the activity log and returns the upload endpoints' response."""
     uploaded_file_names = []
-    for file in files:
-        if file.filename is None:
-            raise HTTPException(status_code=400, detail="Uploaded file is missing a filename.")
-
-        if file.filename.endswith(".zip"):
-            # Create a temporary directory to extract the zip file
-            temp_zip_path = target_dir / file.filename
-            temp_extract_dir = target_dir / f"temp_extract_{uuid.uuid4().hex}"  # Temporary unique directory
-            try:
-                with open(temp_zip_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-
-                temp_extract_dir.mkdir(parents=True, exist_ok=True)
-
-                with zipfile.ZipFile(temp_zip_path, "r") as zip_ref:
-                    zip_ref.extractall(temp_extract_dir)
-
-                # Determine the final destination path
-                extract_dir_name = file.filename[:-4] if file.filename.endswith(".zip") else file.filename
-                final_extract_path = target_dir / extract_dir_name
-                final_extract_path.mkdir(parents=True, exist_ok=True)  # Ensure final destination exists
-
-                # Check if the zip file created a single root folder
-                extracted_contents = list(temp_extract_dir.iterdir())
-                if len(extracted_contents) == 1 and extracted_contents[0].is_dir():
-                    # If there's a single directory, move its contents up
-                    redundant_root = extracted_contents[0]
-                    for item in redundant_root.iterdir():
-                        shutil.move(str(item), str(final_extract_path / item.name))
-                    shutil.rmtree(redundant_root)  # Remove the now empty redundant root
-                else:
-                    # Otherwise, move all extracted contents directly
-                    for item in extracted_contents:
-                        shutil.move(str(item), str(final_extract_path / item.name))
-
-                uploaded_file_names.append(f"{file.filename} (extracted to {extract_dir_name}/)")
-                log_activity(f"Machine {machine_id}: Uploaded and extracted '{file.filename}' to '{path}/{extract_dir_name}/'.")
-            except zipfile.BadZipFile:
-                raise HTTPException(status_code=400, detail=f"Uploaded file {file.filename} is not a valid zip file.")
-            except Exception as e:
-                # Log the full traceback for debugging
-                traceback.print_exc()
-                raise HTTPException(status_code=500, detail=f"Could not extract zip file {file.filename}: {e}")
-            finally:
-                # Clean up the temporary zip file and temporary extraction directory
-                if temp_zip_path.exists():
-                    os.remove(temp_zip_path)
-                if temp_extract_dir.exists():
-                    shutil.rmtree(temp_extract_dir)
+    for file in received:
+        if file.extracted is not None:
+            extract_dir_name = file.destination.name
+            uploaded_file_names.append(f"{file.filename} (extracted to {extract_dir_name}/)")
+            log_activity(f"Machine {machine_id}: Uploaded and extracted '{file.filename}' to '{path}/{extract_dir_name}/'.")
         else:
-            file_path = target_dir / file.filename
-            try:
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-                uploaded_file_names.append(file.filename)
-                log_activity(f"Machine {machine_id}: Uploaded file '{file.filename}' to '{path}'.")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Could not upload file {file.filename}: {e}")
-            finally:
-                file.file.close()
+            uploaded_file_names.append(file.filename)
+            log_activity(f"Machine {machine_id}: Uploaded file '{file.filename}' to '{path}'.")
     return {"message": f"Successfully uploaded {', '.join(uploaded_file_names)} to {path}"}
 
 
+@app.post("/machines/{machine_id}/upload", dependencies=[Depends(authenticate_user)])
+async def upload_machine_files(machine_id: str, request: Request, path: str = Query("/")):
+    """
+    Uploads the files of a multipart/form-data body ("files" fields) into the machine's
+    directory at `path`; .zip, .tar.gz and .tar.zst archives are extracted into a folder
+    named after them.
+
+    The body is streamed to disk as it arrives (see uploads.UploadReceiver): each file is
+    written to a temporary file from a worker thread and renamed into place when complete,
+    and archives are extracted straight to their final paths.
+    """
+    target_dir = await upload_target_dir(machine_id, path)
+    try:
+        received = await upload_receiver.receive(request.headers.get("content-type"), request.stream(), target_dir)
+    except (UploadError, ArchiveError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ClientDisconnect:
+        print(f"WARNING: Upload to machine {machine_id} aborted: the client disconnected.")
+        raise HTTPException(status_code=400, detail="Upload aborted.")
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Could not upload files: {e}")
+    if not received:
+        raise HTTPException(status_code=400, detail="No files in the upload.")
+
+    return uploaded_message(machine_id, path, received)
+
+
+class CreateUploadRequest(BaseModel):
+    file_name: str
+    size: int
+    path: str = "/"
+
+
+async def get_upload_session(machine_id: str, upload_id: str) -> UploadSession:
+    session = await upload_sessions.get(machine_id, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found (it may have expired).")
+    return session
+
+
+@app.post("/machines/{machine_id}/uploads", dependencies=[Depends(authenticate_user)])
+async def create_upload_session(machine_id: str, upload: CreateUploadRequest):
+    """
+    Starts a resumable upload of one file of `size` bytes into `path`: PUT its chunks to
+    /machines/{id}/uploads/{upload_id}?offset=N (in any order, several at once), GET the
+    session for the ranges received so far, then POST .../finalize. Archives are extracted
+    on finalize, as with /upload. Idle sessions expire after a day.
+    """
+    if machine_id not in machine_registry:
+        raise HTTPException(status_code=404, detail=f"Machine with ID {machine_id} not found.")
+    target_dir = await upload_target_dir(machine_id, upload.path)
+    try:
+        session = await upload_sessions.create(machine_id, target_dir, upload.path, upload.file_name.strip(), upload.size)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail="An upload of that file is already being created.")
+    except OSError as e:
+        status_code = 507 if e.errno == errno.ENOSPC else 500
+        raise HTTPException(status_code=status_code, detail=f"Could not create upload: {e}")
+    return {**session.to_dict(), "max_chunk": UPLOAD_SESSION_MAX_CHUNK}
+
+
+@app.get("/machines/{machine_id}/uploads/{upload_id}", dependencies=[Depends(authenticate_user)])
+async def get_upload_session_state(machine_id: str, upload_id: str):
+    """Returns a resumable upload's size and the byte ranges received so far ([start, end) pairs)."""
+    session = await get_upload_session(machine_id, upload_id)
+    return {**session.to_dict(), "missing": session.missing()}
+
+
+@app.put("/machines/{machine_id}/uploads/{upload_id}", dependencies=[Depends(authenticate_user)])
+async def put_upload_chunk(machine_id: str, upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Writes the request body at `offset` of the upload; returns the ranges received so far."""
+    session = await get_upload_session(machine_id, upload_id)
+    try:
+        written = await upload_sessions.write(session, offset, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ClientDisconnect:
+        # What arrived before the disconnect is recorded; the client resumes from the missing ranges
+        print(f"WARNING: Chunk at offset {offset} of upload {upload_id} was cut off.")
+        raise HTTPException(status_code=400, detail="Chunk upload aborted.")
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Could not write chunk: {e}")
+    return {**session.to_dict(), "written": written}
+
+
+@app.post("/machines/{machine_id}/uploads/{upload_id}/finalize", dependencies=[Depends(authenticate_user)])
+async def finalize_upload_session(machine_id: str, upload_id: str):
+    """Moves a complete upload into place (extracting archives) and ends its session."""
+    session = await get_upload_session(machine_id, upload_id)
+    if not session.complete:
+        raise HTTPException(status_code=409, detail={"message": "Upload is incomplete.", "missing": session.missing()})
+    try:
+        uploaded = await upload_sessions.finalize(session)
+    except UploadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Could not finalize upload: {e}")
+    return uploaded_message(machine_id, session.path, [uploaded])
+
+
+@app.delete("/machines/{machine_id}/uploads/{upload_id}", dependencies=[Depends(authenticate_user)])
+async def abort_upload_session(machine_id: str, upload_id: str):
+    """Abandons a resumable upload and removes its data."""
+    session = await get_upload_session(machine_id, upload_id)
+    await upload_sessions.abort(session)
+    return {"message": f"Upload of {session.filename} aborted."}
+
+
+@app.get("/uploads/stats", dependencies=[Depends(authenticate_user)])
+async def get_upload_stats():
+    """Returns upload counters: uploads in flight, files and bytes written, failures, resumable sessions."""
+    return {**upload_receiver.stats(), "sessions": upload_sessions.stats()}
+
+
 @app.post("/machines/{machine_id}/git-clone", dependencies=[Depends(authenticate_user)])
 async def git_clone_repo(machine_id: str, request: GitCloneRequest, path: str = Query("/")):  # Changed Form to Query
     base_dir_relative = Path("workspace") / f"container-{machine_id}" / "files"
@@ -1263,24 +1080,67 @@ class FileContentRequest(BaseModel):
     content: str
 
 
-@app.get("/machines/{machine_id}/files/content", dependencies=[Depends(authenticate_user)])
-async def get_machine_file_content(machine_id: str, path: str = Query(..., alias="path")):
+def machine_file_path(machine_id: str, path: str, action: str = "read", allow_root: bool = False) -> Path:
+    """Resolves `path` inside the machine's files/ directory; raises a 400 if it points elsewhere (or is the root, unless allowed)."""
     base_dir_relative = Path("workspace") / f"container-{machine_id}" / "files"
     base_dir = base_dir_relative.resolve()
 
     clean_file_path = path.strip("/")
-    if not clean_file_path:
-        raise HTTPException(status_code=400, detail="Invalid file path: Cannot read the root directory.")
+    if not clean_file_path and not allow_root:
+        raise HTTPException(status_code=400, detail=f"Invalid file path: Cannot {action} the root directory.")
 
     target_file_path = base_dir.joinpath(clean_file_path).resolve()
 
     try:
         if not target_file_path.is_relative_to(base_dir):
-            print(f"SECURITY ALERT: Attempt to read file outside base directory: {target_file_path}")
+            print(f"SECURITY ALERT: Attempt to {action} file outside base directory: {target_file_path}")
             raise HTTPException(status_code=400, detail="Invalid file path: Not within machine's file directory.")
     except ValueError as e:
-        print(f"SECURITY ALERT: ValueError during is_relative_to check for file read: {e}")
+        print(f"SECURITY ALERT: ValueError during is_relative_to check for file {action}: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid file path: {e}")
+    return target_file_path
+
+
+def read_text_page(path: Path, offset: int, length: int) -> tuple[str, int, int]:
+    """
+    Reads up to `length` bytes at `offset` and decodes them as UTF-8 (undecodable bytes show
+    as U+FFFD). A character cut at the end of the page is left for the next one, unless it is
+    all the page holds: then the page is extended to the whole character, so every page moves
+    the offset forward. Returns (text, bytes consumed, file size).
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if offset > size:
+            raise ValueError(f"Offset {offset} is past the end of the file ({size} bytes).")
+        # Up to 3 bytes more than the page, to finish a character that is cut at its end
+        data = os.pread(f.fileno(), length + 3, offset)
+    data, rest = data[:length], data[length:]
+    if rest:
+        # Drop a trailing partial UTF-8 sequence: back up to its lead byte if it needs more bytes
+        for back in range(1, min(4, len(data)) + 1):
+            byte = data[-back]
+            if byte & 0xC0 != 0x80:  # Not a continuation byte
+                needed = 2 if byte & 0xE0 == 0xC0 else 3 if byte & 0xF0 == 0xE0 else 4 if byte & 0xF8 == 0xF0 else 1
+                if needed > back:
+                    data = data[:-back] if back < len(data) else data + rest[: needed - back]
+                break
+    return data.decode("utf-8", errors="replace"), len(data), size
+
+
+@app.get("/machines/{machine_id}/files/content", dependencies=[Depends(authenticate_user)])
+async def get_machine_file_content(
+    machine_id: str,
+    path: str = Query(..., alias="path"),
+    offset: int = Query(0, ge=0),
+    length: int | None = Query(None, ge=1, le=FILE_CONTENT_MAX_BYTES),
+):
+    """
+    Returns a page of a text file: `length` bytes (at most FILE_CONTENT_MAX_BYTES, the
+    default) from `offset`. X-File-Size gives the file's size and X-Next-Offset where the next
+    page starts; the file was read whole when X-Next-Offset equals X-File-Size. Use
+    /files/download for binary files.
+    """
+    target_file_path = machine_file_path(machine_id, path)
 
     if not target_file_path.exists():
         raise HTTPException(status_code=404, detail=f"File not found: {path}")
@@ -1289,12 +1149,86 @@ async def get_machine_file_content(machine_id: str, path: str = Query(..., alias
         raise HTTPException(status_code=400, detail="Path is a directory. Cannot read directory content as a file.")
 
     try:
-        with open(target_file_path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
-        return PlainTextResponse(content)
+        content, consumed, size = await asyncio.to_thread(read_text_page, target_file_path, offset, length or FILE_CONTENT_MAX_BYTES)
+    except ValueError as e:
+        raise HTTPException(status_code=416, detail=str(e))
     except Exception as e:
         print(f"ERROR: Failed to read file {target_file_path}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to read file content: {e}")
+    return PlainTextResponse(content, headers={
+        "X-File-Size": str(size),
+        "X-Content-Offset": str(offset),
+        "X-Next-Offset": str(offset + consumed),
+    })
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True if an If-None-Match header lists `etag` (compared weakly) or is "*"."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+@app.api_route("/machines/{machine_id}/files/download", methods=["GET", "HEAD"], dependencies=[Depends(authenticate_user)])
+async def download_machine_file(machine_id: str, request: Request, path: str = Query(..., alias="path")):
+    """
+    Downloads a file as is. Supports Range requests (single and multiple ranges, If-Range),
+    and ETag/Last-Modified with If-None-Match revalidation (304). The file is streamed, never
+    loaded whole: through the server's zero-copy path send extension when it has one, else
+    in FILE_DOWNLOAD_CHUNK_BYTES reads from a worker thread.
+    """
+    target_file_path = machine_file_path(machine_id, path)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, target_file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=400, detail="Path is not a file.")
+
+    response = FileResponse(
+        target_file_path,
+        stat_result=stat_result,
+        filename=target_file_path.name,
+        headers={"Cache-Control": "no-cache"},  # Cached copies are revalidated with If-None-Match
+    )
+    response.chunk_size = FILE_DOWNLOAD_CHUNK_BYTES
+    if etag_matches(request.headers.get("if-none-match"), response.headers["etag"]):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"],
+            "Last-Modified": response.headers["last-modified"],
+            "Cache-Control": "no-cache",
+        })
+    return response
+
+
+@app.get("/machines/{machine_id}/files/archive", dependencies=[Depends(authenticate_user)])
+async def download_machine_directory(
+    machine_id: str,
+    path: str = Query("/", alias="path"),
+    format: str = Query("zip", alias="format"),
+    level: int = Query(6, ge=0, le=9),
+):
+    """
+    Downloads a directory (the whole files/ tree by default) as a zip or tar.gz archive,
+    built while the client reads it: nothing is staged on disk and memory stays flat whatever
+    the tree's size. `level` 0 leaves data uncompressed, which suits content that is already
+    compressed; 1-9 trade speed for size. Symlinks and special files are left out.
+    """
+    if format not in ARCHIVE_DOWNLOAD_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported archive format: {format}. Use one of: {', '.join(ARCHIVE_DOWNLOAD_KINDS)}.")
+    target_dir_path = machine_file_path(machine_id, path, allow_root=True)
+    if not target_dir_path.is_dir():
+        if target_dir_path.exists():
+            raise HTTPException(status_code=400, detail="Path is not a directory. Use /files/download for files.")
+        raise HTTPException(status_code=404, detail=f"Directory not found: {path}")
+
+    # A sync iterator: Starlette pulls each chunk from a worker thread, so reads and compression stay off the event loop
+    return StreamingResponse(
+        stream_archive(target_dir_path, format, level),
+        media_type=ARCHIVE_DOWNLOAD_KINDS[format],
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(f'{target_dir_path.name}.{format}')}"},
+    )
 
 
 @app.put("/machines/{machine_id}/files/content", dependencies=[Depends(authenticate_user)])
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class OperationConflict(Exception):
+    """Raised when an operation cannot be queued because it conflicts with one already pending."""
+
+    def __init__(self, machine_id: str, requested: str, pending: str):
+        self.machine_id = machine_id
+        self.requested = requested
+        self.pending = pending
+        super().__init__(f"Cannot {requested} machine {machine_id}: a {pending} operation is already pending.")
+
+
+class _Operation:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class MachineOperations:
+    """
+    Serializes start/stop/delete per machine.
+
+    Operations on one machine run one at a time in arrival order. A request for the same
+    operation as the last one queued joins it and gets its result instead of running again
+    (two overlapping starts build once). Once a delete is pending, start and stop are
+    rejected with OperationConflict so a start cannot resurrect a deleted machine.
+    """
+
+    def __init__(self):
+        # Per machine: the running operation first, then the queued ones
+        self._queues: dict[str, list[_Operation]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self._started = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+
+    async def run(self, machine_id: str, kind: str, operation: Callable[[], Awaitable[T]]) -> T:
+        """Runs `operation` once every earlier operation on the machine has finished."""
+        queue = self._queues.setdefault(machine_id, [])
+        if queue and queue[-1].kind == kind:
+            self.coalesced += 1
+            return await asyncio.shield(queue[-1].future)
+        for pending in queue:
+            if pending.kind == "delete":
+                self.rejected += 1
+                raise OperationConflict(machine_id, kind, pending.kind)
+
+        op = _Operation(kind)
+        queue.append(op)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+        lock = self._locks.setdefault(machine_id, asyncio.Lock())
+        try:
+            async with lock:
+                self._record_wait(time.monotonic() - op.enqueued_at)
+                try:
+                    result = await operation()
+                except asyncio.CancelledError:
+                    op.future.cancel()
+                    raise
+                except BaseException as e:
+                    op.future.set_exception(e)
+                    raise
+                op.future.set_result(result)
+                return result
+        finally:
+            self.completed += 1
+            if op.future.done() and not op.future.cancelled():
+                op.future.exception()  # Mark as retrieved when nobody joined the operation
+            queue.remove(op)
+            if not queue:
+                del self._queues[machine_id]
+                del self._locks[machine_id]
+
+    def _record_wait(self, wait: float):
+        self._started += 1
+        self._last_wait = wait
+        self._max_wait = max(self._max_wait, wait)
+        self._total_wait += wait
+
+    def pending(self, machine_id: str) -> list[str]:
+        """Kinds of the running and queued operations of a machine, running first."""
+        return [op.kind for op in self._queues.get(machine_id, [])]
+
+    def queue_depth(self) -> int:
+        """Operations waiting for an earlier operation on the same machine, across all machines."""
+        return sum(len(queue) - 1 for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        return {
+            "running": {machine_id: queue[0].kind for machine_id, queue in self._queues.items()},
+            "queued": {machine_id: [op.kind for op in queue[1:]] for machine_id, queue in self._queues.items() if len(queue) > 1},
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "wait_seconds": {
+                "last": round(self._last_wait, 3),
+                "max": round(self._max_wait, 3),
+                "avg": round(self._total_wait / self._started, 3) if self._started else 0.0,
+            },
+        }
+
+
+# Shared serializer used by the start/stop/delete endpoints
+machine_operations = MachineOperations()
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# Seconds a dirty record may wait before it is written back, so bursts of updates coalesce
+FLUSH_DELAY = 0.2
+
+
+def _copy(record: dict) -> dict:
+    """Copies a record deep enough that callers can modify it (and its settings) freely."""
+    copied = dict(record)
+    if isinstance(copied.get("settings"), dict):
+        copied["settings"] = dict(copied["settings"])
+    return copied
+
+
+def write_json_atomic(path: Path, data: dict):
+    """Writes JSON to a temporary file next to `path` and renames it into place."""
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class MachineRegistry:
+    """
+    All machine records (instance_info.json) held in memory, keyed by machine id.
+
+    Records are read from disk once by `load()`. Reads and updates never touch the
+    disk; updated records are marked dirty and written back in the background with
+    atomic temp-file-plus-rename writes. Updates are plain synchronous calls, so
+    within the event loop every request sees a consistent record.
+    """
+
+    def __init__(self, workspace_path: Path = Path("workspace"), flush_delay: float = FLUSH_DELAY):
+        self.workspace_path = workspace_path
+        self.flush_delay = flush_delay
+        self.records: dict[str, dict] = {}
+        self._dirty: set[str] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._flusher: asyncio.Task | None = None
+
+    def instance_info_path(self, machine_id: str) -> Path:
+        return self.workspace_path / f"container-{machine_id}" / "instance_info.json"
+
+    # ----- lifecycle -----
+
+    def load(self):
+        """Reads every workspace/container-*/instance_info.json, skipping unreadable ones."""
+        self.records = {}
+        if not self.workspace_path.exists() or not self.workspace_path.is_dir():
+            return
+
+        for container_dir in self.workspace_path.iterdir():
+            if container_dir.is_dir() and container_dir.name.startswith("container-"):
+                instance_info_path = container_dir / "instance_info.json"
+                if instance_info_path.is_file():
+                    try:
+                        with open(instance_info_path, "r") as f:
+                            record = json.load(f)
+                        self.records[record.get("id") or container_dir.name[len("container-") :]] = record
+                    except json.JSONDecodeError:
+                        print(f"Error decoding JSON from {instance_info_path}")
+                    except Exception as e:
+                        print(f"Error reading {instance_info_path}: {e}")
+
+    def start(self):
+        """Starts the background writer (call from the FastAPI lifespan)."""
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stops the background writer and writes whatever is still dirty."""
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    # ----- reads -----
+
+    def get(self, machine_id: str) -> dict | None:
+        """Returns a copy of the machine record, or None if there is no such machine."""
+        record = self.records.get(machine_id)
+        return _copy(record) if record is not None else None
+
+    def all(self) -> list[dict]:
+        return [_copy(record) for record in self.records.values()]
+
+    def __contains__(self, machine_id: str) -> bool:
+        return machine_id in self.records
+
+    # ----- writes -----
+
+    def add(self, record: dict):
+        self.records[record["id"]] = _copy(record)
+        self._mark_dirty(record["id"])
+
+    def update(self, machine_id: str, **fields) -> dict:
+        """Updates fields of a machine record and returns a copy of the result. Raises KeyError if unknown."""
+        record = self.records[machine_id]
+        record.update(fields)
+        self._mark_dirty(machine_id)
+        return _copy(record)
+
+    def remove(self, machine_id: str) -> dict | None:
+        self._dirty.discard(machine_id)
+        return self.records.pop(machine_id, None)
+
+    def _mark_dirty(self, machine_id: str):
+        self._dirty.add(machine_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ----- persistence -----
+
+    async def flush(self):
+        """Writes all dirty records to disk."""
+        dirty, self._dirty = self._dirty, set()
+        for machine_id in dirty:
+            record = self.records.get(machine_id)
+            if record is None:
+                continue  # Removed since it was marked dirty
+            path = self.instance_info_path(machine_id)
+            try:
+                # Snapshot in the event loop so the worker thread never sees a half-applied update
+                await asyncio.to_thread(write_json_atomic, path, json.loads(json.dumps(record)))
+            except FileNotFoundError:
+                if machine_id in self.records:
+                    print(f"ERROR: Machine directory for {machine_id} is missing; could not persist its record.")
+            except Exception as e:
+                print(f"ERROR: Failed to persist record of machine {machine_id}: {e}")
+                self._dirty.add(machine_id)
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            # Let bursts of updates to the same records coalesce into one write
+            await asyncio.sleep(self.flush_delay)
+            self._wakeup.clear()
+            await self.flush()
+
+
+# Shared registry, loaded and started in the FastAPI lifespan
+machine_registry = MachineRegistry()
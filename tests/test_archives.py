@@ -0,0 +1,38 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from archives import stream_archive
+
+
+@pytest.mark.parametrize("level", [0, 6])
+def test_zip_entries_are_stored_at_level_0(tmp_path, level):
+    (tmp_path / "tree" / "sub").mkdir(parents=True)
+    (tmp_path / "tree" / "sub" / "a.txt").write_bytes(b"hello\n" * 1000)
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream_archive(tmp_path / "tree", "zip", level)))) as zip_file:
+        info = zip_file.getinfo("tree/sub/a.txt")
+        assert info.compress_type == (zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED)
+        assert (info.compress_size == info.file_size) == (level == 0)
+        assert zip_file.read(info) == b"hello\n" * 1000
+
+
+@pytest.mark.parametrize("kind", ["zip", "tar.gz"])
+def test_file_growing_while_read_is_capped(tmp_path, kind):
+    (tmp_path / "tree").mkdir()
+    path = tmp_path / "tree" / "log.txt"
+    path.write_bytes(b"a" * 10)
+
+    chunks = []
+    for chunk in stream_archive(tmp_path / "tree", kind, 0):
+        chunks.append(chunk)
+        with open(path, "ab") as f:
+            f.write(b"b" * 100)
+    archive = io.BytesIO(b"".join(chunks))
+    if kind == "zip":
+        data = zipfile.ZipFile(archive).read("tree/log.txt")
+    else:
+        data = tarfile.open(fileobj=archive).extractfile("tree/log.txt").read()
+    assert data == b"a" * 10
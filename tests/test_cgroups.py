@@ -0,0 +1,62 @@
+import pytest
+
+from cgroups import CgroupReader
+from docker_client import usage_values
+from fake_cgroups import FakeCgroupTree
+
+
+@pytest.fixture
+def tree(tmp_path):
+    return FakeCgroupTree(tmp_path, host_memory=8 * 1024**3)
+
+
+@pytest.fixture
+def reader(tree):
+    return CgroupReader(tree.cgroup_root, tree.proc_root)
+
+
+@pytest.mark.parametrize("driver", ["systemd", "cgroupfs"])
+def test_locate_finds_either_driver_layout(tree, reader, driver):
+    path = tree.add_container("c1", driver=driver)
+    assert reader.available
+    assert reader.locate("c1") == f"{path}/"
+    assert reader.locate("missing") is None
+
+
+def test_sample_reads_counters_and_cpu_delta(tree, reader, monkeypatch):
+    tree.add_container("c1", memory_max=2 * 1024**3)
+    clock = iter([10**9, 3 * 10**9])
+    monkeypatch.setattr("cgroups.time.monotonic_ns", lambda: next(clock))
+    reader.online_cpus = 4
+
+    first = reader.sample("c1")
+    assert usage_values(first)["cpu_percent"] == 0.0  # No previous sample to take a delta from
+    tree.set_counters("c1", cpu_usec=1_000_000, memory=512 * 1024**2, inactive_file=128 * 1024**2, rx=5000, tx=700, read=4096, write=8192)
+    sample = reader.sample("c1")
+
+    # One CPU-second over two seconds of wall clock
+    assert usage_values(sample) == {"cpu_percent": 50.0, "mem_usage": 384 * 1024**2, "mem_limit": 2 * 1024**3, "net_rx": 5000, "net_tx": 700}
+    assert sample["blkio_stats"]["io_service_bytes_recursive"] == [{"op": "read", "value": 4096}, {"op": "write", "value": 8192}]
+    assert list(sample["networks"]) == ["eth0"]  # Loopback is not container traffic
+
+
+def test_container_without_limit_reports_host_memory(tree, reader):
+    tree.add_container("c1")
+    assert reader.host_memory() == 8 * 1024**3
+    assert reader.sample("c1")["memory_stats"]["limit"] == 8 * 1024**3
+
+
+def test_host_memory_without_procfs_is_unknown(tree):
+    assert CgroupReader(tree.cgroup_root, tree.proc_root / "missing").host_memory() == 0
+
+
+def test_sample_all_drops_removed_containers(tree, reader):
+    tree.add_container("c1")
+    tree.add_container("c2", driver="cgroupfs")
+    assert all(reader.sample_all(["c1", "c2"]).values())
+
+    tree.remove_container("c2")
+    samples = reader.sample_all(["c1", "c2", "c3"])
+    assert samples["c1"] is not None
+    assert samples["c2"] is None and samples["c3"] is None
+    assert "c2" not in reader._paths and "c2" not in reader._previous
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from docker_client import DockerClient
+
+
+class FlakyDaemon:
+    """
+    Answers `{}` to requests on a Unix socket, but drops the connection without answering on
+    a connection's second request (as if the daemon had closed it while it sat in the pool),
+    and on every POST when `drop_posts` is set. Records every request it read.
+    """
+
+    def __init__(self, socket_path: str, drop_posts: bool = False):
+        self.socket_path = socket_path
+        self.drop_posts = drop_posts
+        self.requests: list[str] = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        served = 0
+        while request_line := await reader.readline():
+            while await reader.readline() not in (b"\r\n", b""):
+                pass
+            method, target, _ = request_line.decode().split(" ")
+            self.requests.append(f"{method} {target}")
+            if served or (method == "POST" and self.drop_posts):
+                break
+            served += 1
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+            await writer.drain()
+        writer.close()
+
+
+def run_against(tmp_path, drop_posts: bool, requests):
+    daemon = FlakyDaemon(str(tmp_path / "docker.sock"), drop_posts)
+
+    async def run():
+        server = await asyncio.start_unix_server(daemon.handle, path=daemon.socket_path)
+        client = DockerClient(daemon.socket_path)
+        try:
+            await requests(client)
+        finally:
+            await client.close()
+            server.close()
+
+    asyncio.run(run())
+    return daemon.requests
+
+
+def test_get_is_retried_on_a_stale_pooled_connection(tmp_path):
+    async def requests(client):
+        assert await client._request("GET", "/a") == (200, {})
+        assert await client._request("GET", "/b") == (200, {})
+
+    assert run_against(tmp_path, False, requests) == ["GET /a", "GET /b", "GET /b"]
+
+
+def test_post_uses_a_fresh_connection(tmp_path):
+    async def requests(client):
+        await client._request("GET", "/a")
+        assert await client._request("POST", "/containers/x/start") == (200, {})
+
+    assert run_against(tmp_path, False, requests) == ["GET /a", "POST /containers/x/start"]
+
+
+def test_failed_post_is_not_retried(tmp_path):
+    async def requests(client):
+        with pytest.raises((ConnectionError, asyncio.IncompleteReadError)):
+            await client._request("POST", "/containers/x/start")
+
+    assert run_against(tmp_path, True, requests) == ["POST /containers/x/start"]
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+TEXT = "a€😀bé" * 3
+
+
+@pytest.fixture
+def read_text_page(monkeypatch):
+    monkeypatch.chdir(ROOT)  # main mounts the dashboard and static directories relative to the working directory
+    import main
+
+    return main.read_text_page
+
+
+@pytest.mark.parametrize("length", [1, 2, 3, 4, 5, 7, 64])
+def test_pages_always_move_forward(tmp_path, read_text_page, length):
+    path = tmp_path / "text.txt"
+    path.write_bytes(TEXT.encode())
+    offset, text = 0, ""
+    while offset < path.stat().st_size:
+        page, consumed, size = read_text_page(path, offset, length)
+        assert consumed > 0
+        text += page
+        offset += consumed
+    assert text == TEXT
+    assert size == len(TEXT.encode())
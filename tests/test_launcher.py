@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+import launcher
+from docker_client import DockerError, docker
+from fake_docker import FakeDockerDaemon
+from images import ImageCache
+from launcher import launch_machine
+from registry import MachineRegistry
+
+
+@pytest.fixture
+def machine(tmp_path, monkeypatch):
+    """A machine record in a throwaway workspace, with the launcher using a fresh registry and image cache."""
+    monkeypatch.chdir(tmp_path)  # The shared image files and the workspace are relative to the working directory
+    (tmp_path / "tunnel.sh").write_text("#!/bin/bash\n")
+    (tmp_path / "cloudflared").write_bytes(b"\x7fELF")
+    (tmp_path / "workspace" / "container-m1").mkdir(parents=True)
+    registry = MachineRegistry(tmp_path / "workspace")
+    registry.add({"id": "m1", "name": "box", "docker_image": "ubuntu:latest", "ram": "1GB", "core": "1", "settings": {"forwarding_port": "8080"}})
+    monkeypatch.setattr(launcher, "machine_registry", registry)
+    monkeypatch.setattr(launcher, "image_cache", ImageCache())
+    monkeypatch.setattr(docker, "socket_path", str(tmp_path / "docker.sock"))
+    monkeypatch.setattr(docker, "_idle", [])
+    return registry
+
+
+def run_with_daemon(socket_path: str, scenario):
+    async def run():
+        daemon = FakeDockerDaemon(socket_path)
+        await daemon.start()
+        try:
+            return await scenario(daemon)
+        finally:
+            await docker.close()
+            await daemon.stop()
+
+    return asyncio.run(run())
+
+
+def test_unchanged_machine_restarts_its_container(machine):
+    async def scenario(daemon):
+        first = await launch_machine(machine.get("m1"))
+        builds = sum(path == "/build" for _, path in daemon.requests)
+        running = await launch_machine(machine.get("m1"))
+        await docker.stop(first["container_id"])
+        stopped = await launch_machine(machine.get("m1"))
+        assert sum(path == "/build" for _, path in daemon.requests) == builds
+        return first, running, stopped, daemon.containers[first["container_id"]]["State"]
+
+    first, running, stopped, state = run_with_daemon(docker.socket_path, scenario)
+    assert not first["restarted"]
+    assert running["restarted"] and stopped["restarted"]
+    assert first["container_id"] == running["container_id"] == stopped["container_id"]
+    assert state == "running"
+    assert machine.get("m1")["status"] == "Running"
+
+
+def test_entrypoint_can_run_again(machine):
+    lines = launcher.render_entrypoint(machine.get("m1")).splitlines()
+    tunnel = lines.index("/tunnel.sh 8080")
+    # A restart reruns the entrypoint: the tunnel script stays, and the old address is cleared first
+    assert "rm -f /workspace/.webaddr" in lines[:tunnel]
+    assert not any("rm -f /tunnel.sh" in line for line in lines)
+    assert lines[tunnel + 1].startswith("[ -s /workspace/.webaddr ] && curl")
+
+
+def test_failed_restart_launches_a_new_container(machine, monkeypatch):
+    start = docker.start
+
+    async def scenario(daemon):
+        first = await launch_machine(machine.get("m1"))
+        await docker.stop(first["container_id"])
+
+        async def failing_start(container_id: str):
+            if container_id == first["container_id"]:
+                raise DockerError(500, "cannot start container")
+            await start(container_id)
+
+        monkeypatch.setattr(docker, "start", failing_start)
+        second = await launch_machine(machine.get("m1"))
+        return first, second, set(daemon.containers)
+
+    first, second, containers = run_with_daemon(docker.socket_path, scenario)
+    assert not second["restarted"]
+    assert second["container_id"] != first["container_id"]
+    assert containers == {second["container_id"]}
@@ -0,0 +1,91 @@
+import asyncio
+import re
+from pathlib import Path
+
+import httpx
+import pytest
+
+import logarchive
+from logarchive import LogArchive, MachineLogArchive, format_timestamp
+from registry import MachineRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+T0 = 1_700_000_000
+
+
+def lines(first: int, count: int) -> str:
+    return "".join(f"{format_timestamp(t)}000Z line {t}\n" for t in range(first, first + count))
+
+
+def archived(archive_path: Path, *blocks: tuple[int, int]) -> MachineLogArchive:
+    """An archive holding one flushed block per (first second, line count)."""
+
+    async def write():
+        archive = MachineLogArchive("m1", archive_path)
+        for first, count in blocks:
+            archive.append(lines(first, count))
+            await archive.flush()
+        return archive
+
+    return asyncio.run(write())
+
+
+async def text_of(chunks) -> str:
+    return "".join([chunk async for chunk in chunks])
+
+
+def test_read_and_tail_select_by_time_and_count(tmp_path):
+    archive = archived(tmp_path, (T0, 10), (T0 + 10, 10), (T0 + 20, 10))
+    archive.append(lines(T0 + 30, 2))  # Captured but not flushed yet
+
+    assert asyncio.run(text_of(archive.read(T0 + 8, T0 + 12))) == lines(T0 + 8, 5)
+    assert asyncio.run(text_of(archive.read(T0 + 25))) == lines(T0 + 25, 7)
+    assert asyncio.run(text_of(archive.tail(15))) == lines(T0 + 17, 15)
+    assert asyncio.run(text_of(archive.tail(1))) == lines(T0 + 31, 1)
+
+
+def test_search_stops_at_the_limit(tmp_path):
+    archive = archived(tmp_path, (T0, 10), (T0 + 10, 10))
+    pattern = re.compile(r"line \d+[05]$", re.MULTILINE)
+
+    assert asyncio.run(text_of(archive.search(pattern))) == "".join(lines(t, 1) for t in (T0, T0 + 5, T0 + 10, T0 + 15))
+    assert asyncio.run(text_of(archive.search(pattern, since=T0 + 1, limit=2))) == lines(T0 + 5, 1) + lines(T0 + 10, 1)
+
+
+def test_segments_rotate_and_the_index_follows(tmp_path, monkeypatch):
+    monkeypatch.setattr(logarchive, "ARCHIVE_SEGMENT_BYTES", 1)  # One block per segment
+    monkeypatch.setattr(logarchive, "ARCHIVE_MAX_SEGMENTS", 3)
+    archive = archived(tmp_path, *((T0 + 10 * i, 10) for i in range(5)))
+
+    assert sorted(path.name for path in tmp_path.glob("segment-*")) == [f"segment-00000{n}.log.gz" for n in (3, 4, 5)]
+    assert asyncio.run(text_of(archive.read())) == lines(T0 + 20, 30)
+    reopened = MachineLogArchive("m1", tmp_path)
+    assert reopened.blocks == archive.blocks
+    assert reopened.last_timestamp == lines(T0 + 49, 1).split(" ", 1)[0]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)  # main mounts the dashboard and static directories relative to the working directory
+    import main
+
+    registry = MachineRegistry(tmp_path)
+    registry.add({"id": "m1", "name": "box", "status": "Running", "container_id": "c1"})
+    monkeypatch.setattr(main, "machine_registry", registry)
+    monkeypatch.setattr(main, "log_archive", LogArchive(tmp_path))
+    monkeypatch.setitem(main.app.dependency_overrides, main.authenticate_user, lambda: True)
+    (tmp_path / "container-m1").mkdir()
+    return main
+
+
+def test_archive_endpoint_honours_until_without_since(server):
+    async def run():
+        archive = server.log_archive.archive("m1")
+        archive.append(lines(T0, 10))
+        await archive.flush()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            return await client.get("/machines/m1/logs/archive", params={"until": T0 + 4})
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert response.text == lines(T0, 5)
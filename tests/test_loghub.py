@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import loghub
+from docker_client import docker
+from fake_docker import FakeDockerDaemon
+from loghub import LogHub, LogSubscriber, lines_after
+
+TEXT = "2024-01-01T00:00:01.000000000Z one\n2024-01-01T00:00:02.000000000Z two\n2024-01-01T00:00:03.000000000Z three\n"
+
+
+def test_lines_after_drops_lines_up_to_the_cursor():
+    assert lines_after(TEXT, "2024-01-01T00:00:00.000000000Z") == TEXT
+    assert lines_after(TEXT, "2024-01-01T00:00:02.000000000Z") == "2024-01-01T00:00:03.000000000Z three\n"
+    assert lines_after(TEXT, "2024-01-01T00:00:02.5") == "2024-01-01T00:00:03.000000000Z three\n"
+    assert lines_after(TEXT, "2024-01-01T00:00:03.000000000Z") == ""
+
+
+def test_full_subscriber_queue_drops_its_oldest_chunks(monkeypatch):
+    monkeypatch.setattr(loghub, "SUBSCRIBER_QUEUE_CHUNKS", 2)
+    subscriber = LogSubscriber()
+    chunks = TEXT.splitlines(keepends=True)
+    for chunk in [TEXT, *chunks]:
+        subscriber.put(chunk)
+
+    assert [subscriber.queue.get_nowait() for _ in range(2)] == chunks[1:]
+    assert subscriber.dropped_lines == 4
+    assert subscriber.dropped_through == "2024-01-01T00:00:01.000000000Z"
+
+
+@pytest.fixture
+def daemon_socket(tmp_path, monkeypatch):
+    monkeypatch.setattr(docker, "socket_path", str(tmp_path / "docker.sock"))
+    monkeypatch.setattr(docker, "_idle", [])
+    return docker.socket_path
+
+
+def test_viewers_share_one_follower_and_resume_from_a_cursor(daemon_socket):
+    released = None
+
+    async def log_source(container, tail):
+        for word in ("one", "two", "three"):
+            await asyncio.sleep(0.01)  # Distinct timestamps
+            yield f"{word} {'.' * 65536}\n".encode()  # A line per frame batch, so each is delivered at once
+        await released.wait()
+
+    async def run():
+        nonlocal released
+        released = asyncio.Event()
+        daemon = FakeDockerDaemon(daemon_socket)
+        daemon.log_source = log_source
+        container_id = daemon.add_container("m1")["Id"]
+        await daemon.start()
+        hub = LogHub()
+        try:
+            seen = ""
+            viewer = hub.subscribe(container_id)
+            async for chunk in viewer:
+                seen += chunk
+                if seen.count("\n") == 3:
+                    break
+            await viewer.aclose()  # Leaves the follower running through its grace period
+
+            cursor = seen.splitlines()[1].split(" ", 1)[0]
+            resumed = hub.subscribe(container_id, after=cursor)
+            replayed = await anext(resumed)
+            released.set()
+            rest = [chunk async for chunk in resumed]
+            follows = sum(path.endswith("/logs") for _, path in daemon.requests)
+            return seen, replayed, rest, follows, dict(hub.streams)
+        finally:
+            await hub.stop()
+            await docker.close()
+            await daemon.stop()
+
+    seen, replayed, rest, follows, streams = asyncio.run(run())
+    assert [line.split(" ", 2)[1] for line in seen.splitlines()] == ["one", "two", "three"]
+    assert replayed == seen.splitlines(keepends=True)[2]
+    assert rest == []
+    assert follows == 1
+    assert streams == {}  # Discarded once the output ended
@@ -0,0 +1,59 @@
+import asyncio
+
+import machine_state
+from machine_state import MACHINE_LABEL, MachineStateCache
+
+
+class SlowDocker:
+    """Stands in for the Docker client: listings take a while, so reconciles overlap."""
+
+    def __init__(self, containers: list[dict]):
+        self.containers = containers
+        self.listings = 0
+
+    async def ps(self, all=False, filters=None):
+        self.listings += 1
+        await asyncio.sleep(0.01)
+        return self.containers
+
+    async def inspect(self, container_id: str) -> dict:
+        await asyncio.sleep(0.01)
+        return {"State": {"StartedAt": "2026-01-01T00:00:00Z"}}
+
+
+def container(machine_id: str, state: str = "running") -> dict:
+    return {"Id": f"id-{machine_id}", "State": state, "Labels": {MACHINE_LABEL: machine_id}}
+
+
+def test_concurrent_reconciles(monkeypatch):
+    fake = SlowDocker([container("a"), container("b", "exited")])
+    monkeypatch.setattr(machine_state, "docker", fake)
+    cache = MachineStateCache()
+
+    async def run():
+        await asyncio.gather(*(cache.reconcile() for _ in range(3)))
+
+    asyncio.run(run())
+    assert fake.listings == 3
+    assert cache.containers["a"]["state"] == "running"
+    assert cache.containers["a"]["started_at"] is not None
+    assert cache.containers["b"] == {"container_id": "id-b", "state": "exited", "started_at": None}
+    assert cache._changed_during_reconcile is None
+
+
+def test_event_during_reconcile_wins(monkeypatch):
+    fake = SlowDocker([container("a")])
+    monkeypatch.setattr(machine_state, "docker", fake)
+    cache = MachineStateCache()
+    event = {"Type": "container", "Action": "die", "Actor": {"ID": "id-a", "Attributes": {MACHINE_LABEL: "a"}}, "time": 1}
+
+    async def run():
+        first = asyncio.create_task(cache.reconcile())
+        second = asyncio.create_task(cache.reconcile())
+        while fake.listings < 2:  # Wait for the second reconcile's listing to be in flight
+            await asyncio.sleep(0.001)
+        cache.apply_event(event)
+        await asyncio.gather(first, second)
+
+    asyncio.run(run())
+    assert cache.containers["a"]["state"] == "exited"
@@ -0,0 +1,28 @@
+import asyncio
+
+import startup
+from machine_state import machine_states
+from registry import MachineRegistry
+
+
+def test_boot_reports_unexpected_failures_and_shows_queued_machines_starting(tmp_path, monkeypatch):
+    registry = MachineRegistry(tmp_path)
+    for machine_id, last_started_at in (("gone", 3), ("ok", 2), ("queued", 1)):
+        registry.add({"id": machine_id, "name": machine_id, "status": "Running", "last_started_at": last_started_at})
+    monkeypatch.setattr(startup, "machine_registry", registry)
+    transitions_seen = {}
+
+    async def start_machine_container(machine_info: dict):
+        await asyncio.sleep(0.01)
+        transitions_seen[machine_info["id"]] = dict(machine_states.transitions)
+        if machine_info["id"] == "gone":
+            raise KeyError(machine_info["id"])  # Deleted while it was booting
+        return True
+
+    monkeypatch.setattr(startup, "start_machine_container", start_machine_container)
+    results = asyncio.run(startup.boot_machines(concurrency=1))
+
+    assert [(r["id"], r["ok"]) for r in results] == [("gone", False), ("ok", True), ("queued", True)]
+    # Machines still waiting for the slot already show as starting
+    assert transitions_seen["gone"] == {"gone": "Starting", "ok": "Starting", "queued": "Starting"}
+    assert machine_states.transitions == {}
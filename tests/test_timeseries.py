@@ -0,0 +1,75 @@
+import pytest
+
+from timeseries import SERIES_FILE, UsageSeries, UsageStore
+from usage import UsageCollector
+
+# A start time on an hour boundary, so every tier's buckets line up with it
+T0 = 1_700_000_000 // 3600 * 3600
+
+
+def sample(cpu: float, net: int = 0) -> dict:
+    return {"cpu_percent": cpu, "mem_usage": 1000 * cpu, "mem_limit": 4096, "net_rx": net, "net_tx": net // 2}
+
+
+@pytest.fixture
+def series(tmp_path):
+    series = UsageSeries(tmp_path / SERIES_FILE)
+    yield series
+    series.close()
+
+
+def test_ring_wraparound_replaces_the_old_bucket(series):
+    series.add(T0, sample(10))
+    series.add(T0 + 3600, sample(30))  # Same slot of the one-second ring, an hour later
+
+    step, timestamps, columns = series.columns(T0, T0 + 3600, 1)
+    assert (step, timestamps, columns["cpu_percent"]) == (1, [T0 + 3600], [30])
+
+
+def test_seconds_roll_up_into_minutes(series):
+    for t in range(120):
+        series.add(T0 + t, sample(t % 60, net=t * 100))
+
+    step, timestamps, columns = series.columns(T0, T0 + 119, 60)
+    assert step == 60
+    assert timestamps == [T0, T0 + 60]
+    assert columns["cpu_percent"] == [29.5, 29.5]  # Means merge
+    assert columns["mem_limit"] == [4096, 4096]
+    assert columns["net_rx"] == [5900, 11900]  # Counters keep the value at the end of the minute
+
+
+def test_step_is_rounded_to_the_tier_resolution(series):
+    for t in range(0, 600, 10):
+        series.add(T0 + t, sample(1))
+
+    step, timestamps, _ = series.columns(T0, T0 + 599, 150)
+    assert step == 120  # Read from the minute tier
+    assert timestamps == [T0, T0 + 120, T0 + 240, T0 + 360, T0 + 480]
+
+
+def test_series_survives_reopening(tmp_path):
+    series = UsageSeries(tmp_path / SERIES_FILE)
+    series.add(T0, sample(42))
+    series.flush()
+    series.close()
+
+    reopened = UsageSeries(tmp_path / SERIES_FILE)
+    assert reopened.columns(T0, T0, 1)[2]["cpu_percent"] == [42]
+    reopened.close()
+
+
+def test_history_timestamps_are_delta_encoded(tmp_path):
+    (tmp_path / "container-m1").mkdir()
+    collector = UsageCollector(backend="docker")
+    collector.store = UsageStore(tmp_path)
+    series = collector.store.get("m1")
+    for t in (0, 1, 2, 5):
+        series.add(T0 + t, sample(12.345))
+
+    history = collector.history_of("m1", "live", since=T0, until=T0 + 10)
+    assert history["step"] == 1
+    assert history["timestamps"] == [T0, 1, 1, 3]
+    assert history["cpu_percent"] == [12.35] * 4
+    assert history["mem_usage"] == [12345] * 4
+    assert collector.history_of("other", "live", since=T0, until=T0 + 10)["timestamps"] == []
+    collector.store.close()
@@ -0,0 +1,110 @@
+import asyncio
+import io
+import tarfile
+import time
+
+import pytest
+
+from uploads import UPLOAD_CHUNK_BYTES, UPLOAD_SESSION_TTL, UploadError, UploadReceiver, UploadSessions
+
+BOUNDARY = "testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+async def body(data: bytes, wait: asyncio.Event | None = None):
+    yield data[:1]
+    if wait is not None:
+        await wait.wait()
+    yield data[1:]
+
+
+def test_finalize_waits_for_chunk_in_flight(tmp_path):
+    sessions = UploadSessions(tmp_path / "workspace")
+    target = tmp_path / "files"
+    target.mkdir()
+
+    async def run():
+        session = await sessions.create("m1", target, "/", "data.bin", 8)
+        await sessions.write(session, 0, body(b"abcdefgh"))
+        # A retried chunk still arriving when the client asks to finalize
+        release = asyncio.Event()
+        retry = asyncio.create_task(sessions.write(session, 4, body(b"efgh", wait=release)))
+        while not session.writes:
+            await asyncio.sleep(0)
+        with pytest.raises(UploadError):
+            await sessions.finalize(session)
+        release.set()
+        while session.writes:
+            await asyncio.sleep(0)
+        await sessions.finalize(session)
+        await retry
+        with pytest.raises(UploadError):
+            await sessions.write(session, 0, body(b"ab"))
+        return session
+
+    session = asyncio.run(run())
+    assert (target / "data.bin").read_bytes() == b"abcdefgh"
+    assert not session.part_path.exists()
+    assert not list((tmp_path / "workspace" / "container-m1" / "uploads").glob("*.json"))
+    assert sessions.finalized == 1
+
+
+def test_idle_sessions_expire(tmp_path):
+    sessions = UploadSessions(tmp_path / "workspace")
+    target = tmp_path / "files"
+    target.mkdir()
+
+    async def run():
+        idle = await sessions.create("m1", target, "/", "idle.bin", 4)
+        active = await sessions.create("m2", target, "/", "active.bin", 4)
+        idle.updated = time.time() - UPLOAD_SESSION_TTL - 1
+        await sessions._save(idle)
+        assert await sessions.expire() == 1
+        with pytest.raises(UploadError):
+            await sessions.write(idle, 0, body(b"ab"))
+        return idle, active
+
+    idle, active = asyncio.run(run())
+    assert not idle.part_path.exists()
+    assert active.part_path.exists()
+    assert set(sessions.sessions) == {active.id}
+    assert sessions.expired == 1
+
+
+def tar_gz(name: str, data: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+async def multipart(filename: str, data: bytes, stall: asyncio.Event | None = None):
+    yield f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n\r\n'.encode()
+    # More than a writer chunk, so some of the file is handed to the writer before the stall
+    for start in range(0, len(data), UPLOAD_CHUNK_BYTES):
+        yield data[start:start + UPLOAD_CHUNK_BYTES]
+        if stall is not None:
+            await stall.wait()
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.mark.parametrize("filename", ["stalled.bin", "stalled.tar.gz"])
+def test_stalled_upload_does_not_hold_writer_slot(tmp_path, filename):
+    receiver = UploadReceiver()
+    receiver._slots = asyncio.Semaphore(1)
+    payload = tar_gz("big.bin", bytes(3 * UPLOAD_CHUNK_BYTES)) if filename.endswith(".tar.gz") else bytes(3 * UPLOAD_CHUNK_BYTES)
+
+    async def run():
+        stall = asyncio.Event()
+        stalled = asyncio.create_task(receiver.receive(CONTENT_TYPE, multipart(filename, payload, stall), tmp_path))
+        await asyncio.sleep(0.1)  # The stalled client has sent its first chunks and waits
+        uploaded = await asyncio.wait_for(receiver.receive(CONTENT_TYPE, multipart("other.bin", b"x" * 100), tmp_path), 5)
+        stall.set()
+        await stalled
+        return uploaded
+
+    uploaded = asyncio.run(run())
+    assert uploaded[0].size == 100
+    assert (tmp_path / "other.bin").read_bytes() == b"x" * 100
@@ -0,0 +1,54 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+from registry import MachineRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)  # main mounts the dashboard and static directories relative to the working directory
+    import main
+
+    registry = MachineRegistry(tmp_path)
+    registry.add({"id": "m1", "name": "box", "status": "Running", "container_id": "c1"})
+    monkeypatch.setattr(main, "machine_registry", registry)
+    monkeypatch.setattr(main.machine_states, "ready", False)
+    monkeypatch.setitem(main.app.dependency_overrides, main.authenticate_user, lambda: True)
+    return main
+
+
+def get(server, url: str) -> httpx.Response:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            return await client.get(url)
+
+    return asyncio.run(run())
+
+
+def test_snapshot_without_sample_is_pending(server, monkeypatch):
+    async def stats(container_id: str):
+        raise AssertionError("The endpoint must not ask Docker for a sample")
+
+    monkeypatch.setattr(server.docker, "stats", stats)
+    response = get(server, "/machines/m1/usage-snapshot")
+    assert response.status_code == 202
+    assert response.json()["pending"] is True
+
+
+def test_snapshot_returns_the_collected_sample(server, monkeypatch):
+    monkeypatch.setattr(server.usage_collector, "latest", {"m1": {"container_id": "c1", "sampled_at": 0, "usage": {"cpu_percent": "1.00%"}, "values": {}}})
+    response = get(server, "/machines/m1/usage-snapshot")
+    assert response.status_code == 200
+    assert response.json() == {"cpu_percent": "1.00%"}
+
+
+def test_history_of_unknown_machine_is_not_found(server):
+    assert get(server, "/machines/nope/usage-history").status_code == 404
+    response = get(server, "/machines/m1/usage-history")
+    assert response.status_code == 200
+    assert set(response.json()) >= {"step", "timestamps", "cpu_percent"}
@@ -0,0 +1,164 @@
+import mmap
+import os
+import struct
+from pathlib import Path
+
+# Resolution (seconds) and number of slots of each rollup tier: an hour of seconds,
+# a day of minutes and a week of hours
+TIERS = ((1, 3600), (60, 1440), (3600, 168))
+
+# Stored metrics and how samples falling into one slot are combined
+FIELDS = (
+    ("cpu_percent", "mean"),
+    ("mem_usage", "mean"),
+    ("mem_limit", "last"),
+    ("net_rx", "last"),  # Cumulative counters: the last value is the value at the slot's end
+    ("net_tx", "last"),
+)
+
+SERIES_FILE = "usage.series"
+_MAGIC = b"VMWUSAGE"
+_HEADER = struct.Struct("<8sII")  # magic, version, slot width (doubles)
+_HEADER_SIZE = 64
+_VERSION = 1
+
+# A slot is [bucket start, sample count, one double per field]
+_SLOT = 2 + len(FIELDS)
+_FILE_SIZE = _HEADER_SIZE + sum(slots for _, slots in TIERS) * _SLOT * 8
+
+
+class UsageSeries:
+    """
+    One machine's usage history as fixed-size numeric rings, one per tier in TIERS, stored in
+    a memory-mapped file so it survives restarts.
+
+    Every sample is added to the current slot of all tiers at once, so the minute and hour
+    rollups need no separate pass. A slot is reset when its ring wraps around to a new bucket;
+    slots whose bucket is older than the ring's span are ignored on read.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            header = os.pread(fd, _HEADER.size, 0)
+            valid = os.fstat(fd).st_size == _FILE_SIZE and header == _HEADER.pack(_MAGIC, _VERSION, _SLOT)
+            if not valid:
+                # New file, or one written with another layout: start over
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, _FILE_SIZE)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, _VERSION, _SLOT), 0)
+            self._mmap = mmap.mmap(fd, _FILE_SIZE)
+        finally:
+            os.close(fd)
+        self._values = memoryview(self._mmap)[_HEADER_SIZE:].cast("d")
+        offsets, offset = [], 0
+        for _, slots in TIERS:
+            offsets.append(offset)
+            offset += slots * _SLOT
+        self._offsets = offsets
+
+    def add(self, timestamp: float, values: dict):
+        v = self._values
+        for (resolution, slots), offset in zip(TIERS, self._offsets):
+            bucket_number = int(timestamp // resolution)
+            base = offset + (bucket_number % slots) * _SLOT
+            if v[base] != bucket_number * resolution:
+                # The ring wrapped around: the slot now holds a new bucket
+                for i in range(_SLOT):
+                    v[base + i] = 0.0
+                v[base] = bucket_number * resolution
+            v[base + 1] += 1
+            for i, (name, combine) in enumerate(FIELDS):
+                if combine == "mean":
+                    v[base + 2 + i] += values[name]
+                else:
+                    v[base + 2 + i] = values[name]
+
+    def columns(self, since: float, until: float, step: int) -> tuple[int, list[int], dict[str, list[float]]]:
+        """
+        Returns the points between since and until as parallel columns, oldest first, at `step`
+        seconds per point: (step, timestamps, {field: values}).
+
+        Points come from the coarsest tier at least as fine as `step`, and are merged exactly as
+        samples are merged into a slot. `step` is rounded down to a multiple of that tier's
+        resolution (the effective step is returned), and since is rounded down to a step, so
+        the first point is always complete. A tier only reaches back its own span.
+        """
+        resolution, slots = next(
+            ((resolution, slots) for resolution, slots in reversed(TIERS) if resolution <= step), TIERS[0]
+        )
+        tier = TIERS.index((resolution, slots))
+        step = max(step // resolution, 1) * resolution
+        offset = self._offsets[tier]
+        v = self._values
+        last = int(until // resolution)
+        first = max(int(since // step * step // resolution), last - slots + 1)
+
+        means = [combine == "mean" for _, combine in FIELDS]
+        timestamps: list[int] = []
+        values: list[list[float]] = [[] for _ in FIELDS]
+        start = None
+        count = 0.0
+        merged = [0.0] * len(FIELDS)
+        for bucket_number in range(first, last + 1):
+            base = offset + (bucket_number % slots) * _SLOT
+            slot_count = v[base + 1]
+            if v[base] != bucket_number * resolution or not slot_count:
+                continue  # Nothing recorded in that bucket (or overwritten by a newer one)
+            point_start = int(v[base]) // step * step
+            if point_start != start:
+                if count:
+                    timestamps.append(start)
+                    for column, mean, value in zip(values, means, merged):
+                        column.append(value / count if mean else value)
+                start = point_start
+                count = 0.0
+                merged = [0.0] * len(FIELDS)
+            count += slot_count
+            for i, mean in enumerate(means):
+                merged[i] = merged[i] + v[base + 2 + i] if mean else v[base + 2 + i]
+        if count:
+            timestamps.append(start)
+            for column, mean, value in zip(values, means, merged):
+                column.append(value / count if mean else value)
+        return step, timestamps, {name: column for (name, _), column in zip(FIELDS, values)}
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        self._values.release()
+        self._mmap.close()
+
+
+class UsageStore:
+    """The UsageSeries of every machine, in workspace/container-<id>/usage.series."""
+
+    def __init__(self, workspace_path: Path = Path("workspace")):
+        self.workspace_path = workspace_path
+        self.series: dict[str, UsageSeries] = {}
+
+    def get(self, machine_id: str, create: bool = True) -> UsageSeries | None:
+        """Opens a machine's series; None if its directory is gone (or if it has no series and not `create`)."""
+        series = self.series.get(machine_id)
+        if series is None:
+            path = self.workspace_path / f"container-{machine_id}" / SERIES_FILE
+            if not path.parent.is_dir() or (not create and not path.is_file()):
+                return None
+            series = self.series[machine_id] = UsageSeries(path)
+        return series
+
+    def drop(self, machine_id: str):
+        series = self.series.pop(machine_id, None)
+        if series is not None:
+            series.close()
+
+    def flush(self):
+        for series in self.series.values():
+            series.flush()
+
+    def close(self):
+        for machine_id in list(self.series):
+            self.series[machine_id].flush()
+            self.drop(machine_id)
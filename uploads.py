@@ -0,0 +1,682 @@
+import asyncio
+import errno
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from archives import archive_kind, extract_tar, extract_zip
+from registry import write_json_atomic
+
+# Uploaded data is handed to the writer thread in chunks of this size
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Chunks of one file waiting for the writer thread; when full, the request body stops being
+# read until the disk catches up, so memory per upload stays bounded
+UPLOAD_BUFFER_CHUNKS = 4
+
+# Chunks written to disk at the same time, across all uploads. A slot is held per write (or,
+# for a streamed tar, while one chunk is extracted), never while waiting for the client
+UPLOAD_MAX_WRITERS = 16
+
+# Resumable upload sessions: the largest chunk one PUT may carry, and how long a session may
+# sit idle before it is removed with its data
+UPLOAD_SESSION_MAX_CHUNK = 64 * 1024**2
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# Seconds between two sweeps for idle upload sessions
+UPLOAD_SESSION_EXPIRE_INTERVAL = 3600
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """Raised for a malformed upload; the message is user-facing."""
+
+
+class UploadedFile(NamedTuple):
+    """A file that landed: its name in the upload, where it went and, for archives, extraction counts."""
+
+    filename: str
+    destination: Path
+    size: int
+    extracted: dict | None
+
+
+def _open_temp(destination: Path):
+    fd, temp_path = tempfile.mkstemp(dir=destination.parent, prefix=f".{destination.name}.", suffix=".part")
+    return os.fdopen(fd, "wb", buffering=0), temp_path
+
+
+def _commit(f, temp_path: str, destination: Path):
+    f.close()
+    os.replace(temp_path, destination)
+
+
+def _discard(f, temp_path: str):
+    f.close()
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+class FileWriter:
+    """
+    Writes one uploaded file from a worker thread to a temporary file next to `destination`,
+    then renames it into place, so a partial upload is never seen under the final name.
+
+    `write` only queues data: at most UPLOAD_BUFFER_CHUNKS chunks of UPLOAD_CHUNK_BYTES wait
+    for the thread, and `write` waits when they are full.
+    """
+
+    def __init__(self, filename: str, destination: Path, slots: asyncio.Semaphore):
+        self.filename = filename
+        self.destination = destination
+        self.size = 0
+        self.extracted: dict | None = None
+        self._buffer = bytearray()
+        self._queue: asyncio.Queue[bytes | None] = asyncio.Queue(UPLOAD_BUFFER_CHUNKS)
+        self._slots = slots
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        f, temp_path = await asyncio.to_thread(_open_temp, self.destination)
+        try:
+            await self._spool(f)
+            async with self._slots:
+                await asyncio.to_thread(_commit, f, temp_path, self.destination)
+        except BaseException:
+            _discard(f, temp_path)
+            raise
+
+    async def _spool(self, f):
+        """Writes queued chunks to `f` until the end of the file."""
+        while (chunk := await self._queue.get()) is not None:
+            async with self._slots:
+                await asyncio.to_thread(f.write, chunk)
+
+    async def _put(self, item: bytes | None):
+        if not self._task.done():
+            if not self._queue.full():
+                self._queue.put_nowait(item)
+                return
+            put = asyncio.ensure_future(self._queue.put(item))
+            try:
+                await asyncio.wait((put, self._task), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not put.done():
+                    put.cancel()
+            if put.done() and not put.cancelled():
+                return
+        await self._task  # The writer stopped early: raise its error
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        self._buffer += data
+        if len(self._buffer) >= UPLOAD_CHUNK_BYTES:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            await self._put(chunk)
+
+    async def finish(self):
+        """Writes what is left and renames the file into place."""
+        if self._buffer:
+            await self._put(bytes(self._buffer))
+            self._buffer.clear()
+        await self._put(None)
+        await self._task
+
+    async def abort(self):
+        """Stops writing and removes the temporary file."""
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class _QueueReader(io.RawIOBase):
+    """
+    A blocking file object over a writer's chunk queue, read from a worker thread. It holds a
+    writer slot from when a chunk arrives until the next one is asked for, so the slot covers
+    the thread's work on that chunk but not its wait for the client.
+    """
+
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore):
+        self._queue = queue
+        self._loop = loop
+        self._slots = slots
+        self._chunk = memoryview(b"")
+        self._eof = False
+        self._holding = False
+        self.aborted = False
+
+    def release(self):
+        """Gives the slot back (from the worker thread)."""
+        if self._holding:
+            self._holding = False
+            self._loop.call_soon_threadsafe(self._slots.release)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and not self._eof:
+            self.release()
+            chunk = asyncio.run_coroutine_threadsafe(self._queue.get(), self._loop).result()
+            if self.aborted:
+                raise OSError("Upload aborted.")
+            if chunk is None:
+                self._eof = True
+            else:
+                asyncio.run_coroutine_threadsafe(self._slots.acquire(), self._loop).result()
+                self._holding = True
+                self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+class ArchiveWriter(FileWriter):
+    """
+    Extracts an uploaded archive into the `destination` folder as it is received.
+
+    Tar archives are decompressed and extracted from the upload stream itself, in one pass.
+    A zip's directory is at its end, so a zip is written to a temporary file first and its
+    entries are then extracted from there, straight to their final paths.
+    """
+
+    def __init__(self, filename: str, destination: Path, kind: str, slots: asyncio.Semaphore):
+        self.kind = kind
+        self._reader: _QueueReader | None = None
+        super().__init__(filename, destination, slots)
+
+    async def _run(self):
+        if self.kind != "zip":
+            self._reader = reader = _QueueReader(self._queue, asyncio.get_running_loop(), self._slots)
+
+            def extract():
+                try:
+                    return extract_tar(reader, self.destination, self.kind)
+                finally:
+                    reader.release()  # In the thread: it may still run after this task was cancelled
+
+            self.extracted = await asyncio.to_thread(extract)
+            return
+        f, temp_path = await asyncio.to_thread(_open_temp, self.destination)
+        try:
+            await self._spool(f)
+            await asyncio.to_thread(f.close)
+            async with self._slots:
+                self.extracted = await asyncio.to_thread(extract_zip, temp_path, self.destination)
+        finally:
+            _discard(f, temp_path)
+
+    async def abort(self):
+        if self._reader is not None:
+            # Wake the extracting thread if it waits for data; it stops at its next read
+            self._reader.aborted = True
+            try:
+                self._queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        await super().abort()
+
+
+def check_filename(filename: str):
+    """Rejects names that would leave the target directory."""
+    if not filename or filename in (".", "..") or "/" in filename or "\\" in filename or "\0" in filename:
+        raise UploadError(f"Invalid file name: {filename!r}")
+
+
+class _Part:
+    def __init__(self):
+        self.headers: dict[bytes, bytes] = {}
+        self.header_field = b""
+        self.header_value = b""
+
+
+class UploadReceiver:
+    """
+    Streams the files of multipart/form-data requests straight to their destinations.
+
+    The body is parsed as it arrives and each file part goes through a FileWriter (archives
+    through an ArchiveWriter), so nothing is spooled first and the event loop never waits on
+    the disk. A file's rename overlaps with receiving the next part, and all uploads together
+    have at most UPLOAD_MAX_WRITERS chunks going to disk at a time, however many clients are
+    still sending.
+    """
+
+    def __init__(self):
+        self._slots = asyncio.Semaphore(UPLOAD_MAX_WRITERS)
+        self.uploads = 0
+        self.active_uploads = 0
+        self.failures = 0
+        self.files = 0
+        self.bytes = 0
+        self.max_seconds = 0.0
+
+    async def receive(self, content_type: str | None, body: AsyncIterator[bytes], target_dir: Path) -> list[UploadedFile]:
+        """
+        Writes every file part of the body into `target_dir`, extracting archives (see
+        archives.ARCHIVE_SUFFIXES) into a folder named after them; returns the files in body
+        order. Fields without a filename are ignored.
+
+        On error no temporary file is left behind; files completed before it stay in place.
+        """
+        media_type, params = parse_options_header(content_type or "")
+        boundary = params.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise UploadError("Expected a multipart/form-data body.")
+
+        events: list[tuple[str, object]] = []
+        part = _Part()
+
+        def on_header_field(data: bytes, start: int, end: int):
+            part.header_field += data[start:end]
+
+        def on_header_value(data: bytes, start: int, end: int):
+            part.header_value += data[start:end]
+
+        def on_header_end():
+            part.headers[part.header_field.lower()] = part.header_value
+            part.header_field = part.header_value = b""
+
+        def on_headers_finished():
+            events.append(("begin", dict(part.headers)))
+            part.headers.clear()
+
+        callbacks = {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end", None)),
+        }
+        parser = MultipartParser(boundary, callbacks)
+
+        started = time.perf_counter()
+        self.uploads += 1
+        self.active_uploads += 1
+        finishing: list[tuple[FileWriter, asyncio.Task]] = []
+        writer: FileWriter | None = None
+        try:
+            async for chunk in body:
+                try:
+                    parser.write(chunk)
+                except Exception as e:
+                    raise UploadError(f"Invalid multipart body: {e}")
+                for event, value in events:
+                    if event == "begin":
+                        _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                        if b"filename" not in disposition:
+                            continue  # A plain form field
+                        filename = disposition[b"filename"].decode("utf-8", "replace")
+                        check_filename(filename)
+                        archive = archive_kind(filename)
+                        if archive is not None:
+                            kind, folder = archive
+                            check_filename(folder)
+                            writer = ArchiveWriter(filename, target_dir / folder, kind, self._slots)
+                        else:
+                            writer = FileWriter(filename, target_dir / filename, self._slots)
+                    elif event == "data" and writer is not None:
+                        await writer.write(value)
+                    elif event == "end" and writer is not None:
+                        # Renamed into place while the next part is received
+                        finishing.append((writer, asyncio.create_task(writer.finish())))
+                        writer = None
+                events.clear()
+            parser.finalize()
+            if writer is not None:
+                raise UploadError("The upload ended in the middle of a file.")
+            await asyncio.gather(*(task for _, task in finishing))
+        except BaseException:
+            self.failures += 1
+            pending = [w for w in [writer] if w is not None]
+            pending += [w for w, task in finishing if not task.done() or task.cancelled() or task.exception()]
+            await asyncio.gather(*(w.abort() for w in pending), return_exceptions=True)
+            raise
+        finally:
+            self.active_uploads -= 1
+            self.max_seconds = max(self.max_seconds, time.perf_counter() - started)
+
+        for writer, _ in finishing:
+            self.files += 1
+            self.bytes += writer.size
+        return [UploadedFile(writer.filename, writer.destination, writer.size, writer.extracted) for writer, _ in finishing]
+
+    def stats(self) -> dict:
+        return {
+            "uploads": self.uploads,
+            "active_uploads": self.active_uploads,
+            "failures": self.failures,
+            "files": self.files,
+            "bytes": self.bytes,
+            "max_seconds": round(self.max_seconds, 3),
+            "max_writers": UPLOAD_MAX_WRITERS,
+        }
+
+
+def _preallocate(path: Path, size: int):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, size)  # Reserves the disk space now: a full disk fails here
+        except (AttributeError, OSError) as e:
+            if isinstance(e, OSError) and e.errno == errno.ENOSPC:
+                raise
+            os.ftruncate(fd, size)  # No fallocate on this platform or filesystem
+    except BaseException:
+        os.close(fd)
+        os.remove(path)
+        raise
+    os.close(fd)
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def _remove(path: Path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _extract_tar_file(path: Path, destination: Path, kind: str) -> dict:
+    with open(path, "rb") as f:
+        return extract_tar(f, destination, kind)
+
+
+class UploadSession:
+    """
+    A resumable upload: a preallocated part file next to its destination, written chunk by
+    chunk at the offsets the client gives, and the byte ranges received so far.
+    """
+
+    def __init__(self, upload_id: str, machine_id: str, filename: str, path: str, target_dir: Path, size: int,
+                 received: list[list[int]] | None = None, updated: float | None = None):
+        self.id = upload_id
+        self.machine_id = machine_id
+        self.filename = filename
+        self.path = path
+        self.target_dir = target_dir
+        self.size = size
+        self.received = received or []  # Sorted, merged [start, end) ranges
+        self.updated = updated or time.time()
+        self.lock = asyncio.Lock()
+        self.writes = 0  # Chunks being written
+        self.finalizing = False
+        self.ended = False  # Finalized, aborted or expired: no chunk may be written or recorded any more
+
+    @property
+    def part_path(self) -> Path:
+        return self.target_dir / f".{self.filename}.{self.id}.part"
+
+    @property
+    def complete(self) -> bool:
+        return self.size == 0 or self.received == [[0, self.size]]
+
+    def add_range(self, start: int, end: int):
+        merged: list[list[int]] = []
+        for range_start, range_end in sorted(self.received + [[start, end]]):
+            if merged and range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        self.received = merged
+        self.updated = time.time()
+
+    def missing(self) -> list[list[int]]:
+        gaps, position = [], 0
+        for start, end in self.received:
+            if start > position:
+                gaps.append([position, start])
+            position = end
+        if position < self.size:
+            gaps.append([position, self.size])
+        return gaps
+
+    def to_dict(self) -> dict:
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "path": self.path,
+            "size": self.size,
+            "received": self.received,
+            "received_bytes": sum(end - start for start, end in self.received),
+            "complete": self.complete,
+        }
+
+    def record(self) -> dict:
+        return {**self.to_dict(), "machine_id": self.machine_id, "target_dir": str(self.target_dir), "updated": self.updated}
+
+
+class UploadSessions:
+    """
+    Resumable upload sessions: create, PUT chunks at offsets (in parallel if wanted), query
+    the received ranges, finalize.
+
+    Chunks are written with pwrite straight into the session's part file, preallocated to the
+    full size under the machine's files/ tree; finalizing renames it into place (or extracts
+    it, for archives). Sessions are recorded in workspace/container-<id>/uploads/<upload id>.json
+    after every chunk, so an upload can resume after the tunnel drops or the server restarts.
+    A chunk cut off midway still counts for the bytes that were written.
+    """
+
+    def __init__(self, workspace_path: Path = Path("workspace")):
+        self.workspace_path = workspace_path
+        self.sessions: dict[str, UploadSession] = {}
+        self.created = 0
+        self.finalized = 0
+        self.aborted = 0
+        self.expired = 0
+        self.chunks = 0
+        self.bytes = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Starts the sweep for idle sessions (call from the FastAPI lifespan)."""
+        self._task = asyncio.create_task(self._expire_periodically())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _records_dir(self, machine_id: str) -> Path:
+        return self.workspace_path / f"container-{machine_id}" / "uploads"
+
+    async def _save(self, session: UploadSession):
+        path = self._records_dir(session.machine_id) / f"{session.id}.json"
+        await asyncio.to_thread(write_json_atomic, path, session.record())
+
+    async def create(self, machine_id: str, target_dir: Path, path: str, filename: str, size: int) -> UploadSession:
+        check_filename(filename)
+        archive = archive_kind(filename)
+        if archive is not None:
+            check_filename(archive[1])
+        if size < 0:
+            raise UploadError("Upload size must not be negative.")
+        await self.expire(machine_id)
+        session = UploadSession(uuid.uuid4().hex, machine_id, filename, path, target_dir, size)
+        await asyncio.to_thread(self._records_dir(machine_id).mkdir, parents=True, exist_ok=True)
+        await asyncio.to_thread(_preallocate, session.part_path, size)
+        self.sessions[session.id] = session
+        await self._save(session)
+        self.created += 1
+        return session
+
+    def _load(self, machine_id: str, upload_id: str) -> UploadSession | None:
+        try:
+            record = json.loads((self._records_dir(machine_id) / f"{upload_id}.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        session = UploadSession(upload_id, machine_id, record["filename"], record["path"], Path(record["target_dir"]),
+                                record["size"], record["received"], record["updated"])
+        return session if session.part_path.is_file() else None
+
+    async def get(self, machine_id: str, upload_id: str) -> UploadSession | None:
+        """Returns a session of the machine, from memory or its record (after a restart), or None."""
+        if not _SESSION_ID.match(upload_id):
+            return None
+        session = self.sessions.get(upload_id)
+        if session is None:
+            session = await asyncio.to_thread(self._load, machine_id, upload_id)
+            if session is not None:
+                session = self.sessions.setdefault(upload_id, session)
+        return session if session is not None and session.machine_id == machine_id else None
+
+    async def write(self, session: UploadSession, offset: int, body: AsyncIterator[bytes]) -> int:
+        """Writes a chunk's body at `offset`; returns the bytes written."""
+        if not 0 <= offset <= session.size:
+            raise UploadError(f"Offset {offset} is outside the upload's {session.size} bytes.")
+        if session.ended:
+            raise UploadError("Upload has already ended.")
+        if session.finalizing:
+            raise UploadError("Upload is being finalized.")
+        session.writes += 1
+        try:
+            fd = await asyncio.to_thread(os.open, session.part_path, os.O_WRONLY)
+        except BaseException:
+            session.writes -= 1
+            raise
+        position = offset
+        buffer = bytearray()
+        try:
+            async for data in body:
+                buffer += data
+                if position + len(buffer) > session.size:
+                    raise UploadError(f"Chunk at offset {offset} runs past the upload's {session.size} bytes.")
+                if position + len(buffer) - offset > UPLOAD_SESSION_MAX_CHUNK:
+                    raise UploadError(f"Chunks may not exceed {UPLOAD_SESSION_MAX_CHUNK // 1024**2} MB.")
+                if len(buffer) >= UPLOAD_CHUNK_BYTES:
+                    await asyncio.to_thread(_pwrite_all, fd, bytes(buffer), position)
+                    position += len(buffer)
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(_pwrite_all, fd, bytes(buffer), position)
+                position += len(buffer)
+        finally:
+            await asyncio.to_thread(os.close, fd)
+            # Whatever reached the file counts, even if the chunk was cut off. The chunk stays
+            # counted in `writes` until it is recorded, so finalize can't start before that.
+            async with session.lock:
+                try:
+                    if position > offset and not session.ended:
+                        session.add_range(offset, position)
+                        self.chunks += 1
+                        self.bytes += position - offset
+                        await self._save(session)
+                finally:
+                    session.writes -= 1
+        return position - offset
+
+    async def finalize(self, session: UploadSession) -> UploadedFile:
+        """
+        Moves a complete upload into place, or extracts it if it is an archive. Raises
+        UploadError if bytes are missing or chunks are still being written.
+        """
+        async with session.lock:
+            if session.writes:
+                raise UploadError("Chunks of this upload are still being written.")
+            if not session.complete:
+                raise UploadError(f"Upload is missing {len(session.missing())} byte range(s).")
+            session.finalizing = True
+            archive = archive_kind(session.filename)
+            destination = session.target_dir / (archive[1] if archive else session.filename)
+            extracted = None
+            try:
+                if archive is None:
+                    await asyncio.to_thread(os.replace, session.part_path, destination)
+                elif archive[0] == "zip":
+                    extracted = await asyncio.to_thread(extract_zip, session.part_path, destination)
+                else:
+                    extracted = await asyncio.to_thread(_extract_tar_file, session.part_path, destination, archive[0])
+            finally:
+                # A failed extraction can't be retried with other bytes: the session ends either way
+                if archive is not None:
+                    await asyncio.to_thread(_remove, session.part_path)
+                await self._drop(session)
+            self.finalized += 1
+            return UploadedFile(session.filename, destination, session.size, extracted)
+
+    async def abort(self, session: UploadSession):
+        async with session.lock:
+            await asyncio.to_thread(_remove, session.part_path)
+            await self._drop(session)
+            self.aborted += 1
+
+    async def _drop(self, session: UploadSession):
+        session.ended = True
+        self.sessions.pop(session.id, None)
+        await asyncio.to_thread(_remove, self._records_dir(session.machine_id) / f"{session.id}.json")
+
+    def _idle_records(self, machine_id: str | None) -> list[tuple[Path, UploadSession | None]]:
+        """Lists the records (of one machine, or all) idle for longer than UPLOAD_SESSION_TTL, or without data (blocking)."""
+        pattern = f"container-{machine_id}/uploads/*.json" if machine_id else "container-*/uploads/*.json"
+        idle = []
+        for record_path in self.workspace_path.glob(pattern):
+            session = self._load(record_path.parent.parent.name.removeprefix("container-"), record_path.stem)
+            if session is None or session.updated < time.time() - UPLOAD_SESSION_TTL:
+                idle.append((record_path, session))
+        return idle
+
+    async def expire(self, machine_id: str | None = None) -> int:
+        """Removes the sessions (of one machine, or all) idle for longer than UPLOAD_SESSION_TTL, with their data."""
+        removed = []
+        for record_path, session in await asyncio.to_thread(self._idle_records, machine_id):
+            live = self.sessions.get(record_path.stem)
+            if live is not None:
+                if live.writes or live.lock.locked() or live.updated >= time.time() - UPLOAD_SESSION_TTL:
+                    continue  # In use again since it was listed
+                # Ended before the files go, so a chunk arriving now is rejected instead of recorded
+                live.ended = True
+                del self.sessions[live.id]
+            removed.append(record_path)
+            if session is not None:
+                removed.append(session.part_path)
+        await asyncio.to_thread(lambda: [_remove(path) for path in removed])
+        expired = sum(path.suffix == ".json" for path in removed)
+        self.expired += expired
+        return expired
+
+    async def _expire_periodically(self):
+        while True:
+            try:
+                expired = await self.expire()
+                if expired:
+                    print(f"INFO: Removed {expired} idle upload session(s).")
+            except OSError as e:
+                print(f"WARNING: Could not sweep idle upload sessions: {e}")
+            await asyncio.sleep(UPLOAD_SESSION_EXPIRE_INTERVAL)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "created": self.created,
+            "finalized": self.finalized,
+            "aborted": self.aborted,
+            "expired": self.expired,
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+        }
+
+
+# Shared receiver used by the upload endpoint, and resumable upload sessions
+upload_receiver = UploadReceiver()
+upload_sessions = UploadSessions()
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import time
+
+from cgroups import CgroupReader
+from docker_client import DockerError, docker, format_usage, memory_bytes, usage_values
+from machine_state import machine_states
+from registry import machine_registry
+from timeseries import FIELDS, UsageStore
+
+# Seconds between two cgroup samples (and checks for containers that started or stopped)
+USAGE_SAMPLE_INTERVAL = 1
+
+# "cgroup" reads cgroup v2 files, "docker" streams Engine API stats, "auto" (default) prefers cgroups
+USAGE_BACKEND_ENV = "VM_WEB_GUI_USAGE_BACKEND"
+
+# History ranges served by /usage-history: (default step in seconds, span in seconds)
+HISTORY_RANGES = {
+    "live": (1, 300),
+    "hour": (1, 3600),
+    "day": (60, 86400),
+    "week": (3600, 7 * 86400),
+}
+
+
+class UsageCollector:
+    """
+    Keeps the latest usage sample of every running machine container and records every
+    sample in the machine's on-disk UsageSeries (second, minute and hour rollups).
+
+    Running containers (as seen by the machine state cache) are sampled about every second,
+    so readers never wait for the daemon to take two samples, and history is recorded whether
+    or not anyone is watching. Containers whose cgroup is readable are sampled from cgroup v2
+    files, all in one worker thread call; the others get an Engine API stats stream each.
+    """
+
+    def __init__(self, backend: str | None = None, cgroups: CgroupReader | None = None):
+        self.backend = backend or os.getenv(USAGE_BACKEND_ENV, "auto")
+        self.cgroups = cgroups or CgroupReader()
+        self.latest: dict[str, dict] = {}
+        self.store = UsageStore()
+        self.streams: dict[str, tuple[str, asyncio.Task]] = {}
+        self.polled: dict[str, str] = {}  # machine id -> container id, sampled from cgroups
+        self.samples = 0
+        self.last_poll_seconds = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Starts the collector (call from the FastAPI lifespan)."""
+        if self.backend != "docker" and not self.cgroups.available:
+            if self.backend == "cgroup":
+                print(f"WARNING: No cgroup v2 hierarchy at {self.cgroups.root}; collecting usage through the Docker Engine API.")
+            self.backend = "docker"
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [self._task] if self._task else []
+        tasks += [task for _, task in self.streams.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self.streams = {}
+        self.polled = {}
+        self.store.close()
+
+    async def _run(self):
+        while True:
+            self.sync()
+            if self.polled:
+                await self._poll()
+            await asyncio.sleep(USAGE_SAMPLE_INTERVAL)
+
+    def sync(self):
+        """Assigns every running container to cgroup sampling or a stats stream and forgets removed machines."""
+        for machine_id in list(self.streams):
+            container_id, task = self.streams[machine_id]
+            if task.done() or machine_id not in machine_registry:
+                task.cancel()
+                del self.streams[machine_id]
+        for machine_id in [machine_id for machine_id in self.store.series if machine_id not in machine_registry]:
+            self.store.drop(machine_id)
+            self.latest.pop(machine_id, None)
+
+        running = {
+            machine_id: container["container_id"]
+            for machine_id, container in machine_states.snapshot().items()
+            if container["state"] == "running" and machine_id in machine_registry
+        }
+        for machine_id, container_id in list(self.polled.items()):
+            if running.get(machine_id) != container_id:
+                self._stopped(machine_id, container_id)
+
+        for machine_id, container_id in running.items():
+            if self.polled.get(machine_id) == container_id:
+                continue
+            stream = self.streams.get(machine_id)
+            if stream and stream[0] == container_id:
+                continue
+            if stream:
+                stream[1].cancel()  # Replaced by a new container
+                del self.streams[machine_id]
+            if self.backend != "docker" and self.cgroups.locate(container_id):
+                self.polled[machine_id] = container_id
+            else:
+                task = asyncio.create_task(self._follow(machine_id, container_id))
+                self.streams[machine_id] = (container_id, task)
+
+    async def _poll(self):
+        """Samples every cgroup-backed container in one worker thread call."""
+        polled = dict(self.polled)
+        started = time.perf_counter()
+        samples = await asyncio.to_thread(self.cgroups.sample_all, list(polled.values()))
+        self.last_poll_seconds = time.perf_counter() - started
+        for machine_id, container_id in polled.items():
+            stats = samples.get(container_id)
+            if stats is None:
+                self._stopped(machine_id, container_id)  # Its cgroup is gone with the container
+            elif self.polled.get(machine_id) == container_id:
+                self.record(machine_id, container_id, stats)
+
+    def _stopped(self, machine_id: str, container_id: str):
+        if self.polled.get(machine_id) == container_id:
+            del self.polled[machine_id]
+        self.cgroups.forget(container_id)
+        # A stopped container has no current usage
+        if (self.latest.get(machine_id) or {}).get("container_id") == container_id:
+            del self.latest[machine_id]
+
+    async def _follow(self, machine_id: str, container_id: str):
+        stats_stream = docker.stats_stream(container_id)
+        try:
+            async for stats in stats_stream:
+                self.record(machine_id, container_id, stats)
+        except DockerError as e:
+            if e.status != 404:
+                print(f"WARNING: Usage collection of machine {machine_id} stopped: {e}")
+        finally:
+            await stats_stream.aclose()
+            # A stopped container has no current usage
+            if (self.latest.get(machine_id) or {}).get("container_id") == container_id:
+                del self.latest[machine_id]
+
+    def record(self, machine_id: str, container_id: str, stats: dict) -> dict:
+        """Stores an Engine API stats sample as the machine's latest usage and returns the usage."""
+        values = usage_values(stats)
+        usage = format_usage(values)
+        now = time.time()
+        self.samples += 1
+        self.latest[machine_id] = {"container_id": container_id, "sampled_at": now, "usage": usage, "values": values}
+        series = self.store.get(machine_id)
+        if series is not None:
+            series.add(now, values)
+        return usage
+
+    def current(self, machine_id: str, container_id: str) -> dict | None:
+        """Returns the latest usage of the machine's container, or None if there is no sample of it yet."""
+        sample = self.latest.get(machine_id)
+        if sample is None or sample["container_id"] != container_id:
+            return None
+        return sample["usage"]
+
+    def history_of(
+        self,
+        machine_id: str,
+        history_range: str = "live",
+        since: float | None = None,
+        until: float | None = None,
+        step: int | None = None,
+    ) -> dict:
+        """
+        Returns usage history as columns: "timestamps" (Unix seconds, delta-encoded: the first
+        is absolute, each next one is the difference to the previous) and one list per field.
+
+        since and until (Unix seconds) default to the span of `history_range` up to now, and
+        step to its resolution. since is inclusive, so a client polling with the last timestamp
+        it holds gets that point again (it may have been partial) plus everything newer.
+        """
+        resolution, span = HISTORY_RANGES[history_range]
+        until = time.time() if until is None else until
+        since = until - span if since is None else since
+        series = self.store.get(machine_id, create=False)
+        if series is None:
+            step, timestamps, columns = step or resolution, [], {name: [] for name, _ in FIELDS}
+        else:
+            step, timestamps, columns = series.columns(since, until, step or resolution)
+        history = {
+            "step": step,
+            "timestamps": [timestamp - previous for timestamp, previous in zip(timestamps, [0] + timestamps)],
+        }
+        for name, values in columns.items():
+            # Whole bytes and hundredths of a percent are all the charts show
+            history[name] = [round(value, 2) for value in values] if name == "cpu_percent" else [int(value) for value in values]
+        return history
+
+    def fleet(self, largest_memory: int, largest_cores: int) -> dict:
+        """
+        Returns every running machine's latest usage with host totals and allocation headroom.
+
+        Allocation is the sum of the RAM and core quotas of the running machines (their container
+        limits) against the host's memory and CPUs; "fits_largest_machine" tells whether a machine
+        with the largest quota (`largest_memory` bytes, `largest_cores`) can start without
+        overcommitting either.
+        """
+        now = time.time()
+        host_memory = self.cgroups.host_memory()
+        host_cores = self.cgroups.online_cpus
+        machines = []
+        totals = {"cpu_percent": 0.0, "mem_usage": 0, "net_rx": 0, "net_tx": 0}
+        allocated_memory = allocated_cores = 0
+        for machine_id, container in machine_states.snapshot().items():
+            machine = machine_registry.get(machine_id)
+            if container["state"] != "running" or machine is None:
+                continue
+            try:
+                memory, cores = memory_bytes(str(machine.get("ram"))), float(machine.get("core"))
+            except (TypeError, ValueError):
+                memory, cores = 0, 0.0  # Created outside the quotas (no parsable RAM or core setting)
+            allocated_memory += memory
+            allocated_cores += cores
+            sample = self.latest.get(machine_id)
+            if sample is not None and sample["container_id"] != container["container_id"]:
+                sample = None  # From a previous container of the machine
+            if sample is not None:
+                for name in totals:
+                    totals[name] += sample["values"][name]
+            machines.append({
+                "id": machine_id,
+                "name": machine.get("name"),
+                "container_id": container["container_id"],
+                "ram": memory,
+                "cores": cores,
+                "usage": sample and sample["usage"],
+                "values": sample and sample["values"],
+                "age_seconds": sample and round(now - sample["sampled_at"], 3),
+            })
+
+        # Without procfs the host memory is unknown, and so is the memory headroom
+        memory_headroom = host_memory - allocated_memory if host_memory else None
+        core_headroom = host_cores - allocated_cores
+        return {
+            "machines": machines,
+            "host": {"memory": host_memory, "cores": host_cores},
+            "totals": {**totals, "cores_used": round(totals["cpu_percent"] / 100, 3), "running": len(machines)},
+            "allocated": {"memory": allocated_memory, "cores": allocated_cores},
+            "headroom": {
+                "memory": memory_headroom,
+                "cores": core_headroom,
+                "overcommitted": (memory_headroom or 0) < 0 or core_headroom < 0,
+                "fits_largest_machine": (memory_headroom is None or memory_headroom >= largest_memory) and core_headroom >= largest_cores,
+            },
+        }
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "backend": self.backend,
+            "streams": len(self.streams),
+            "cgroup_sampled": len(self.polled),
+            "last_poll_seconds": round(self.last_poll_seconds, 6),
+            "samples": self.samples,
+            "machines": {
+                machine_id: {"container_id": sample["container_id"], "age_seconds": round(now - sample["sampled_at"], 3)}
+                for machine_id, sample in self.latest.items()
+            },
+        }
+
+
+# Shared usage collector, fed in the background and read by the usage endpoints
+usage_collector = UsageCollector()
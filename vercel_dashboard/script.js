@@ -25,13 +25,20 @@ document.addEventListener("DOMContentLoaded", () => {
   let currentMachineId = null; // To store the ID of the currently viewed machine
 
   let currentUsageInterval = null; // Global variable to hold the setInterval for usage
-  let currentLogsAbortController = null; // Global variable to hold the AbortController for logs
+  let currentLogsSource = null; // EventSource of the logs stream currently shown
+  const MAX_LOG_CHUNKS = 2000; // Oldest rendered log chunks are removed beyond this
 
   // Chart instances
   let cpuChart = null;
   let ramChart = null;
   let netIoChart = null;
 
+  // Usage history shown in the charts, as columns, and how it is fetched
+  let usageHistory = null;
+  const USAGE_HISTORY_FIELDS = ["cpu_percent", "mem_usage", "mem_limit", "net_rx", "net_tx"];
+  const USAGE_HISTORY_STEP = 3; // Seconds per chart point
+  const USAGE_HISTORY_POINTS = 100; // Oldest points are dropped beyond this
+
   // Function to destroy existing charts
   const destroyCharts = () => {
     if (cpuChart) {
@@ -99,6 +106,11 @@ document.addEventListener("DOMContentLoaded", () => {
   const editingFilePathSpan = document.getElementById("editing-file-path");
   const fileEditorTextarea = document.getElementById("file-editor-textarea");
   const saveFileContentBtn = document.getElementById("save-file-content-btn");
+  const loadMoreFileContentBtn = document.getElementById("load-more-file-content-btn");
+  const fileEditorStatus = document.getElementById("file-editor-status");
+  // Files larger than one /files/content page are opened read-only and loaded page by page
+  let editorNextOffset = 0;
+  let editorFileSize = 0;
   const cancelFileContentBtn = document.getElementById("cancel-file-content-btn");
 
 
@@ -230,6 +242,7 @@ document.addEventListener("DOMContentLoaded", () => {
             action === "start" ? "started" : "stopped"
           } successfully.`;
           const errorMessage = `Failed to ${action} machine.`;
+          let followingJob = false; // The job follower re-enables the button when the start finishes
 
           try {
             runStopButton.disabled = true; // Disable button during operation
@@ -244,11 +257,15 @@ document.addEventListener("DOMContentLoaded", () => {
             });
             const result = await response.json();
 
-            if (response.ok) {
+            if (!response.ok) {
+              showMessage(`Error: ${result.detail || errorMessage}`, "error");
+            } else if (result.job_id) {
+              // Start runs as a background job; follow its progress until it is done
+              followingJob = true;
+              followStartJob(result.job_id, runStopButton);
+            } else {
               showMessage(result.message || successMessage, "success");
               fetchAndRenderMachines(); // Refresh list to show updated status
-            } else {
-              showMessage(`Error: ${result.detail || errorMessage}`, "error");
             }
           } catch (error) {
             console.error(`Error ${action}ing machine:`, error);
@@ -257,7 +274,9 @@ document.addEventListener("DOMContentLoaded", () => {
               "error"
             );
           } finally {
-            runStopButton.disabled = false; // Re-enable button
+            if (!followingJob) {
+              runStopButton.disabled = false; // Re-enable button
+            }
             // The icon will be reset by fetchAndRenderMachines()
           }
         });
@@ -279,6 +298,107 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   };
 
+  // Function to follow a start job over Server-Sent Events until it finishes
+  const followStartJob = (jobId, runStopButton) => {
+    const events = new EventSource(`${BASE_API_URL}/jobs/${jobId}/events`);
+
+    events.addEventListener("phase", (event) => {
+      const data = JSON.parse(event.data);
+      runStopButton.title = `Start: ${data.phase}...`;
+      showMessage(`Machine start: ${data.phase}...`, "info");
+    });
+
+    events.addEventListener("log", (event) => {
+      console.log("BUILD LOG:", JSON.parse(event.data).line);
+    });
+
+    events.addEventListener("done", (event) => {
+      const data = JSON.parse(event.data);
+      events.close();
+      if (data.status === "succeeded") {
+        showMessage(
+          (data.result && data.result.message) || "Machine started successfully.",
+          "success"
+        );
+      } else {
+        showMessage(`Error: ${data.error || "Failed to start machine."}`, "error");
+      }
+      runStopButton.disabled = false;
+      fetchAndRenderMachines(); // Refresh list to show updated status
+    });
+
+    events.onerror = () => {
+      // The browser reconnects on its own (resuming from the last event id) unless the stream was closed
+      if (events.readyState === EventSource.CLOSED) {
+        showMessage("Lost connection to the machine start progress.", "error");
+        runStopButton.disabled = false;
+        fetchAndRenderMachines();
+      }
+    };
+  };
+
+  // Fleet-wide usage on the overview, refreshed while the overview is shown
+  let currentFleetInterval = null;
+
+  const formatGiB = (bytes) => `${(bytes / 1024 ** 3).toFixed(1)} GB`;
+
+  const fetchAndRenderFleetUsage = async () => {
+    const machineListDiv = document.getElementById("fleet-machine-list");
+    try {
+      const response = await fetch(`${BASE_API_URL}/usage`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const fleet = await response.json();
+      const { host, totals, allocated, headroom } = fleet;
+
+      document.getElementById("fleet-running").textContent = totals.running;
+      document.getElementById("fleet-cpu").textContent = `${totals.cores_used.toFixed(1)} / ${host.cores}`;
+      document.getElementById("fleet-ram").textContent = host.memory
+        ? `${formatGiB(totals.mem_usage)} / ${formatGiB(host.memory)}`
+        : formatGiB(totals.mem_usage);
+      const headroomP = document.getElementById("fleet-headroom");
+      const memoryHeadroom = headroom.memory === null ? "? GB" : formatGiB(headroom.memory);
+      headroomP.textContent = `${memoryHeadroom}, ${headroom.cores} cores`;
+      headroomP.classList.toggle("overcommitted", headroom.overcommitted);
+      headroomP.title = `Allocated: ${formatGiB(allocated.memory)}, ${allocated.cores} cores` +
+        (headroom.fits_largest_machine ? "" : ". A machine with the largest quota would overcommit the host.");
+
+      machineListDiv.innerHTML = "";
+      if (fleet.machines.length === 0) {
+        machineListDiv.innerHTML = "<p>No running machines.</p>";
+        return;
+      }
+      fleet.machines.forEach((machine) => {
+        const item = document.createElement("div");
+        item.classList.add("activity-item");
+        const usage = machine.usage
+          ? `CPU ${machine.usage.cpu_percent} · RAM ${machine.usage.mem_usage} / ${machine.usage.mem_limit} · Net ${machine.usage.net_rx} / ${machine.usage.net_tx}`
+          : "Waiting for the first sample...";
+        item.innerHTML = `<p></p><span></span>`;
+        item.querySelector("p").textContent = machine.name;
+        item.querySelector("span").textContent = usage;
+        machineListDiv.appendChild(item);
+      });
+    } catch (error) {
+      console.error("Error fetching fleet usage:", error);
+      machineListDiv.innerHTML = "<p>Failed to load fleet usage.</p>";
+    }
+  };
+
+  const startFleetUsage = () => {
+    stopFleetUsage();
+    fetchAndRenderFleetUsage();
+    currentFleetInterval = setInterval(fetchAndRenderFleetUsage, 5000); // Refresh every 5 seconds
+  };
+
+  const stopFleetUsage = () => {
+    if (currentFleetInterval) {
+      clearInterval(currentFleetInterval);
+      currentFleetInterval = null;
+    }
+  };
+
   // Function to fetch and render activity logs
   const fetchAndRenderActivityLogs = async () => {
     const activityListDiv = document.querySelector(".activity-list");
@@ -351,6 +471,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
       // Hide all content sections
       contentSections.forEach((section) => section.classList.remove("active"));
+      stopFleetUsage();
 
       // Show the corresponding content section
       const targetSectionId = link.dataset.section + "-section";
@@ -361,6 +482,7 @@ document.addEventListener("DOMContentLoaded", () => {
           fetchAndRenderMachines(); // Initial fetch
         } else if (link.dataset.section === "overview") {
           fetchAndRenderActivityLogs();
+          startFleetUsage();
           fetchAndRenderSshxUrl(); // Fetch SSHX URL when overview is active
         }
       }
@@ -410,6 +532,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
   const openMachineDetailsSection = async (machineId, machineName) => {
     currentMachineId = machineId; // Store the current machine ID
+    closeMachineLogs(); // Stop following the previously opened machine's logs
 
     // Update the title
     machineDetailsTitle.textContent = `Details for ${machineName}`;
@@ -555,6 +678,7 @@ document.addEventListener("DOMContentLoaded", () => {
         currentUsageInterval = null;
         console.log("Cleared usage polling interval.");
       }
+      closeMachineLogs();
       // Destroy charts when switching tabs
       destroyCharts();
 
@@ -829,16 +953,22 @@ document.addEventListener("DOMContentLoaded", () => {
               path === "/" ? `/${item.name}` : `${path}/${item.name}`;
             fetchMachineFiles(machineId, newPath);
           });
-          // Add delete button for folders
+          // Add download (as a zip) and delete buttons for folders
           actionsHtml = `
+            <button class="icon-button download-folder-button" data-folder-name="${item.name}" title="Download as zip">
+              <svg viewBox="0 0 24 24" width="16" height="16" stroke="currentColor" stroke-width="2" fill="none" stroke-linecap="round" stroke-linejoin="round"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"></path><polyline points="7 10 12 15 17 10"></polyline><line x1="12" y1="15" x2="12" y2="3"></line></svg>
+            </button>
             <button class="icon-button delete-folder-button" data-folder-name="${item.name}">
               <svg viewBox="0 0 24 24" width="16" height="16" stroke="currentColor" stroke-width="2" fill="none" stroke-linecap="round" stroke-linejoin="round"><polyline points="3 6 5 6 21 6"></polyline><path d="M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"></path></svg>
             </button>
           `;
         } else {
           icon = `<svg viewBox="0 0 24 24" width="16" height="16" stroke="currentColor" stroke-width="2" fill="none" stroke-linecap="round" stroke-linejoin="round"><path d="M13 2H6a2 2 0 0 0-2 2v16a2 2 0 0 0 2 2h12a2 2 0 0 0 2-2V9z"></path><polyline points="13 2 13 9 20 9"></polyline></svg>`;
-          // Add delete button for files
+          // Add download and delete buttons for files
           actionsHtml = `
+            <button class="icon-button download-file-button" data-file-name="${item.name}" title="Download">
+              <svg viewBox="0 0 24 24" width="16" height="16" stroke="currentColor" stroke-width="2" fill="none" stroke-linecap="round" stroke-linejoin="round"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"></path><polyline points="7 10 12 15 17 10"></polyline><line x1="12" y1="15" x2="12" y2="3"></line></svg>
+            </button>
             <button class="icon-button delete-file-button" data-file-name="${item.name}">
               <svg viewBox="0 0 24 24" width="16" height="16" stroke="currentColor" stroke-width="2" fill="none" stroke-linecap="round" stroke-linejoin="round"><polyline points="3 6 5 6 21 6"></polyline><path d="M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"></path></svg>
             </button>
@@ -862,6 +992,12 @@ document.addEventListener("DOMContentLoaded", () => {
 
         // Attach event listener for delete button if it exists
         if (item.type === "file") {
+          const downloadButton = li.querySelector(".download-file-button");
+          downloadButton.addEventListener("click", (e) => {
+            e.stopPropagation(); // Prevent li click event from firing
+            const fileName = downloadButton.dataset.fileName;
+            downloadMachineFile(currentMachineId, path === "/" ? `/${fileName}` : `${path}/${fileName}`);
+          });
           const deleteButton = li.querySelector(".delete-file-button");
           if (deleteButton) {
             deleteButton.addEventListener("click", (e) => {
@@ -878,6 +1014,12 @@ document.addEventListener("DOMContentLoaded", () => {
             });
           }
         } else if (item.type === "folder") {
+          const downloadButton = li.querySelector(".download-folder-button");
+          downloadButton.addEventListener("click", (e) => {
+            e.stopPropagation(); // Prevent li click event from firing
+            const folderName = downloadButton.dataset.folderName;
+            downloadMachineFolder(currentMachineId, path === "/" ? `/${folderName}` : `${path}/${folderName}`);
+          });
           const deleteButton = li.querySelector(".delete-folder-button");
           if (deleteButton) {
             deleteButton.addEventListener("click", (e) => {
@@ -937,6 +1079,87 @@ document.addEventListener("DOMContentLoaded", () => {
   };
 
   // Unified File Upload Function
+  // Files larger than this are uploaded in chunks through a resumable upload session
+  const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
+  const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+  const UPLOAD_PARALLEL_CHUNKS = 3;
+  const UPLOAD_CHUNK_RETRIES = 5; // Per chunk, with exponential backoff
+
+  // Byte ranges of [0, size) not covered by the received [start, end) ranges
+  const missingRanges = (received, size) => {
+    const missing = [];
+    let position = 0;
+    received.forEach(([start, end]) => {
+      if (start > position) missing.push([position, start]);
+      position = end;
+    });
+    if (position < size) missing.push([position, size]);
+    return missing;
+  };
+
+  const uploadFileChunked = async (machineId, path, file, onProgress) => {
+    const sessionsUrl = `${BASE_API_URL}/machines/${machineId}/uploads`;
+    // The session of an earlier, interrupted upload of the same file is resumed
+    const storageKey = `upload:${machineId}:${path}:${file.name}:${file.size}:${file.lastModified}`;
+    let session = null;
+    const savedUploadId = localStorage.getItem(storageKey);
+    if (savedUploadId) {
+      const response = await fetch(`${sessionsUrl}/${savedUploadId}`);
+      if (response.ok) session = await response.json();
+    }
+    if (!session) {
+      const response = await fetch(sessionsUrl, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ file_name: file.name, size: file.size, path }),
+      });
+      session = await response.json();
+      if (!response.ok) throw new Error(session.detail || "Failed to start upload");
+      localStorage.setItem(storageKey, session.upload_id);
+    }
+    const uploadUrl = `${sessionsUrl}/${session.upload_id}`;
+
+    const chunks = [];
+    missingRanges(session.received, file.size).forEach(([start, end]) => {
+      for (let offset = start; offset < end; offset += UPLOAD_CHUNK_SIZE) {
+        chunks.push([offset, Math.min(offset + UPLOAD_CHUNK_SIZE, end)]);
+      }
+    });
+    let uploadedBytes = session.received_bytes;
+    onProgress(uploadedBytes);
+
+    const uploadChunks = async () => {
+      let chunk;
+      while ((chunk = chunks.shift())) {
+        const [start, end] = chunk;
+        for (let attempt = 1; ; attempt++) {
+          try {
+            const response = await fetch(`${uploadUrl}?offset=${start}`, {
+              method: "PUT",
+              body: file.slice(start, end),
+            });
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            break;
+          } catch (error) {
+            if (attempt >= UPLOAD_CHUNK_RETRIES) throw error;
+            await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempt));
+          }
+        }
+        uploadedBytes += end - start;
+        onProgress(uploadedBytes);
+      }
+    };
+    await Promise.all(Array.from({ length: UPLOAD_PARALLEL_CHUNKS }, uploadChunks));
+
+    const response = await fetch(`${uploadUrl}/finalize`, { method: "POST" });
+    const result = await response.json();
+    if (!response.ok) {
+      throw new Error((result.detail && result.detail.message) || result.detail || "Failed to finalize upload");
+    }
+    localStorage.removeItem(storageKey);
+    return result;
+  };
+
   const uploadFiles = async (files) => {
     if (!currentMachineId) {
       showMessage("Please select a machine first.", "error");
@@ -947,38 +1170,53 @@ document.addEventListener("DOMContentLoaded", () => {
       return;
     }
 
-    const formData = new FormData();
-    for (const file of files) {
-      formData.append("files", file);
-    }
+    const machineId = currentMachineId;
+    const path = currentFilePath;
+    const smallFiles = Array.from(files).filter((file) => file.size <= CHUNKED_UPLOAD_THRESHOLD);
+    const largeFiles = Array.from(files).filter((file) => file.size > CHUNKED_UPLOAD_THRESHOLD);
 
     try {
       // Indicate uploading state on the drop zone or a global message
       showMessage(`Uploading ${files.length} file(s)...`, "info");
       dropZone.classList.add("uploading"); // Add a class for visual feedback
 
-      const response = await fetch(
-        `${BASE_API_URL}/machines/${currentMachineId}/upload?path=${encodeURIComponent(
-          currentFilePath
-        )}`,
-        {
-          method: "POST",
-          body: formData,
+      const messages = [];
+      if (smallFiles.length > 0) {
+        const formData = new FormData();
+        for (const file of smallFiles) {
+          formData.append("files", file);
         }
-      );
-      const result = await response.json();
-      if (response.ok) {
-        showMessage(result.message, "success");
-        fetchMachineFiles(currentMachineId, currentFilePath); // Refresh file list
-      } else {
-        showMessage(
-          `Error: ${result.detail || "Failed to upload files"}`,
-          "error"
+        const response = await fetch(
+          `${BASE_API_URL}/machines/${machineId}/upload?path=${encodeURIComponent(path)}`,
+          {
+            method: "POST",
+            body: formData,
+          }
         );
+        const result = await response.json();
+        if (!response.ok) {
+          showMessage(
+            `Error: ${result.detail || "Failed to upload files"}`,
+            "error"
+          );
+          return;
+        }
+        messages.push(result.message);
+      }
+
+      for (const file of largeFiles) {
+        const result = await uploadFileChunked(machineId, path, file, (uploadedBytes) => {
+          const percent = Math.floor((uploadedBytes / file.size) * 100);
+          showMessage(`Uploading ${file.name}: ${percent}%`, "info");
+        });
+        messages.push(result.message);
       }
+
+      showMessage(messages.join(" "), "success");
+      fetchMachineFiles(machineId, path); // Refresh file list
     } catch (error) {
       console.error("Error uploading files:", error);
-      showMessage("An error occurred during file upload.", "error");
+      showMessage(`An error occurred during file upload: ${error.message}. Upload the file again to resume.`, "error");
     } finally {
       dropZone.classList.remove("uploading"); // Remove uploading state
     }
@@ -1087,28 +1325,56 @@ document.addEventListener("DOMContentLoaded", () => {
     }`;
   };
 
+  // Merges a columnar /usage-history response into usageHistory. Timestamps arrive
+  // delta-encoded; the first returned point replaces ours if it has the same timestamp
+  // (it was still filling when we fetched it).
+  const mergeUsageHistory = (response) => {
+    let timestamp = 0;
+    const timestamps = response.timestamps.map((delta) => (timestamp += delta));
+    if (!usageHistory) {
+      usageHistory = { timestamps: [] };
+      USAGE_HISTORY_FIELDS.forEach((field) => (usageHistory[field] = []));
+    }
+    let keep = usageHistory.timestamps.length;
+    while (keep > 0 && timestamps.length && usageHistory.timestamps[keep - 1] >= timestamps[0]) {
+      keep--;
+    }
+    const drop = Math.max(0, keep + timestamps.length - USAGE_HISTORY_POINTS);
+    usageHistory.timestamps = usageHistory.timestamps.slice(drop, keep).concat(timestamps);
+    USAGE_HISTORY_FIELDS.forEach((field) => {
+      usageHistory[field] = usageHistory[field].slice(drop, keep).concat(response[field]);
+    });
+  };
+
   const renderCharts = (history) => {
-    const labels = history.map((item) =>
-      new Date(item.timestamp).toLocaleTimeString()
-    );
-    const cpuData = history.map((item) =>
-      parseFloat(item.cpu_percent.replace("%", ""))
-    );
-    const ramUsageData = history.map((item) =>
-      parseFloat(item.mem_usage.replace(/[^0-9.]/g, ""))
-    );
-    const ramLimitData = history.map((item) =>
-      parseFloat(item.mem_limit.replace(/[^0-9.]/g, ""))
-    );
-    const netRxData = history.map((item) =>
-      parseFloat(item.net_rx.replace(/[^0-9.]/g, ""))
-    );
-    const netTxData = history.map((item) =>
-      parseFloat(item.net_tx.replace(/[^0-9.]/g, ""))
+    const labels = history.timestamps.map((timestamp) =>
+      new Date(timestamp * 1000).toLocaleTimeString()
     );
+    // History values are numbers: CPU in percent, memory and network in bytes
+    const MB = 1024 * 1024;
+    const cpuData = history.cpu_percent;
+    const ramUsageData = history.mem_usage.map((value) => value / MB);
+    const ramLimitData = history.mem_limit.map((value) => value / MB);
+    const netRxData = history.net_rx.map((value) => value / MB);
+    const netTxData = history.net_tx.map((value) => value / MB);
+
+    // Charts already drawn only get their data replaced
+    if (cpuChart && ramChart && netIoChart) {
+      const updates = [
+        [cpuChart, [cpuData]],
+        [ramChart, [ramUsageData, ramLimitData]],
+        [netIoChart, [netRxData, netTxData]],
+      ];
+      updates.forEach(([chart, datasets]) => {
+        chart.data.labels = labels;
+        datasets.forEach((data, i) => (chart.data.datasets[i].data = data));
+        chart.update("none");
+      });
+      return;
+    }
 
     // CPU Chart
-    if (cpuChart) cpuChart.destroy();
+    destroyCharts();
     cpuChart = new Chart(cpuUsageChartCtx, {
       type: "line",
       data: {
@@ -1145,7 +1411,6 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 
     // RAM Chart
-    if (ramChart) ramChart.destroy();
     ramChart = new Chart(ramUsageChartCtx, {
       type: "line",
       data: {
@@ -1190,7 +1455,6 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 
     // Network I/O Chart
-    if (netIoChart) netIoChart.destroy();
     netIoChart = new Chart(netIoChartCtx, {
       type: "line",
       data: {
@@ -1235,10 +1499,15 @@ document.addEventListener("DOMContentLoaded", () => {
   };
 
   const pollMachineUsage = async (machineId) => {
+    // After the first poll, only points from the last one we hold onwards are fetched
+    const held = usageHistory ? usageHistory.timestamps : [];
+    const historyQuery = held.length
+      ? `step=${USAGE_HISTORY_STEP}&since=${held[held.length - 1]}`
+      : `step=${USAGE_HISTORY_STEP}`;
     try {
       const [snapshotResponse, historyResponse] = await Promise.all([
         fetch(`${BASE_API_URL}/machines/${machineId}/usage-snapshot`),
-        fetch(`${BASE_API_URL}/machines/${machineId}/usage-history`),
+        fetch(`${BASE_API_URL}/machines/${machineId}/usage-history?${historyQuery}`),
       ]);
 
       if (!snapshotResponse.ok) {
@@ -1262,8 +1531,10 @@ document.addEventListener("DOMContentLoaded", () => {
         destroyCharts(); // Destroy charts on error
         return;
       }
-      updateUsageDisplay(snapshotData);
-      renderCharts(historyData); // Render charts with historical data
+      // A container the server has not sampled yet (202) shows placeholders until the next poll
+      updateUsageDisplay(snapshotData.pending ? { cpu_percent: "…", mem_usage: "…", mem_limit: "…", net_rx: "…", net_tx: "…" } : snapshotData);
+      mergeUsageHistory(historyData);
+      renderCharts(usageHistory); // Render charts with historical data
 
     } catch (error) {
       console.error("Error fetching usage data:", error);
@@ -1285,6 +1556,7 @@ document.addEventListener("DOMContentLoaded", () => {
     }
     // Destroy existing charts before fetching new data
     destroyCharts();
+    usageHistory = null;
 
     usageCpuSpan.textContent = "Loading...";
     usageRamSpan.textContent = "Loading...";
@@ -1296,46 +1568,67 @@ document.addEventListener("DOMContentLoaded", () => {
     console.log("Started usage polling interval.");
   };
 
-  const fetchMachineLogs = async (machineId) => {
+  const closeMachineLogs = () => {
+    if (currentLogsSource) {
+      currentLogsSource.close();
+      currentLogsSource = null;
+    }
+  };
+
+  // Follows a machine's logs over Server-Sent Events. Each "log" event carries only new lines;
+  // on reconnect the browser sends the last event id, so the server resumes where it stopped.
+  const fetchMachineLogs = (machineId) => {
+    closeMachineLogs();
     machineLogsPre.textContent = "Connecting to logs stream...";
-    try {
-      const response = await fetch(`/machines/${machineId}/logs`);
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
 
-      const reader = response.body.getReader();
-      const decoder = new TextDecoder();
-      let accumulatedLogs = "";
-      // Initialize AnsiUp, checking for common global exposures
-      const AnsiUpConstructor = window.AnsiUp || (window.AnsiUp && window.AnsiUp.default);
-      if (!AnsiUpConstructor) {
-        console.error("AnsiUp library not found. Please ensure ansi_up.js is loaded correctly.");
-        machineLogsPre.textContent = `Failed to load logs: AnsiUp library is missing.`;
-        return; // Exit the function if AnsiUp is not available
+    // Initialize AnsiUp, checking for common global exposures
+    const AnsiUpConstructor = window.AnsiUp || (window.AnsiUp && window.AnsiUp.default);
+    if (!AnsiUpConstructor) {
+      console.error("AnsiUp library not found. Please ensure ansi_up.js is loaded correctly.");
+      machineLogsPre.textContent = `Failed to load logs: AnsiUp library is missing.`;
+      return; // Exit the function if AnsiUp is not available
+    }
+    const ansi_up = new AnsiUpConstructor(); // Keeps color state between chunks
+    const source = new EventSource(`${BASE_API_URL}/machines/${machineId}/logs`);
+    currentLogsSource = source;
+    let cleared = false;
+
+    const appendLogs = (text) => {
+      if (!cleared) {
+        machineLogsPre.innerHTML = ""; // Clear initial message once stream starts
+        cleared = true;
       }
-      const ansi_up = new AnsiUpConstructor();
+      const atBottom = machineLogsPre.scrollHeight - machineLogsPre.scrollTop - machineLogsPre.clientHeight < 40;
+      const chunk = document.createElement("span");
+      chunk.innerHTML = ansi_up.ansi_to_html(text);
+      machineLogsPre.appendChild(chunk);
+      while (machineLogsPre.childElementCount > MAX_LOG_CHUNKS) {
+        machineLogsPre.firstElementChild.remove();
+      }
+      if (atBottom) {
+        machineLogsPre.scrollTop = machineLogsPre.scrollHeight; // Auto-scroll to bottom
+      }
+    };
 
-      machineLogsPre.innerHTML = ""; // Clear initial message once stream starts
+    source.addEventListener("log", (event) => {
+      appendLogs(event.data + "\n");
+    });
 
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) {
-          console.log("Logs stream finished.");
-          break;
+    // "status" explains why there are no logs and "end" follows the last line; neither is retried
+    ["status", "end"].forEach((type) => {
+      source.addEventListener(type, (event) => {
+        appendLogs((type === "end" ? "\n" : "") + event.data + "\n");
+        source.close();
+        if (currentLogsSource === source) {
+          currentLogsSource = null;
         }
-        const chunk = decoder.decode(value, { stream: true });
-        console.log("Raw log chunk:", chunk); // Debug raw log content
-        accumulatedLogs += chunk;
-        const processedHtml = ansi_up.ansi_to_html(accumulatedLogs);
-        console.log("Processed HTML:", processedHtml); // Debug processed HTML
-        machineLogsPre.innerHTML = processedHtml; // Convert ANSI to HTML and update content
-        machineLogsPre.scrollTop = machineLogsPre.scrollHeight; // Auto-scroll to bottom
-      }
-    } catch (error) {
-      console.error("Error fetching machine logs:", error);
-      machineLogsPre.textContent = `Failed to load logs for machine ${machineId}. Please ensure the backend is running and supports log fetching. Error: ${error.message}`;
-    }
+      });
+    });
+
+    source.onerror = () => {
+      // The browser reconnects on its own and resumes after the last event id
+      console.warn(`Logs stream for machine ${machineId} interrupted, reconnecting...`);
+    };
   };
 
   // Handle form submission
@@ -1428,6 +1721,33 @@ document.addEventListener("DOMContentLoaded", () => {
   updateCreateButtonState();
 
   // File Editor Functions
+  const loadFileContentPage = async (machineId, filePath) => {
+    const response = await fetch(
+      `${BASE_API_URL}/machines/${machineId}/files/content?path=${encodeURIComponent(
+        filePath
+      )}&offset=${editorNextOffset}`
+    );
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const content = await response.text();
+    editorNextOffset = Number(response.headers.get("X-Next-Offset"));
+    editorFileSize = Number(response.headers.get("X-File-Size"));
+    return content;
+  };
+
+  // Only a file loaded whole can be edited: saving a part would truncate it
+  const updateEditorPaging = () => {
+    const partial = editorNextOffset < editorFileSize;
+    fileEditorTextarea.readOnly = partial;
+    saveFileContentBtn.disabled = partial;
+    loadMoreFileContentBtn.style.display = partial ? "" : "none";
+    const MB = 1024 * 1024;
+    fileEditorStatus.textContent = partial
+      ? `Showing ${(editorNextOffset / MB).toFixed(1)} of ${(editorFileSize / MB).toFixed(1)} MB (read-only until fully loaded)`
+      : "";
+  };
+
   const openFileEditor = async (machineId, filePath) => {
     if (!machineId || !filePath) {
       showMessage("Machine ID or file path is missing.", "error");
@@ -1439,25 +1759,58 @@ document.addEventListener("DOMContentLoaded", () => {
     fileEditorTextarea.value = "Loading file content...";
     fileEditorModal.style.display = "flex";
     document.body.classList.add("new-machine-modal-open"); // Reuse modal-open class for blur effect
+    editorNextOffset = 0;
+    editorFileSize = 0;
 
     try {
-      const response = await fetch(
-        `${BASE_API_URL}/machines/${machineId}/files/content?path=${encodeURIComponent(
-          filePath
-        )}`
-      );
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-      const content = await response.text();
-      fileEditorTextarea.value = content;
+      fileEditorTextarea.value = await loadFileContentPage(machineId, filePath);
+      updateEditorPaging();
     } catch (error) {
       console.error("Error fetching file content:", error);
       fileEditorTextarea.value = `Failed to load file content: ${error.message}`;
+      saveFileContentBtn.disabled = true; // Don't overwrite the file with the error message
       showMessage("Failed to load file content.", "error");
     }
   };
 
+  const loadMoreFileContent = async () => {
+    if (!currentMachineId || !currentEditingFilePath) return;
+    loadMoreFileContentBtn.disabled = true;
+    try {
+      fileEditorTextarea.value += await loadFileContentPage(currentMachineId, currentEditingFilePath);
+      updateEditorPaging();
+    } catch (error) {
+      console.error("Error fetching file content:", error);
+      showMessage("Failed to load more file content.", "error");
+    } finally {
+      loadMoreFileContentBtn.disabled = false;
+    }
+  };
+
+  const startDownload = (url, fileName) => {
+    const link = document.createElement("a");
+    link.href = url;
+    link.download = fileName;
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+  };
+
+  const downloadMachineFile = (machineId, filePath) => {
+    startDownload(
+      `${BASE_API_URL}/machines/${machineId}/files/download?path=${encodeURIComponent(filePath)}`,
+      filePath.split("/").pop()
+    );
+  };
+
+  // The server builds the zip while it is downloaded, so large folders start arriving right away
+  const downloadMachineFolder = (machineId, folderPath) => {
+    startDownload(
+      `${BASE_API_URL}/machines/${machineId}/files/archive?path=${encodeURIComponent(folderPath)}&format=zip`,
+      `${folderPath.split("/").pop()}.zip`
+    );
+  };
+
   const saveFileContent = async () => {
     if (!currentMachineId || !currentEditingFilePath) {
       showMessage("No file selected for saving.", "error");
@@ -1509,11 +1862,14 @@ document.addEventListener("DOMContentLoaded", () => {
     fileEditorTextarea.value = ""; // Clear content
     editingFilePathSpan.textContent = ""; // Clear path
     currentEditingFilePath = null; // Clear stored path
+    editorNextOffset = editorFileSize = 0;
+    updateEditorPaging();
   };
 
   // Event Listeners for File Editor Modal
   closeFileEditorModalBtn.addEventListener("click", closeFileEditor);
   saveFileContentBtn.addEventListener("click", saveFileContent);
+  loadMoreFileContentBtn.addEventListener("click", loadMoreFileContent);
 
   window.addEventListener("click", (event) => {
     if (event.target === fileEditorModal) {